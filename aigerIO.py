@@ -5,17 +5,19 @@ import bitarray
 import bitarray.util
 
 from specification import Specification
+from compactSpecification import CompactSpecification
 
 from aiger_io.build.aiger import Aiger
 
 
-def getSpecification(fname) :
+# compact: use the array based storage (see CompactSpecification)
+def getSpecification(fname, compact = False) :
   aiger_interface = Aiger()
   aiger_interface.readAiger(fname)
   pis = [processAigerVariable(x) for x in aiger_interface.getInputs()]
   pos = [processAigerVariable(x) for x in aiger_interface.getOutputs()]
   pos_set = set(pos)
-  spec = Specification(pis, pos)
+  spec = CompactSpecification(pis, pos) if compact else Specification(pis, pos)
   for idx, out in enumerate(aiger_interface.getOutputs()) :
     if isNegatedAigerLiteral(out) :
       spec.negated_pos[idx] = 1
@@ -1,14 +1,16 @@
 import bitarray
 
 from specification import Specification
+from compactSpecification import CompactSpecification
 from utils import isNormalised
 from utils import negateTable
-from utils import getBitSeq
+from gateTables import getGateTable
 
 # ordered_blif: the gates are ordered topologically
-def getSpecification(fname, ordered_blif=False) :
+# compact: use the array based storage (see CompactSpecification)
+def getSpecification(fname, ordered_blif=False, compact=False) :
   parser = BlifParser()
-  return parser.parse(fname, ordered_blif)
+  return parser.parse(fname, ordered_blif, compact)
 
 def writeSpecification(fname, spec, spec_name = "spec") :
   with open(fname,"w") as file: 
@@ -49,10 +51,10 @@ def writeSpecification2Stream(out, spec, spec_name = "spec") :
 def writeBlifGate(file, alias, table, inputs, negated_gates) :
   file.write(".names " + " ".join(str(x) for x in inputs) + " " + str(alias) + "\n")
   negated_inputs_indices = {idx for idx, var in enumerate(inputs) if var in negated_gates}
-  for idx, val in enumerate(table) :
-    if val == 1 :
-      binary_representation = [x ^ 1 if idx in negated_inputs_indices else x for idx, x in enumerate(getBitSeq(idx, len(inputs)))]
-      file.write("".join(str(x) for x in binary_representation) + " 1\n")
+  for row in getGateTable(table).getBlifRows() :
+    if len(negated_inputs_indices) > 0 :
+      row = "".join(("1" if x == "0" else "0") if idx in negated_inputs_indices else x for idx, x in enumerate(row))
+    file.write(row + " 1\n")
 
 
 class BlifParser :
@@ -61,13 +63,13 @@ class BlifParser :
   class InvalidBlifException(Exception):
     pass
 
-  def parse(self, fname, ordered_blif) :
+  def parse(self, fname, ordered_blif, compact = False) :
     self.max_var = 0
     self.alias_renaming = {}
     self.alias_names = set()
     with open(fname,"r") as file: 
       inputs, outputs = self.readBlifIO(file)
-      spec_builder = SpecificationBuilder(inputs, outputs, ordered_blif)
+      spec_builder = SpecificationBuilder(inputs, outputs, ordered_blif, compact)
       self.readGates(spec_builder, file)
     return spec_builder.getSpecification()
 
@@ -170,8 +172,8 @@ class BlifParser :
 class SpecificationBuilder :
 
 
-  def __init__(self, pis, pos, gates_topologoically_ordered = False) :
-    self.specification = Specification(pis, pos)
+  def __init__(self, pis, pos, gates_topologoically_ordered = False, compact = False) :
+    self.specification = CompactSpecification(pis, pos) if compact else Specification(pis, pos)
     self.negated_gates = set()
     self.pos_set = set(pos)
     self.gates_topologoically_ordered = gates_topologoically_ordered
@@ -0,0 +1,61 @@
+import json
+import logging
+
+
+# Stores the chosen subcircuit size and the timing statistics (timeouts, solver timings, timeout model) at the end of a run.
+# If a profile of a previous run is loaded, the traversal starts with the calibrated subcircuit size and timeouts
+# instead of calibrating them again, which pays off for runs with small budgets on similar circuits.
+# A profile is only used with the settings it was created with (solver, synthesis mode, gate size, encoding).
+class CalibrationProfile :
+
+  def __init__(self, fname) :
+    self.fname = fname
+    self.data = None
+
+  @staticmethod
+  def _getSettings(config) :
+    return {
+      "solver" : config.qbf_solver.name,
+      "synthesis_approach" : config.synthesis_approach.name,
+      "gate_size" : config.gate_size,
+      "aig" : config.synthesiseAig,
+      "windowed_encoding" : config.use_windowed_encoding,
+      "window" : [config.window_tfi_depth, config.window_tfo_depth]
+    }
+
+  # Returns True if a profile with matching settings was loaded
+  def load(self, config) :
+    try :
+      with open(self.fname) as f :
+        data = json.load(f)
+    except FileNotFoundError :
+      return False
+    except (OSError, ValueError) :
+      logging.warning(f"Could not read the calibration profile {self.fname}")
+      return False
+    if data.get("settings") != CalibrationProfile._getSettings(config) :
+      logging.warning(f"The calibration profile {self.fname} was created with other settings -- it is not used")
+      return False
+    # JSON only supports string keys
+    timer = data["synthesiser"]["timer"]
+    for key in ["timeouts", "sat", "unsat", "per_subcircuit_size"] :
+      timer[key] = {int(size) : x for size, x in timer[key].items()}
+    self.data = data
+    return True
+
+  def isLoaded(self) :
+    return self.data is not None
+
+  # Returns the subcircuit size with which the traversal of the synthesiser shall start
+  def apply(self, synthesiser) :
+    assert self.isLoaded()
+    return synthesiser.setCalibrationData(self.data["synthesiser"])
+
+  def record(self, synthesiser, config) :
+    self.data = {"settings" : CalibrationProfile._getSettings(config), "synthesiser" : synthesiser.getCalibrationData()}
+
+  def save(self) :
+    if self.data is None :
+      return
+    with open(self.fname, "w") as f :
+      json.dump(self.data, f)
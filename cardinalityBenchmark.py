@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import random
+import subprocess
+
+from encoderCircuits import EncoderCircuits
+from synthesiser import Synthesiser
+from utils import Configuration
+from utils import EncodingFile
+from utils import mean
+
+############################################################################
+# Compares the solver times of the available cardinality encodings.
+# Random subcircuits of the given specification are selected and for each encoding
+# and each number of gates the encodings are solved with the configured solver.
+############################################################################
+
+def solveEncoding(synthesiser, encoder, nof_gates, nof_gate_inputs, timeout) :
+  with EncodingFile(".qcir", synthesiser.config.encoding_transport) as tmp :
+    encoder.getEncoding(nof_gates, nof_gate_inputs, tmp.stream)
+    tmp.flush()
+    try :
+      realisable, _, used_time, valid = synthesiser._runSolverAndGetAssignment(tmp.name, timeout, tmp.pass_fds)
+    except subprocess.TimeoutExpired :
+      return None, timeout
+  assert valid, "Solver failed"
+  return realisable, used_time
+
+
+if __name__ == "__main__" :
+
+  encoding_names = [x.name for x in Configuration.CardinalityEncoding]
+
+  parser = argparse.ArgumentParser(description="Compare the solver times of the cardinality encodings")
+  parser.add_argument('specification', metavar='SPEC', help='The specification')
+  parser.add_argument('--samples', type=int, default=20, help='The number of subcircuits')
+  parser.add_argument('--size', type=int, default=6, help='The size of the subcircuits')
+  parser.add_argument('--gs', type=int, default=2, help='The number of inputs of the gates')
+  parser.add_argument('--timeout', type=int, default=60, help='Timeout for the individual solver calls')
+  parser.add_argument('--seed', type=int, default=0, help='Set the seed for random number generation')
+  parser.add_argument('--encodings', nargs='+', choices=encoding_names, default=encoding_names, help='The encodings to compare')
+  parser.add_argument('--outputs-only', action='store_true', help='Only apply the encodings to the gate output variables')
+  parser.add_argument('--no-gate-input-vars', action='store_true', help='Do not use gate input variables')
+  args = parser.parse_args()
+
+  random.seed(args.seed)
+  config = Configuration()
+  config.gate_size = args.gs
+  config.useGateInputVariables = not args.no_gate_input_vars
+  synthesiser = Synthesiser(Synthesiser.getSpecification(args.specification), config)
+  specification = synthesiser.specification
+
+  gates = sorted(specification.getGateAliases())
+  subcircuits = []
+  while len(subcircuits) < args.samples :
+    to_replace = synthesiser._getSubcircuitGates(random.choice(gates), args.size)
+    if len(specification.getSubcircuitInputs(to_replace)) >= args.gs :
+      subcircuits.append(to_replace)
+
+  # (encoding, nof_gates) -> list of solver times
+  timings = {}
+  nof_variables = {}
+  nof_timeouts = {}
+  results = {}
+  for name in args.encodings :
+    encoding = Configuration.CardinalityEncoding[name]
+    config.output_cardinality_encoding = encoding
+    if not args.outputs_only :
+      config.selection_cardinality_encoding = encoding
+    for i, to_replace in enumerate(subcircuits) :
+      encoder = EncoderCircuits(specification, to_replace, config)
+      encoder.useGateInputVariables(config.useGateInputVariables)
+      for nof_gates in range(len(to_replace) - 1, 0, -1) :
+        realisable, used_time = solveEncoding(synthesiser.synthesiser, encoder, nof_gates, args.gs, args.timeout)
+        key = (name, nof_gates)
+        timings.setdefault(key, []).append(used_time)
+        nof_variables.setdefault(key, []).append(encoder.last_used_variable - encoder.max_var_fixed_encoding)
+        if realisable is None :
+          nof_timeouts[key] = nof_timeouts.get(key, 0) + 1
+          continue
+        # All encodings must agree on the realisability
+        assert results.setdefault((i, nof_gates), realisable) == realisable, f"Encodings disagree on subcircuit {to_replace} with {nof_gates} gates"
+        if not realisable :
+          break
+
+  print("encoding; nof gates; nof checks; mean time; max time; timeouts; mean nof added variables")
+  for name in args.encodings :
+    for nof_gates in range(args.size - 1, 0, -1) :
+      key = (name, nof_gates)
+      if not key in timings :
+        continue
+      print(f"{name}; {nof_gates}; {len(timings[key])}; {mean(timings[key]):.4f}; {max(timings[key]):.4f}; {nof_timeouts.get(key, 0)}; {mean(nof_variables[key]):.1f}")
@@ -0,0 +1,278 @@
+import time
+import threading
+import subprocess
+
+try :
+  from pysat.solvers import Solver
+  from pysat.card import CardEnc, EncType
+  from pysat.formula import IDPool
+  pysat_available = True
+except ImportError :
+  pysat_available = False
+
+import truthTables
+from utils import NoOutputException
+from utils import Configuration
+
+# Counterexample guided synthesis of a replacement for a subcircuit.
+# In contrast to the QBF encodings the replacement must realise the same functions as the subcircuit
+# in terms of the subcircuit inputs. Only assignments to the subcircuit inputs that cannot occur
+# (satisfiability don't cares) are ignored. Observability don't cares are not exploited.
+#
+# The existential part (a circuit with the given number of gates) is solved by an incremental SAT solver
+# for a growing set of input patterns. Candidates are verified by simulating their truth tables.
+#
+# The class provides the interface of the encoders that is used to extract the synthesised circuit
+# (getSelectionVariables, getGateDefinitionVariables, getGateOutputVariables, completeAssignment).
+class CegisSynthesiser :
+
+  # The engine can be applied if pysat is available, the subcircuit has few inputs and there are no potential cycles
+  @staticmethod
+  def isApplicable(specification, to_replace, config : Configuration) :
+    if not pysat_available :
+      return False
+    inputs = specification.getSubcircuitInputs(to_replace)
+    if len(inputs) > config.cegis_max_inputs :
+      return False
+    outputs = specification.getSubcircuitOutputs(to_replace)
+    return len(specification.getPotentialCycles(inputs, outputs, to_replace)) == 0
+
+  def __init__(self, specification, gates_to_replace, config : Configuration) :
+    self.specification = specification
+    self.to_replace = gates_to_replace
+    self.config = config
+    self.subcircuit_inputs = list(specification.getSubcircuitInputs(gates_to_replace))
+    self.subcircuit_outputs = list(specification.getSubcircuitOutputs(gates_to_replace))
+    if len(self.subcircuit_outputs) == 0 :
+      raise NoOutputException
+    self.inputs = self.subcircuit_inputs
+    self.useTrivialRuleConstraint = config.useTrivialRuleConstraint
+    self.useAllStepsConstraint = config.useAllStepsConstraint
+    self.useNoReapplicationConstraint = config.useNoReapplicationConstraint
+    self.selection_variables = []
+    self.gate_definition_variables = []
+    self.gate_output_variables = []
+    self._setupTargetFunctions()
+    # The functions of the outputs are preserved (see lowerBounds)
+    self.lower_bound_functions = (self.targets, self.care_set) if config.use_lower_bounds else None
+
+  # The no reapplication rule is not used by the engine. The remaining constraints cannot prevent a realisation.
+  def disableSymmetryBreaking(self) :
+    self.useNoReapplicationConstraint = False
+
+  def getSelectionVariables(self) :
+    return self.selection_variables
+
+  def getGateDefinitionVariables(self) :
+    return self.gate_definition_variables
+
+  def getGateOutputVariables(self) :
+    return self.gate_output_variables
+
+  def getSubcircuitInputs(self) :
+    return self.subcircuit_inputs
+
+  def getSubcircuitOutputs(self) :
+    return self.subcircuit_outputs
+
+  def useGateInputVariables(self, val) :
+    pass
+
+  def completeAssignment(self, assignment) :
+    pass
+
+  def _setupTargetFunctions(self) :
+    nof_inputs = len(self.subcircuit_inputs)
+    self.mask = truthTables.getMask(nof_inputs)
+    functions = self.specification.getConeFunctions(self.subcircuit_outputs, self.subcircuit_inputs)
+    self.targets = [functions[x] for x in self.subcircuit_outputs]
+    # Only patterns of the subcircuit inputs that can occur need to be considered
+    self.care_set = self.mask
+    support = self.specification.getSupport(self.subcircuit_inputs, self.config.window_sdc_support_limit)
+    if support is not None :
+      support = list(support)
+      input_functions = self.specification.getConeFunctions(self.subcircuit_inputs, support)
+      patterns = truthTables.getOccurringPatterns([input_functions[x] for x in self.subcircuit_inputs], len(support))
+      self.care_set = sum(1 << x for x in patterns)
+
+  # Returns (realisable, assignment, used_time).
+  # Raises subprocess.TimeoutExpired if the timeout (0 means no timeout) is exceeded.
+  def synthesise(self, nof_gates, nof_gate_inputs, timeout = 0) :
+    start = time.time()
+    self.nof_gates = nof_gates
+    self.nof_gate_inputs = nof_gate_inputs
+    self.pool = IDPool()
+    self.input_tables = truthTables.getVariableTables(len(self.subcircuit_inputs))
+    with Solver(name = "g3") as solver :
+      self.solver = solver
+      self._setupVariables()
+      self._addCircuitConstraints()
+      while True :
+        realisable = self._solve(solver, start, timeout)
+        if not realisable :
+          return False, {}, time.time() - start
+        model = set(x for x in solver.get_model() if x > 0)
+        counterexample = self._verifyCandidate(model)
+        if counterexample is None :
+          return True, self._getAssignment(model), time.time() - start
+        self._addPatternConstraints(counterexample)
+
+  def _solve(self, solver, start, timeout) :
+    if timeout == 0 :
+      return solver.solve()
+    remaining = timeout - (time.time() - start)
+    if remaining <= 0 :
+      raise subprocess.TimeoutExpired("cegis", timeout)
+    timer = threading.Timer(remaining, solver.interrupt)
+    timer.start()
+    try :
+      result = solver.solve_limited(expect_interrupt = True)
+    finally :
+      timer.cancel()
+    if result is None :
+      raise subprocess.TimeoutExpired("cegis", timeout)
+    solver.clear_interrupt()
+    return result
+
+  # Nodes: the subcircuit inputs followed by the gates
+  def _setupVariables(self) :
+    nof_inputs = len(self.subcircuit_inputs)
+    new_var = self.pool.id
+    self.selection_tuples = []
+    for i in range(self.nof_gates) :
+      tuples = {}
+      idx_tuple = list(range(self.nof_gate_inputs))
+      while idx_tuple[-1] < nof_inputs + i :
+        tuples[tuple(idx_tuple)] = new_var()
+        idx_tuple = self._nextIndexTuple(idx_tuple)
+      self.selection_tuples.append(tuples)
+    self.selection_variables = tuple(tuple(new_var() for _ in range(nof_inputs + i)) for i in range(self.nof_gates))
+    offset = 1 # We use normal gates
+    self.gate_definition_variables = tuple(tuple(new_var() for _ in range(2 ** self.nof_gate_inputs - offset)) for _ in range(self.nof_gates))
+    self.gate_output_variables = [tuple(new_var() for _ in self.subcircuit_outputs) for _ in range(self.nof_gates)]
+    if self.config.allowInputsAsOutputs :
+      self.gate_output_variables += [tuple(new_var() for _ in self.subcircuit_outputs) for _ in self.subcircuit_inputs]
+    if self.config.allowConstantsAsOutputs :
+      self.gate_output_variables.append(tuple(new_var() for _ in self.subcircuit_outputs))
+
+  def _nextIndexTuple(self, idx_tuple) :
+    for k in range(len(idx_tuple)) :
+      if k == len(idx_tuple) - 1 or idx_tuple[k] + 1 < idx_tuple[k + 1] :
+        idx_tuple[k] += 1
+        for l in range(k) :
+          idx_tuple[l] = l
+        return idx_tuple
+
+  def _addExactlyOne(self, lits) :
+    if len(lits) == 0 :
+      # unsatisfiable
+      x = self.pool.id()
+      self.solver.append_formula([[x], [-x]])
+      return
+    cnf = CardEnc.equals(lits = list(lits), bound = 1, vpool = self.pool, encoding = EncType.seqcounter)
+    self.solver.append_formula(cnf.clauses)
+
+  def _addCircuitConstraints(self) :
+    solver = self.solver
+    for i in range(self.nof_gates) :
+      self._addExactlyOne(self.selection_tuples[i].values())
+      definitions = self.gate_definition_variables[i]
+      if self.useTrivialRuleConstraint :
+        # Neither constant nor the projection of one of its inputs
+        solver.add_clause(list(definitions))
+        for p in range(self.nof_gate_inputs) :
+          solver.add_clause([-x if row >> (self.nof_gate_inputs - 1 - p) & 1 else x for row, x in enumerate(definitions, 1)])
+      if self.config.synthesiseAig :
+        assert self.nof_gate_inputs == 2, "An AIG gates must have two inputs"
+        solver.add_clause([-definitions[0], -definitions[1], definitions[2]])
+    for o in range(len(self.subcircuit_outputs)) :
+      self._addExactlyOne([x[o] for x in self.gate_output_variables])
+    if self.useAllStepsConstraint :
+      nof_inputs = len(self.subcircuit_inputs)
+      for i in range(self.nof_gates) :
+        clause = list(self.gate_output_variables[i])
+        for j in range(i + 1, self.nof_gates) :
+          clause += [s for idx_tuple, s in self.selection_tuples[j].items() if nof_inputs + i in idx_tuple]
+        solver.add_clause(clause)
+
+  # Adds the constraints that the circuit yields the target values for the given pattern of the subcircuit inputs
+  def _addPatternConstraints(self, pattern) :
+    solver = self.solver
+    nof_inputs = len(self.subcircuit_inputs)
+    new_var = self.pool.id
+    gate_values = [new_var() for _ in range(self.nof_gates)]
+    # For nodes that are subcircuit inputs the value is known, for gates the value is a variable
+    def getValueLiteral(node, val) :
+      if node < nof_inputs :
+        return None if (pattern >> node & 1) == val else False
+      return gate_values[node - nof_inputs] if val else -gate_values[node - nof_inputs]
+
+    for i in range(self.nof_gates) :
+      value = gate_values[i]
+      for idx_tuple, s in self.selection_tuples[i].items() :
+        for row in range(2 ** self.nof_gate_inputs) :
+          # The clause is satisfied if the inputs do not have the values given by row
+          clause = [-s]
+          satisfied = False
+          for p, node in enumerate(idx_tuple) :
+            lit = getValueLiteral(node, row >> (self.nof_gate_inputs - 1 - p) & 1)
+            if lit is False :
+              satisfied = True
+              break
+            if lit is not None :
+              clause.append(-lit)
+          if satisfied :
+            continue
+          if row == 0 : # normal gates
+            solver.add_clause(clause + [-value])
+          else :
+            definition = self.gate_definition_variables[i][row - 1]
+            solver.add_clause(clause + [-value, definition])
+            solver.add_clause(clause + [value, -definition])
+
+    for o, target in enumerate(self.targets) :
+      expected = target >> pattern & 1
+      for i in range(self.nof_gates) :
+        solver.add_clause([-self.gate_output_variables[i][o], gate_values[i] if expected else -gate_values[i]])
+      if self.config.allowInputsAsOutputs :
+        for j in range(nof_inputs) :
+          if (pattern >> j & 1) != expected :
+            solver.add_clause([-self.gate_output_variables[self.nof_gates + j][o]])
+      if self.config.allowConstantsAsOutputs and expected :
+        solver.add_clause([-self.gate_output_variables[-1][o]])
+
+  # Returns a pattern of the care set for which the candidate differs from the target functions (None if there is no such pattern)
+  def _verifyCandidate(self, model) :
+    nof_inputs = len(self.subcircuit_inputs)
+    tables = list(self.input_tables)
+    for i in range(self.nof_gates) :
+      idx_tuple = next(x for x, s in self.selection_tuples[i].items() if s in model)
+      table = [0] + [1 if x in model else 0 for x in self.gate_definition_variables[i]]
+      tables.append(truthTables.evaluateGateTable(table, [tables[x] for x in idx_tuple], self.mask))
+    candidates = tables[nof_inputs:]
+    if self.config.allowInputsAsOutputs :
+      candidates += tables[:nof_inputs]
+    if self.config.allowConstantsAsOutputs :
+      candidates.append(0)
+    difference = 0
+    for o, target in enumerate(self.targets) :
+      j = next(j for j, x in enumerate(self.gate_output_variables) if x[o] in model)
+      difference |= candidates[j] ^ target
+    difference &= self.care_set
+    if difference == 0 :
+      return None
+    return (difference & -difference).bit_length() - 1
+
+  # The assignment of the interface variables (see _extractGatesFromAssignment)
+  def _getAssignment(self, model) :
+    assignment = {}
+    for i in range(self.nof_gates) :
+      idx_tuple = next(x for x, s in self.selection_tuples[i].items() if s in model)
+      for j, sv in enumerate(self.selection_variables[i]) :
+        assignment[sv] = j in idx_tuple
+      for x in self.gate_definition_variables[i] :
+        assignment[x] = x in model
+    for output_vars in self.gate_output_variables :
+      for x in output_vars :
+        assignment[x] = x in model
+    return assignment
@@ -0,0 +1,105 @@
+import bitarray
+
+# Size of the chunks in which the output of a solver is read
+chunk_size = 1 << 16
+
+
+# The values of the variables of a certificate, stored in a bitmap indexed by the variable id.
+# Variables that are not given by the certificate are false.
+class Assignment :
+
+  def __init__(self, max_var) :
+    self.values = bitarray.bitarray(max_var + 1)
+    self.values.setall(0)
+
+  def __getitem__(self, var) :
+    return self.values[var]
+
+  def __setitem__(self, var, value) :
+    self.values[var] = value
+
+
+# Parses the certificate of a solver while the solver output is read.
+# The certificate is given by the lines that start with the marker (e.g. "v 1 -2 3 0").
+# Only the values of the given variables are extracted, all other literals are skipped without converting them.
+# The output that does not belong to the certificate is kept (it is only used for error messages).
+class CertificateParser :
+
+  def __init__(self, marker, variables, max_var) :
+    self.marker = marker
+    self.assignment = Assignment(max_var)
+    # Maps the byte representation of the relevant literals to their variable and value
+    self.literals = {}
+    for x in variables :
+      self.literals[str(x).encode()] = (x, 1)
+      self.literals[str(-x).encode()] = (x, 0)
+    self.pending = b""
+    self.at_line_start = True
+    self.in_certificate = False
+    self.found_certificate = False
+    self.other_output = []
+
+  def feed(self, data) :
+    if len(self.pending) > 0 :
+      data = self.pending + data
+      self.pending = b""
+    pos = 0
+    while pos < len(data) :
+      if self.at_line_start :
+        self.at_line_start = False
+        self.in_certificate = data.startswith(self.marker, pos)
+        if self.in_certificate :
+          self.found_certificate = True
+          pos += len(self.marker)
+      end = data.find(b"\n", pos)
+      if end < 0 :
+        if not self.in_certificate :
+          self.other_output.append(data[pos:])
+          return
+        # The last literal may be continued by the next chunk
+        split = max(data.rfind(b" ", pos), data.rfind(b"\t", pos))
+        if split < pos :
+          self.pending = data[pos:]
+        else :
+          self._parseLiterals(data[pos:split])
+          self.pending = data[split:]
+        return
+      if self.in_certificate :
+        self._parseLiterals(data[pos:end])
+      else :
+        self.other_output.append(data[pos:end + 1])
+      pos = end + 1
+      self.at_line_start = True
+
+  def _parseLiterals(self, segment) :
+    literals = self.literals
+    values = self.assignment.values
+    for token in segment.split() :
+      literal = literals.get(token)
+      if literal is not None :
+        values[literal[0]] = literal[1]
+
+  # Must be called after the entire output was given to feed
+  def finish(self) :
+    if len(self.pending) > 0 :
+      if self.in_certificate :
+        self._parseLiterals(self.pending)
+      else :
+        self.other_output.append(self.pending)
+      self.pending = b""
+
+  def getAssignment(self) :
+    return self.assignment
+
+  def getOtherOutput(self) :
+    return b"".join(self.other_output)
+
+
+# Feeds the output of the process to the parser (the stream must be a binary stream, e.g. Popen.stdout)
+def parseStream(stream, parser) :
+  while True :
+    data = stream.read1(chunk_size)
+    if len(data) == 0 :
+      break
+    parser.feed(data)
+  parser.finish()
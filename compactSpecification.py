@@ -0,0 +1,231 @@
+import array
+
+from specification import Gate
+from specification import Specification
+from gateTables import getGateTable
+from gateTables import getGateTableFromValue
+
+# Tables of gates with at most this number of inputs are packed into a 64-bit word
+max_packed_inputs = 6
+# The data arrays of the blocks are only compacted if they have at least this size
+min_compaction_size = 1 << 12
+
+
+# Stores a list of integers per node in a single array (CSR style).
+# The block of a node is given by its start, its number of entries and its capacity.
+# If a block becomes too small it is moved to the end of the data array; the data array is
+# compacted once more than half of its entries are unused.
+class Blocks :
+
+  def __init__(self) :
+    self.start = array.array("i")
+    self.count = array.array("i")
+    self.capacity = array.array("i")
+    self.data = array.array("i")
+    self.nof_unused = 0
+
+  def resize(self, size) :
+    extension = size - len(self.start)
+    for x in [self.start, self.count, self.capacity] :
+      x.frombytes(bytes(extension * x.itemsize))
+
+  def get(self, node) :
+    start = self.start[node]
+    return self.data[start : start + self.count[node]].tolist()
+
+  def set(self, node, values, slack = 0) :
+    if len(values) > self.capacity[node] :
+      self._relocate(node, len(values) + slack)
+    start = self.start[node]
+    self.data[start : start + len(values)] = array.array("i", values)
+    self.count[node] = len(values)
+
+  def clear(self, node) :
+    self.count[node] = 0
+
+  # Entries may be added multiple times. Duplicates are removed before a full block is enlarged.
+  def append(self, node, value) :
+    count = self.count[node]
+    if count == self.capacity[node] :
+      values = list(dict.fromkeys(self.get(node)))
+      self.count[node] = len(values)
+      if len(values) == count :
+        self._relocate(node, max(2, 2 * count))
+      start = self.start[node]
+      self.data[start : start + len(values)] = array.array("i", values)
+      count = len(values)
+    self.data[self.start[node] + count] = value
+    self.count[node] = count + 1
+
+  # Removes all occurrences of value
+  def remove(self, node, value) :
+    start = self.start[node]
+    end = start + self.count[node]
+    while True :
+      try :
+        idx = self.data.index(value, start, end)
+      except ValueError :
+        break
+      end -= 1
+      self.data[idx] = self.data[end]
+    self.count[node] = end - start
+
+  def release(self, node) :
+    self.nof_unused += self.capacity[node]
+    self.capacity[node] = 0
+    self.count[node] = 0
+    self._compact()
+
+  def _relocate(self, node, capacity) :
+    start = self.start[node]
+    values = self.data[start : start + self.count[node]]
+    self.nof_unused += self.capacity[node]
+    self.start[node] = len(self.data)
+    self.capacity[node] = capacity
+    self.data.extend(values)
+    self.data.frombytes(bytes((capacity - len(values)) * self.data.itemsize))
+    self._compact()
+
+  def _compact(self) :
+    if len(self.data) < min_compaction_size or 2 * self.nof_unused <= len(self.data) :
+      return
+    data = array.array("i")
+    for node, capacity in enumerate(self.capacity) :
+      if capacity > 0 :
+        start = self.start[node]
+        self.start[node] = len(data)
+        data.extend(self.data[start : start + capacity])
+    self.data = data
+    self.nof_unused = 0
+
+
+# A specification that stores the circuit in flat arrays instead of dictionaries, sets and Gate objects.
+# This reduces the memory per gate considerably and avoids hashing in the traversals of large circuits.
+# The aliases are used as dense node ids (the parsers number the nodes consecutively), i.e. all arrays are indexed by the alias.
+# The inputs and outputs of the nodes are stored in Blocks. The tables are packed into integers whose bit i is entry i of Gate.table.
+# The query API is the same as the one of Specification. Gate objects are created on request (getGate, gateTraversal);
+# changing such an object does not change the specification.
+class CompactSpecification(Specification) :
+
+  def __init__(self, pis, pos) :
+    super().__init__(pis, pos)
+    self.alias2gate = None
+    self.alias2outputs = None
+    self.alias2level = None
+    self.nof_nodes = 0
+    self.node_kinds = bytearray() # 0: unused, 1: PI, 2: gate
+    self.levels = array.array("i")
+    self.alias2order = array.array("i")
+    self.tables = array.array("Q")
+    self.large_tables = {}
+    self.fanin = Blocks()
+    self.fanout = Blocks()
+    self.nof_gates = 0
+    self._reserveNodes([self.max_var])
+    for x in self.pis :
+      self.node_kinds[x] = 1
+
+  def gateTraversal(self) :
+    for x in self.getGateAliases() :
+      yield self.getGate(x)
+
+  def getGateAliases(self) :
+    return [x for x, kind in enumerate(self.node_kinds) if kind == 2]
+
+  def getGateAliasesSet(self) :
+    return set(self.getGateAliases())
+
+  def getNofGates(self) :
+    return self.nof_gates
+
+  def getGate(self, alias) :
+    assert self.isGate(alias)
+    return Gate(alias, self.fanin.get(alias), self._getTable(alias))
+
+  def getGateInputs(self, alias) :
+    return self.fanin.get(alias)
+
+  def getGateOutputs(self, alias) :
+    return set(self.fanout.get(alias))
+
+  def getGateLevel(self, alias) :
+    return self.levels[alias]
+
+  def isGate(self, alias) :
+    return alias < self.nof_nodes and self.node_kinds[alias] == 2
+
+  def _getTable(self, alias) :
+    nof_inputs = self.fanin.count[alias]
+    value = self.tables[alias] if nof_inputs <= max_packed_inputs else self.large_tables[alias]
+    return getGateTableFromValue(nof_inputs, value).table
+
+  def _setTable(self, alias, table) :
+    value = getGateTable(table).value
+    if len(table) <= 2 ** max_packed_inputs :
+      self.tables[alias] = value
+      self.large_tables.pop(alias, None)
+    else :
+      self.large_tables[alias] = value
+
+  def _isNode(self, alias) :
+    return alias < self.nof_nodes and self.node_kinds[alias] != 0
+
+  def _reserveNodes(self, aliases) :
+    if len(aliases) == 0 or max(aliases) < self.nof_nodes :
+      return
+    size = max(max(aliases) + 1, 2 * self.nof_nodes)
+    extension = size - self.nof_nodes
+    self.node_kinds.extend(bytes(extension))
+    self.levels.frombytes(bytes(extension * self.levels.itemsize))
+    self.alias2order.extend(array.array("i", [-1]) * extension)
+    self.tables.frombytes(bytes(extension * self.tables.itemsize))
+    self.fanin.resize(size)
+    self.fanout.resize(size)
+    self.nof_nodes = size
+
+  def _storeGate(self, alias, inputs, table) :
+    self._reserveNodes([alias])
+    if self.node_kinds[alias] != 2 :
+      self.nof_gates += 1
+    self.node_kinds[alias] = 2
+    self.fanin.set(alias, inputs)
+    self.fanout.clear(alias)
+    self.levels[alias] = -1 # not yet computed
+    self._setTable(alias, table)
+
+  def _deleteNode(self, alias) :
+    if self.node_kinds[alias] == 2 :
+      self.nof_gates -= 1
+    self.node_kinds[alias] = 0
+    self.fanin.release(alias)
+    self.fanout.release(alias)
+    self.large_tables.pop(alias, None)
+
+  def _addGateOutput(self, alias, output) :
+    self.fanout.append(alias, output)
+
+  def _removeGateOutput(self, alias, output) :
+    if self._isNode(alias) :
+      self.fanout.remove(alias, output)
+
+  def _setGateLevel(self, alias, level) :
+    self.levels[alias] = level
+
+  def _substituteGateInputs(self, alias, renaming) :
+    gate = self.getGate(alias)
+    renamed_inputs = gate.substitute(renaming)
+    self.fanin.set(alias, gate.inputs)
+    self._setTable(alias, gate.table)
+    return renamed_inputs, gate.isConstant()
+
+  def _indexTopologicalOrder(self) :
+    for idx, x in enumerate(self.topological_order) :
+      self.alias2order[x] = idx
+    self.nof_order_holes = 0
+
+  def _releaseOrderSlot(self, alias) :
+    slot = self.alias2order[alias]
+    if slot >= 0 :
+      self.alias2order[alias] = -1
+      self.topological_order[slot] = None
+      self.nof_order_holes += 1
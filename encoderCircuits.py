@@ -1,11 +1,20 @@
 from sys import stdout
+from collections import deque
 
 import blifIO
+import truthTables
+import lowerBounds
+from qcirBuffer import QCIRBuffer
 from utils import NoOutputException
 from utils import Configuration
 
+CardinalityEncoding = Configuration.CardinalityEncoding
+
 class EncoderCircuits :
 
+  # Number of values returned by getEncodingFeatures
+  nof_encoding_features = 7
+
   @staticmethod
   def getSingleEncoding(specification, gates_to_replace, nof_gates, nof_gate_inputs, config, out) :
     encoder = EncoderCircuits(specification, gates_to_replace)
@@ -18,24 +27,35 @@ class EncoderCircuits :
     self.config = config
     self.last_used_variable = specification.max_var
     self.allow_xors = False
-    # self.writeComments = False
-    self.writeComments = True
+    self.writeComments = config.write_encoding_comments
     self.debug = False
+    self.use_window = config.use_windowed_encoding
     self._getSubcircuitIO()
     self._analyse_subcircuit()
+    if self.use_window :
+      self._setupWindow()
+    self._analyseZeroGateRealisation()
+    self._setupLowerBoundFunctions()
     self.max_var_specification_representation = self.last_used_variable
+    # The part of the encoding that does not depend on the number of gates is only rendered once
+    self.fixed_encoding = None
     self.internal_gates = []
     self.selection_variables = []
     self.gate_definition_variables = []
     self.gate_output_variables = []
+    self.certificate_variables = []
 
     self.useTrivialRuleConstraint = config.useTrivialRuleConstraint
     self.useNoReapplicationConstraint = config.useNoReapplicationConstraint
     self.useAllStepsConstraint = config.useAllStepsConstraint
     self.useOrderedStepsConstraint = config.useOrderedStepsConstraint
+    self.selection_cardinality_encoding = config.selection_cardinality_encoding
+    self.output_cardinality_encoding = config.output_cardinality_encoding
     # If true, we introduce for each gate and for each of its inputs a variable that represents the input.
     # The aim of this approach is to reduce the number of gates that need to be introduced for k-LUTs with larger k.
     self.use_gate_input_variables = False
+    # Set when the encoder is set up: the replaced subcircuit satisfies the constraints of the encoding (see SubcircuitSynthesiser.synthesise)
+    self.admits_original_subcircuit = False
 
   # Symmetry breaking constraints may prevent the realisation of a circuit.
   # The method disables the problematic constraints
@@ -53,6 +73,16 @@ class EncoderCircuits :
   def getGateOutputVariables(self) :
     return self.gate_output_variables
 
+  # The variables whose values need to be read from the certificate of the solver
+  def getCertificateVariables(self) :
+    return self.certificate_variables
+
+  # Features of the last generated encoding that are used for predicting the time of the solver call (see TimeoutModel):
+  # nof gates, nof subcircuit inputs, nof subcircuit outputs, nof potential cycles, nof universal variables,
+  # nof copied gates and nof variables of the encoding
+  def getEncodingFeatures(self) :
+    return (self.nof_gates, len(self.inputs), len(self.subcircuit_outputs), len(self.forbidden), len(self._getUniversallyQuantifiedVariables()), len(self.gates_to_copy), self.last_used_variable)
+
   def getSubcircuitInputs(self) :
     return self.subcircuit_inputs
 
@@ -64,17 +94,38 @@ class EncoderCircuits :
 
 
   def _resetEncoder(self) :
-    self.last_used_variable = self.max_var_specification_representation
+    self.last_used_variable = self.max_var_fixed_encoding
     self.constraintGates = []
 
+  # The specification and the copy of the specification do not depend on the number of gates.
+  # Their encoding is shared by all encodings generated by this encoder.
+  # The variables introduced by the fixed part precede the variables introduced for a particular number of gates.
+  def _renderFixedEncoding(self) :
+    self.buffer = QCIRBuffer()
+    self.last_used_variable = self.max_var_specification_representation
+    self.dont_care_variable = None
+    self._writeComment("Specification")
+    self._writeSpecification()
+    self._writeComment("Specification Copy")
+    self._writeSpecificationCopy()
+    self.fixed_encoding = self._serialiseFixedEncoding()
+    self.max_var_fixed_encoding = self.last_used_variable
+
+  # Renders the fixed part in advance. If a window is used, no further encoding accesses the specification.
+  def prepareFixedEncoding(self) :
+    if self.fixed_encoding is None :
+      self._renderFixedEncoding()
+
   def getEncoding(self, nof_gates, nof_gate_inputs, out, ) :
     # We only allow gates with exactly nof_gate_inputs inputs.
     # Thus, if the subcircuit has fewer inputs we cannot construct gates 
     assert len(self.inputs) >= nof_gate_inputs, "The specification must have more inputs than the gates"
     self.nof_gates = nof_gates
     self.nof_gate_inputs = nof_gate_inputs
-    self.out = out
+    if self.fixed_encoding is None :
+      self._renderFixedEncoding()
     self._resetEncoder()
+    self.buffer = QCIRBuffer()
 
     if self.config.allowInputsAsOutputs :
       self.connection_variables = {y : [self._getNewVariable() for _ in range(self.nof_gates + len(self.inputs))] for y in set(x for _, x in self.forbidden)}
@@ -83,10 +134,8 @@ class EncoderCircuits :
     
     
     self._writePrefix()
-    self._writeComment("Specification")
-    self._writeSpecification()
-    self._writeComment("Specification Copy")
-    self._writeSpecificationCopy()
+    self.buffer.addText(self.fixed_encoding)
+    self._writeBinaryDecodings()
     if len(self.forbidden) > 0 :
       self._writeComment("Cycle Constraint")
       self._writeCycleConstraint()
@@ -94,7 +143,20 @@ class EncoderCircuits :
       self._writeAigerConstraints()
     self._writeEncoding()
     self._writeEquivalenceConstraints()
-    self._writeAnd(self.output_var, self.constraintGates)
+    if self.dont_care_variable is None :
+      self._writeAnd(self.output_var, self.constraintGates)
+    else :
+      # The constraints only need to hold for assignments to the window inputs that can occur
+      constraint_var = self._getNewVariable()
+      self._writeAnd(constraint_var, self.constraintGates)
+      self._writeOr(self.output_var, [self.dont_care_variable, constraint_var])
+    self._serialiseEncoding(out)
+
+  def _serialiseFixedEncoding(self) :
+    return self.buffer.getGateText()
+
+  def _serialiseEncoding(self, out) :
+    self.buffer.write(out)
 
   
   def _getSubcircuitIO(self) :
@@ -110,28 +172,38 @@ class EncoderCircuits :
     self.subcircuit_inputs = list(input_set)
     self.subcircuit_outputs = list(output_set)
     self.forbidden = self.specification.getPotentialCycles(input_set, output_set, self.to_replace)
+    # The inputs in self.forbidden are renamed later on, this list keeps the pairs of specification gates
+    self.potential_cycles = list(self.forbidden)
 
 
   def _analyse_subcircuit(self) :
     self.descendants_renaming = {}
-    to_analyse = []
+    # The gates are traversed in breadth first order. Thus, each gate is reached with its minimal depth.
+    to_analyse = deque()
     seen = set(self.subcircuit_outputs)
     for gate_var in self.subcircuit_outputs :
       self.descendants_renaming[gate_var] = self._getNewVariable()
       gate_outputs = self.specification.getGateOutputs(gate_var)
-      to_analyse += [x for x in gate_outputs if not x in seen]
+      to_analyse += [(x, 1) for x in gate_outputs if not x in seen]
       seen.update(gate_outputs)
 
     self.gates_to_copy = set()
+    if self.use_window :
+      max_depth = self.config.window_tfo_depth
+      # Gates on a path from an output to an input of the subcircuit need to be copied independent of their depth.
+      # The level of such gates is smaller than the level of the respective input.
+      cycle_level = max((self.specification.getGateLevel(x) for _, x in self.forbidden), default = 0)
 
     while len(to_analyse) > 0 :
-      gate_var = to_analyse.pop()
+      gate_var, depth = to_analyse.popleft()
       if gate_var in self.to_replace :
         continue
+      if self.use_window and depth > max_depth and self.specification.getGateLevel(gate_var) > cycle_level :
+        continue
       self.gates_to_copy.add(gate_var)
       self.descendants_renaming[gate_var] = self._getNewVariable()
       gate_outputs = self.specification.getGateOutputs(gate_var)
-      to_analyse += [x for x in gate_outputs if not x in seen]
+      to_analyse += [(x, depth + 1) for x in gate_outputs if not x in seen]
       seen.update(gate_outputs)
     
     if len(self.forbidden) > 0 : #CHECK:
@@ -144,34 +216,121 @@ class EncoderCircuits :
       self.inputs = self.subcircuit_inputs
     
 
+  # The window consists of the gates to replace, the copied gates and the gates in the transitive fan-in of the subcircuit inputs
+  # up to the given depth. The inputs of the window (leaves) are universally quantified.
+  # Equivalence is only required for the gates in the window whose value is used outside of the window.
+  def _setupWindow(self) :
+    window = set(self.to_replace)
+    window.update(self.gates_to_copy)
+    frontier = [x for x in self.subcircuit_inputs if self.specification.isGate(x)]
+    for _ in range(self.config.window_tfi_depth) :
+      next_frontier = []
+      for gate_var in frontier :
+        if gate_var in window :
+          continue
+        window.add(gate_var)
+        next_frontier += [x for x in self.specification.getGateInputs(gate_var) if self.specification.isGate(x)]
+      frontier = next_frontier
+
+    leaves = set(x for y in window for x in self.specification.getGateInputs(y))
+    leaves.difference_update(window)
+    # A constant gate shall not be treated as an input of the window
+    constant_gates = set(x for x in leaves if self.specification.isGate(x) and self.specification.getGate(x).isConstant())
+    window.update(constant_gates)
+    leaves.difference_update(constant_gates)
+    self.window_gates = sorted(window, key = lambda x : self.specification.getGateLevel(x))
+    self.window_leaves = sorted(leaves)
+
+    replaced_or_copied = set(self.to_replace)
+    replaced_or_copied.update(self.gates_to_copy)
+    self.observation_points = [x for x in self.descendants_renaming if self.specification.isPO(x) or not replaced_or_copied.issuperset(self.specification.getGateOutputs(x))]
+
+    # Satisfiability don't cares: Not every assignment to the leaves may occur
+    self.window_care_patterns = None
+    support = self.specification.getSupport(self.window_leaves, self.config.window_sdc_support_limit)
+    if support is not None :
+      support = sorted(support)
+      functions = self.specification.getConeFunctions(self.window_leaves, support)
+      patterns = truthTables.getOccurringPatterns([functions[x] for x in self.window_leaves], len(support))
+      if len(patterns) < 2 ** len(self.window_leaves) :
+        self.window_care_patterns = patterns
+
+  # Realisations without gates associate each subcircuit output with a subcircuit input or the constant false.
+  # Instead of solving the encoding for 0 gates, the functions of the outputs are compared with the functions of the inputs.
+  # The functions are given in terms of the PIs they depend on. Thus, satisfiability don't cares are considered
+  # but observability don't cares are not. If the functions depend on too many PIs, they are compared in terms of the
+  # subcircuit inputs and only a found association is definitive.
+  # zero_gate_decided: the comparison decided whether there is a realisation without gates
+  # zero_gate_association: the output association of such a realisation (None if there is none)
+  def _analyseZeroGateRealisation(self) :
+    self.zero_gate_decided = False
+    self.zero_gate_association = None
+    allow_inputs = self.config.allowInputsAsOutputs
+    allow_constants = self.config.allowConstantsAsOutputs
+    if not self.config.simulate_zero_gate_check or not (allow_inputs or allow_constants) :
+      return
+    limit = self.config.zero_gate_simulation_limit
+    support = self.specification.getSupport(self.subcircuit_inputs + self.subcircuit_outputs, limit)
+    if support is not None :
+      leaves, definitive = sorted(support), True
+    elif len(self.subcircuit_inputs) <= limit :
+      leaves, definitive = self.subcircuit_inputs, False
+    else :
+      return
+    functions = self.specification.getConeFunctions(self.subcircuit_inputs + self.subcircuit_outputs, leaves)
+    forbidden = set(self.potential_cycles)
+    association = {}
+    for output in self.subcircuit_outputs :
+      if allow_constants and functions[output] == 0 :
+        association[output] = None
+        continue
+      # An input that depends on the output cannot replace it
+      candidates = [x for x in self.subcircuit_inputs if functions[x] == functions[output] and not (output, x) in forbidden] if allow_inputs else []
+      if len(candidates) == 0 :
+        self.zero_gate_decided = definitive
+        return
+      association[output] = candidates[0]
+    self.zero_gate_decided = True
+    self.zero_gate_association = association
+
+  # The functions of the subcircuit outputs that are used for lower bounds on the number of gates (see lowerBounds).
+  # The bounds require that the functions of the outputs are preserved. This is the case if no gates of the
+  # transitive fan-out are copied, as the equivalence constraints are then imposed on the subcircuit outputs.
+  def _setupLowerBoundFunctions(self) :
+    self.lower_bound_functions = None
+    if self.config.use_lower_bounds and len(self.gates_to_copy) == 0 :
+      self.lower_bound_functions = lowerBounds.getSubcircuitFunctions(self.specification, self.subcircuit_inputs, self.subcircuit_outputs, self.config.lower_bound_support_limit)
+
   def _getUniversallyQuantifiedVariables(self) :
-    return ", ".join(str(x) for x in self.specification.getInputs())
+    if self.use_window :
+      return self.window_leaves
+    return self.specification.getInputs()
 
   def _writePrefix(self) :
-    self.out.write("#QCIR-G14\n")
     outermost_existentials = self._setupCircuitVariables()
     outermost_existentials += [x for y in self.connection_variables.values() for x in y]
-    outermost_existentials_str = ", ".join([str(x) for x in outermost_existentials])
-    self.out.write("exists(" + outermost_existentials_str + ")\n")
-    input_str = self._getUniversallyQuantifiedVariables()
-    self.out.write("forall(" + input_str + ")\n")
+    self.buffer.addQuantifierBlock("exists", outermost_existentials)
+    self.buffer.addQuantifierBlock("forall", self._getUniversallyQuantifiedVariables())
     self.internal_gates = tuple(self._getNewVariable() for x in range(self.nof_gates))
-    internal_gates_str = ", ".join(str(x) for x in self.internal_gates)
-    self.out.write("exists(" + internal_gates_str + ")\n")
+    self.buffer.addQuantifierBlock("exists", self.internal_gates)
     # Variables that represent the value of each output of the subcircuit
-    subcircuit_output_variables_str = ", ".join(str(self.descendants_renaming[x]) for x in self.subcircuit_outputs)
-    self.out.write("exists(" + subcircuit_output_variables_str + ")\n")
+    self.buffer.addQuantifierBlock("exists", [self.descendants_renaming[x] for x in self.subcircuit_outputs])
     if self.use_gate_input_variables :
       self.gate_input_variables = tuple(tuple(self._getNewVariable() for _ in range(self.nof_gate_inputs)) for _ in range(self.nof_gates))
-      gate_input_variables_str = ", ".join(str(x) for y in self.gate_input_variables for x in y)
-      self.out.write("exists(" + gate_input_variables_str + ")\n")
+      self.buffer.addQuantifierBlock("exists", [x for y in self.gate_input_variables for x in y])
     self.output_var = self._getNewVariable()
-    self.out.write("output({})\n".format(self.output_var))
+    self.buffer.setOutput(self.output_var)
 
   def _setupCircuitVariables(self) :
     variables = []
     self.selection_variables = tuple(tuple(self._getNewVariable() for _ in range(len(self.inputs) + y)) for y in range(self.nof_gates))
-    variables += [sv for x in self.selection_variables for sv in x]
+    if self.selection_cardinality_encoding == CardinalityEncoding.binary :
+      # For each input of a gate the index of the selected node is given in binary (the slot of the input).
+      # The selection variables are defined by the slots (see _writeBinaryDecodings).
+      self.selection_slot_variables = tuple(tuple(tuple(self._getNewVariable() for _ in range(self._getNofBits(len(self.inputs) + y))) for _ in range(self.nof_gate_inputs)) for y in range(self.nof_gates))
+      variables += [b for x in self.selection_slot_variables for slot in x for b in slot]
+    else :
+      variables += [sv for x in self.selection_variables for sv in x]
 
     # Suppose gates have n inputs i_1,...,i_n
     # The definition variables are ordered as follows
@@ -190,26 +349,123 @@ class EncoderCircuits :
     if self.config.allowConstantsAsOutputs :
       self.gate_output_variables.append(tuple(self._getNewVariable() for _ in self.subcircuit_outputs))
 
-    variables += [sv for x in self.gate_output_variables for sv in x]
+    if self.output_cardinality_encoding == CardinalityEncoding.binary :
+      # For each output the index of the associated node is given in binary
+      self.output_slot_variables = tuple(tuple(self._getNewVariable() for _ in range(self._getNofBits(len(self.gate_output_variables)))) for _ in self.subcircuit_outputs)
+      variables += [b for slot in self.output_slot_variables for b in slot]
+    else :
+      variables += [sv for x in self.gate_output_variables for sv in x]
+    self.certificate_variables = list(variables)
     return variables
 
+  def _getNofBits(self, nof_values) :
+    return max(1, (nof_values - 1).bit_length())
+
+  def _getSlotLiterals(self, slot, value) :
+    return [x if value >> i & 1 else -x for i, x in enumerate(slot)]
+
+  def _getSlotValue(self, slot, assignment) :
+    return sum(1 << i for i, x in enumerate(slot) if assignment[x])
+
+  # Defines the selection variables and the gate output variables that are represented by binary slots.
+  # The slots of a gate are strictly increasing, thus the ith slot can only refer to the nodes i,...,m-n+i
+  # (m the number of potential inputs of the gate, n the number of gate inputs).
+  def _writeBinaryDecodings(self) :
+    if self.selection_cardinality_encoding == CardinalityEncoding.binary :
+      self._writeComment("Selection variable decodings")
+      self.selection_slot_decodings = []
+      for i, selection_vars in enumerate(self.selection_variables) :
+        m, n = len(selection_vars), self.nof_gate_inputs
+        decodings = []
+        for k, slot in enumerate(self.selection_slot_variables[i]) :
+          slot_decoding = {}
+          for j in range(k, m - n + k + 1) :
+            slot_decoding[j] = self._getNewVariable()
+            self._writeAnd(slot_decoding[j], self._getSlotLiterals(slot, j))
+          decodings.append(slot_decoding)
+        for j, sv in enumerate(selection_vars) :
+          self._writeOr(sv, [x[j] for x in decodings if j in x])
+        self.selection_slot_decodings.append(decodings)
+    if self.output_cardinality_encoding == CardinalityEncoding.binary :
+      self._writeComment("Output variable decodings")
+      for idx, slot in enumerate(self.output_slot_variables) :
+        for j, output_vars in enumerate(self.gate_output_variables) :
+          self._writeAnd(output_vars[idx], self._getSlotLiterals(slot, j))
+
+  # The solvers only return the values of the quantified variables.
+  # The method adds the values of selection and gate output variables that are defined by binary slots.
+  def completeAssignment(self, assignment) :
+    if self.selection_cardinality_encoding == CardinalityEncoding.binary :
+      for selection_vars, slots in zip(self.selection_variables, self.selection_slot_variables) :
+        selected = set(self._getSlotValue(slot, assignment) for slot in slots)
+        for j, sv in enumerate(selection_vars) :
+          assignment[sv] = j in selected
+    if self.output_cardinality_encoding == CardinalityEncoding.binary :
+      for idx, slot in enumerate(self.output_slot_variables) :
+        value = self._getSlotValue(slot, assignment)
+        for j, output_vars in enumerate(self.gate_output_variables) :
+          assignment[output_vars[idx]] = j == value
+
   def _writeSpecification(self) :
+    if self.use_window :
+      self._writeWindow()
+      return
     for gate in self.specification.orderedGateTraversal() :
       alias = gate.getAlias()
       anded, lines = gate.getQCIRGates()
       self._writeGate(alias, anded, lines)
 
+  def _writeWindow(self) :
+    for alias in self.window_gates :
+      anded, lines = self.specification.getGate(alias).getQCIRGates()
+      self._writeGate(alias, anded, lines)
+    if self.window_care_patterns is not None :
+      self._writeComment("Window don't cares")
+      self._writeWindowDontCares()
+
+  # Introduces a variable that is true iff the leaves are assigned to a pattern that cannot occur.
+  # Depending on which is smaller either the occurring or the not occurring patterns are enumerated.
+  def _writeWindowDontCares(self) :
+    nof_patterns = 2 ** len(self.window_leaves)
+    dont_care_var = self._getNewVariable()
+    aux_vars = []
+    if 2 * len(self.window_care_patterns) > nof_patterns :
+      for pattern in range(nof_patterns) :
+        if not pattern in self.window_care_patterns :
+          aux_var = self._getNewVariable()
+          aux_vars.append(aux_var)
+          self._writeAnd(aux_var, self._getPatternLiterals(pattern))
+      self._writeOr(dont_care_var, aux_vars)
+    else :
+      for pattern in self.window_care_patterns :
+        aux_var = self._getNewVariable()
+        aux_vars.append(aux_var)
+        self._writeOr(aux_var, [-x for x in self._getPatternLiterals(pattern)])
+      self._writeAnd(dont_care_var, aux_vars)
+    self.dont_care_variable = dont_care_var
+
+  def _getPatternLiterals(self, pattern) :
+    return [x if pattern >> i & 1 else -x for i, x in enumerate(self.window_leaves)]
+
+  def _getGatesToCopy(self) :
+    if self.use_window :
+      for alias in sorted(self.gates_to_copy, key = lambda x : self.specification.getGateLevel(x)) :
+        yield self.specification.getGate(alias)
+    else :
+      for gate in self.specification.orderedGateTraversal() :
+        if gate.getAlias() in self.gates_to_copy :
+          yield gate
+
   def _writeSpecificationCopy(self) :
-    for gate in self.specification.orderedGateTraversal() :
-      if gate.getAlias() in self.gates_to_copy :
-        assert not gate.isConstant(), "A constant gate cannot be the successor of a replaced gate"
-        renamed_alias = self.descendants_renaming[gate.getAlias()]
-        inputs = [self.descendants_renaming[x] if x in self.descendants_renaming else x for x in gate.inputs]
-        # Gates that need to be copied have to be successors of removed gates. 
-        # Every successor of a removed gate must have at least one renamed input.
-        # assert inputs != gate.inputs
-        anded, lines = gate.getQCIRGates(inputs)
-        self._writeGate(renamed_alias, anded, lines)
+    for gate in self._getGatesToCopy() :
+      assert not gate.isConstant(), "A constant gate cannot be the successor of a replaced gate"
+      renamed_alias = self.descendants_renaming[gate.getAlias()]
+      inputs = [self.descendants_renaming[x] if x in self.descendants_renaming else x for x in gate.inputs]
+      # Gates that need to be copied have to be successors of removed gates.
+      # Every successor of a removed gate must have at least one renamed input.
+      # assert inputs != gate.inputs
+      anded, lines = gate.getQCIRGates(inputs)
+      self._writeGate(renamed_alias, anded, lines)
 
   def _writeGate(self, alias, anded, lines) :
     if anded :
@@ -314,9 +570,7 @@ class EncoderCircuits :
               self._writeOr(constraint_var, [-self.gate_output_variables[self.nof_gates + i][output_idx], -connection_vars[i], connection_vars[input_idx]])
                 
 
-    constraint_var = self._getNewVariable()
-    self._writeAnd(constraint_var, constraint_vars)
-    self.constraintGates += [constraint_var]
+    self.constraintGates += constraint_vars
 
   def _writeGateOutputCycleConstraints(self) :
     constraint_vars = []
@@ -336,9 +590,7 @@ class EncoderCircuits :
           constraint_vars.append(constraint_var)
           self._writeOr(constraint_var, [-self.gate_output_variables[idx][output_idx], -connection_vars[i]]) 
 
-    constraint_var = self._getNewVariable()
-    self._writeAnd(constraint_var, constraint_vars)
-    self.constraintGates += [constraint_var]
+    self.constraintGates += constraint_vars
 
 
   # if self.forbidden is not empty we know that there is at least one gate in the specification that is both a descendant and an ancestor of the gates that shall be removed.
@@ -377,7 +629,10 @@ class EncoderCircuits :
     for i in range(len(self.subcircuit_outputs)) :
       vars = [x[i] for x in self.gate_output_variables]
       self._writeComment(f"Constraints for output {i}")
-      self._addCardinalityConstraint(vars, 1)
+      if self.output_cardinality_encoding == CardinalityEncoding.binary :
+        self._addLessThanConstantConstraint(self.output_slot_variables[i], len(vars))
+      else :
+        self._addCardinalityConstraint(vars, 1, self.output_cardinality_encoding)
     self._writeComment("Output Vars end")
     
     self._restrictGates()
@@ -389,10 +644,53 @@ class EncoderCircuits :
     self._writeComment("Selection Vars")
     for i in range(self.nof_gates) :
       self._writeComment(f"Constraints for selection variables at gate {i}")
-      if self.use_gate_input_variables :
+      if self.selection_cardinality_encoding == CardinalityEncoding.binary :
+        self._addBinarySelectionConstraints(i)
+        if self.use_gate_input_variables :
+          self._setupGateInputVariablesBinary(i)
+      elif self.use_gate_input_variables :
         self._setupGateInputVariables(i)
       else :
-        self._addCardinalityConstraint(self.selection_variables[i], self.nof_gate_inputs)
+        self._addCardinalityConstraint(self.selection_variables[i], self.nof_gate_inputs, self.selection_cardinality_encoding)
+
+  # The slots of a gate must be strictly increasing and the last slot must refer to an existing node.
+  # Thus, exactly nof_gate_inputs different selection variables are true and no cardinality constraint is needed.
+  def _addBinarySelectionConstraints(self, gate_index) :
+    slots = self.selection_slot_variables[gate_index]
+    for k in range(len(slots) - 1) :
+      self._addLessThanConstraint(slots[k], slots[k + 1])
+    self._addLessThanConstantConstraint(slots[-1], len(self.selection_variables[gate_index]))
+
+  # The value of slot shall be smaller than the constant
+  def _addLessThanConstantConstraint(self, slot, constant) :
+    if constant >= 2 ** len(slot) :
+      return
+    disjuncts = []
+    for i in range(len(slot)) :
+      if constant >> i & 1 :
+        # The higher bits are equal and the ith bit is smaller
+        aux_var = self._getNewVariable()
+        self._writeAnd(aux_var, [-slot[i]] + self._getSlotLiterals(slot[i + 1:], constant >> (i + 1)))
+        disjuncts.append(aux_var)
+    constraint_var = self._getNewVariable()
+    self._writeOr(constraint_var, disjuncts)
+    self.constraintGates.append(constraint_var)
+
+  # The value of slot1 shall be smaller than the value of slot2 (both slots have the same number of bits)
+  def _addLessThanConstraint(self, slot1, slot2) :
+    equal_bits = []
+    for x, y in zip(slot1, slot2) :
+      eq_var = self._getNewVariable()
+      self._writeEquivalence(eq_var, x, y)
+      equal_bits.append(eq_var)
+    disjuncts = []
+    for i in range(len(slot1)) :
+      aux_var = self._getNewVariable()
+      self._writeAnd(aux_var, [-slot1[i], slot2[i]] + equal_bits[i + 1:])
+      disjuncts.append(aux_var)
+    constraint_var = self._getNewVariable()
+    self._writeOr(constraint_var, disjuncts)
+    self.constraintGates.append(constraint_var)
 
   def _getCondition(self, variable, constant) :
     if constant == 1 : #true
@@ -585,15 +883,11 @@ class EncoderCircuits :
       sub_circ_out = self.descendants_renaming[out]
       for i in range(self.nof_gates) :
         in_node1 = self._getGate(i)
-        c = self._getNewVariable()
-        self._writeConditionalEquivalence(c, self.gate_output_variables[i][idx], in_node1, sub_circ_out)
-        self.constraintGates += [c]
+        self._addConditionalEquivalence(self.gate_output_variables[i][idx], in_node1, sub_circ_out)
       if self.config.allowInputsAsOutputs :
         for i in range(self.nof_gates, self.nof_gates + len(self.inputs)) :
           input_var = self.inputs[i - self.nof_gates]
-          c = self._getNewVariable()
-          self._writeConditionalEquivalence(c, self.gate_output_variables[i][idx], input_var, sub_circ_out)
-          self.constraintGates += [c]
+          self._addConditionalEquivalence(self.gate_output_variables[i][idx], input_var, sub_circ_out)
       if self.config.allowConstantsAsOutputs :
         c = self._getNewVariable()
         # As we have normal gates a constant output can only be false.
@@ -605,25 +899,22 @@ class EncoderCircuits :
   def _writeEquivalenceConstraints(self) :
     self._setupSubcircuitOutputVariables()
     self._writeComment("Establish equivalence between specification and copy")
-    for spec_out in self.specification.getOutputs() :
+    checked_outputs = self.observation_points if self.use_window else self.specification.getOutputs()
+    for spec_out in checked_outputs :
       if spec_out in self.descendants_renaming:
         spec_out_copy = self.descendants_renaming[spec_out]
-        c1 = self._getNewVariable()
-        self._writeEquivalence(c1, spec_out, spec_out_copy)
-        self.constraintGates += [c1]
+        self._addEquivalence(spec_out, spec_out_copy)
 
 
   def _writeAnd(self, out_var, inputs) :
-    input_str = ", ".join(str(x) for x in inputs)
-    self.out.write(str(out_var) + " = and(" + input_str + ")\n")
+    self.buffer.addGate(QCIRBuffer.AND, out_var, inputs)
 
   def _writeOr(self, out_var, inputs) :
-    input_str = ", ".join(str(x) for x in inputs)
-    self.out.write(str(out_var) + " = or(" + input_str + ")\n")
+    self.buffer.addGate(QCIRBuffer.OR, out_var, inputs)
 
   def _writeXor(self, out_var, in1, in2) :
     if self.allow_xors:
-      self.out.write(str(out_var) + " = xor(" + str(in1) + ", " + str(in2) + ")\n")
+      self.buffer.addGate(QCIRBuffer.XOR, out_var, [in1, in2])
     else:
       or1 = self._getNewVariable()
       self._writeOr(or1, [in1, in2])
@@ -641,14 +932,29 @@ class EncoderCircuits :
     self._writeOr(or2, [-cond_var, in1, -in2])
     self._writeAnd(out_var, [or1, or2])
 
+  # The constraints are added as top level conjuncts. Thus, no variable for their conjunction is needed
   def _addConditionalEquivalence(self, cond_var, in1, in2) :
-    out_var = self._getNewVariable()
-    self._writeConditionalEquivalence(out_var, cond_var, in1, in2)
-    self.constraintGates.append(out_var)
+    or1 = self._getNewVariable()
+    self._writeOr(or1, [-cond_var, -in1, in2])
+    or2 = self._getNewVariable()
+    self._writeOr(or2, [-cond_var, in1, -in2])
+    self.constraintGates += [or1, or2]
+
+  def _addEquivalence(self, in1, in2) :
+    if self.allow_xors :
+      c = self._getNewVariable()
+      self._writeEquivalence(c, in1, in2)
+      self.constraintGates.append(c)
+    else :
+      or1 = self._getNewVariable()
+      self._writeOr(or1, [in1, -in2])
+      or2 = self._getNewVariable()
+      self._writeOr(or2, [-in1, in2])
+      self.constraintGates += [or1, or2]
 
   def _writeComment(self, val) :
     if self.writeComments :
-      self.out.write("# " + val + "\n")
+      self.buffer.addText("# " + val)
 
 
   def _incrementIndexTupleSimple(self, val) :
@@ -682,19 +988,22 @@ class EncoderCircuits :
     return [i for i in range(max_idx-size, max_idx)]
 
 
+  # The kth gate input variable represents the node referred to by the kth slot
+  def _setupGateInputVariablesBinary(self, gate_index) :
+    gate_input_vars = self.gate_input_variables[gate_index]
+    for k, decodings in enumerate(self.selection_slot_decodings[gate_index]) :
+      for j, decoding_var in decodings.items() :
+        self._addConditionalEquivalence(decoding_var, gate_input_vars[k], self._getNode(j))
+
   def _setupGateInputVariables(self, gate_index) :
     # cardinality = self.nof_gate_inputs
     selection_vars = self.selection_variables[gate_index]
     if len(selection_vars) == self.nof_gate_inputs :
-      gate_var = self._getNewVariable()
-      self._writeAnd(gate_var, selection_vars)
-      self.constraintGates += [gate_var]
+      self.constraintGates += selection_vars
       for idx in range(self.nof_gate_inputs) :
         in_node = self._getNode(idx)
         gate_input_var = self.gate_input_variables[gate_index][idx]
-        c1 = self._getNewVariable()
-        self._writeEquivalence(c1, in_node, gate_input_var)
-        self.constraintGates += [c1]
+        self._addEquivalence(in_node, gate_input_var)
     else :
       self._setupGateInputVariablesSequentialCounter(gate_index)
       
@@ -733,21 +1042,22 @@ class EncoderCircuits :
         self._addConditionalEquivalence(outputs[-1], gate_input_vars[pos], self._getNode(idx + 1))
       aux = outputs
 
-    constraint_var = self._getNewVariable()
     # if none of the variables in carries is True then not more than cardinality many variables in vars are true
     # if outputs[-1] is true at least cardinality many variables in vars are true
     carries += [outputs[-1]]
-    self._writeAnd(constraint_var, carries)
-    self.constraintGates += [constraint_var]
+    self.constraintGates += carries
 
 
-  def _addCardinalityConstraint(self, vars, cardinality) :
+  def _addCardinalityConstraint(self, vars, cardinality, encoding = CardinalityEncoding.sequential_counter) :
     if len(vars) == cardinality:
-      gate_var = self._getNewVariable()
-      self._writeAnd(gate_var, vars)
-      self.constraintGates += [gate_var]
+      self.constraintGates += vars
       return
-    self._SequentialCounterCardinalityConstraint(vars, cardinality)
+    if encoding == CardinalityEncoding.totalizer :
+      self._TotalizerCardinalityConstraint(vars, cardinality)
+    elif encoding == CardinalityEncoding.commander :
+      self._CommanderCardinalityConstraint(vars, cardinality)
+    else :
+      self._SequentialCounterCardinalityConstraint(vars, cardinality)
 
 
 
@@ -768,12 +1078,79 @@ class EncoderCircuits :
       if not carry is None:
         carries += [-carry]
 
-    constraint_var = self._getNewVariable()
     # if none of the variables in carries is True then not more than cardinality many variables in vars are true
     # if outputs[-1] is true at least cardinality many variables in vars are true
     carries += [outputs[-1]]
-    self._writeAnd(constraint_var, carries)
-    self.constraintGates += [constraint_var]
+    self.constraintGates += carries
+
+  # Totalizer
+  # See: Bailleux, Boufkhad: Efficient CNF Encoding of Boolean Cardinality Constraints (CP 2003)
+  # The counter is truncated at cardinality + 1.
+  def _TotalizerCardinalityConstraint(self, vars, cardinality) :
+    assert len(vars) > cardinality
+    counter = self._totalizerNode(vars, cardinality + 1)
+    self.constraintGates += [counter[cardinality - 1], -counter[cardinality]]
+
+  # Returns the unary representation of the number of true variables in vars.
+  # The ith output is true iff at least i+1 variables in vars are true (only the first limit outputs are introduced).
+  def _totalizerNode(self, vars, limit) :
+    if len(vars) == 1 :
+      return [vars[0]]
+    left = self._totalizerNode(vars[:len(vars) // 2], limit)
+    right = self._totalizerNode(vars[len(vars) // 2:], limit)
+    outputs = []
+    for count in range(1, min(len(left) + len(right), limit) + 1) :
+      disjuncts = []
+      for i in range(max(0, count - len(right)), min(count, len(left)) + 1) :
+        j = count - i
+        conjuncts = ([left[i - 1]] if i > 0 else []) + ([right[j - 1]] if j > 0 else [])
+        if len(conjuncts) == 1 :
+          disjuncts += conjuncts
+        else :
+          and_var = self._getNewVariable()
+          self._writeAnd(and_var, conjuncts)
+          disjuncts.append(and_var)
+      or_var = self._getNewVariable()
+      self._writeOr(or_var, disjuncts)
+      outputs.append(or_var)
+    return outputs
+
+  # Commander encoding
+  # See: Klieber, Kwon: Efficient CNF Encoding for Selecting 1 from N Objects (2007)
+  # The commander encoding is only used for exactly one constraints. Other cardinalities are encoded by a totalizer.
+  def _CommanderCardinalityConstraint(self, vars, cardinality) :
+    if cardinality != 1 :
+      self._TotalizerCardinalityConstraint(vars, cardinality)
+      return
+    commanders = self._commanderAtMostOne(vars)
+    constraint_var = self._getNewVariable()
+    self._writeOr(constraint_var, commanders)
+    self.constraintGates.append(constraint_var)
+
+  # Ensures that at most one of the variables is true.
+  # Returns commander variables whose disjunction is equivalent to the disjunction of vars.
+  def _commanderAtMostOne(self, vars, group_size = 3) :
+    if len(vars) <= group_size :
+      self._addPairwiseAtMostOne(vars)
+      return vars
+    commanders = []
+    for i in range(0, len(vars), group_size) :
+      group = vars[i:i + group_size]
+      if len(group) == 1 :
+        commanders += group
+        continue
+      self._addPairwiseAtMostOne(group)
+      commander = self._getNewVariable()
+      self._writeOr(commander, group)
+      commanders.append(commander)
+    return self._commanderAtMostOne(commanders, group_size)
+
+  def _addPairwiseAtMostOne(self, vars) :
+    for i in range(len(vars)) :
+      for j in range(i + 1, len(vars)) :
+        constraint_var = self._getNewVariable()
+        self._writeOr(constraint_var, [-vars[i], -vars[j]])
+        self.constraintGates.append(constraint_var)
 
   # If last_counter is true only carry and the last output is consider
   def _cardinalitySubCircuit(self, in1, inputs, cardinality, last_counter) :
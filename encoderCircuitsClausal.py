@@ -0,0 +1,101 @@
+from encoderCircuits import EncoderCircuits
+from qcirBuffer import QCIRBuffer
+
+# Generates the same constraints as EncoderCircuits but writes them in QDIMACS format.
+# The gates are translated by the Tseitin transformation. The Tseitin variables are
+# existentially quantified in the innermost quantifier block.
+class EncoderCircuitsClausal(EncoderCircuits) :
+
+  def __init__(self, specification, gates_to_replace, config) :
+    super().__init__(specification, gates_to_replace, config)
+    # QDIMACS does not allow comments between clauses
+    self.writeComments = False
+
+  def _serialiseFixedEncoding(self) :
+    clauses = self._getTseitinClauses(self.buffer, set())
+    self.fixed_gate_variables = [x for op, x in zip(self.buffer.ops, self.buffer.outs) if op != QCIRBuffer.TEXT]
+    self.nof_fixed_clauses = len(clauses)
+    return "\n".join(clauses)
+
+  def _serialiseEncoding(self, out) :
+    buffer = self.buffer
+    clauses = []
+    eliminated = self._assertOutput(buffer, clauses)
+    clauses += self._getTseitinClauses(buffer, eliminated)
+    nof_clauses = len(clauses) + self.nof_fixed_clauses
+
+    tseitin_variables = self.fixed_gate_variables + [x for op, x in zip(buffer.ops, buffer.outs) if op != QCIRBuffer.TEXT and not x in eliminated]
+    prefix = [(q, list(vars)) for q, vars in buffer.prefix if len(vars) > 0]
+    if len(prefix) > 0 and prefix[-1][0] == "exists" :
+      prefix[-1][1].extend(tseitin_variables)
+    else :
+      prefix.append(("exists", tseitin_variables))
+
+    lines = [f"p cnf {self.last_used_variable} {nof_clauses}"]
+    for quantifier, variables in prefix :
+      if len(variables) == 0 :
+        continue
+      lines.append(("e " if quantifier == "exists" else "a ") + " ".join(map(str, variables)) + " 0")
+    # The fixed part is stored as a text entry of the buffer
+    clause_text = "\n".join(clauses)
+    for i, op in enumerate(buffer.ops) :
+      if op == QCIRBuffer.TEXT :
+        lines.append(buffer.texts[buffer.outs[i]])
+    if len(clause_text) > 0 :
+      lines.append(clause_text)
+    out.write("\n".join(lines) + "\n")
+
+  # The output is asserted directly. Gates that are only used by asserted conjunctions do not need a Tseitin variable:
+  # An asserted conjunction is split up into its conjuncts and an asserted disjunction yields a single clause.
+  # Returns the set of gates that were not introduced.
+  def _assertOutput(self, buffer, clauses) :
+    gates = {}
+    nof_references = {}
+    for i, op in enumerate(buffer.ops) :
+      if op == QCIRBuffer.TEXT :
+        continue
+      gates[buffer.outs[i]] = i
+      for x in buffer.literals[buffer.offsets[i]:buffer.offsets[i + 1]] :
+        nof_references[abs(x)] = nof_references.get(abs(x), 0) + 1
+
+    eliminated = set()
+    to_assert = [buffer.output]
+    while len(to_assert) > 0 :
+      lit = to_assert.pop()
+      if lit > 0 and lit in gates and nof_references.get(lit, 0) <= 1 :
+        i = gates[lit]
+        inputs = buffer.literals[buffer.offsets[i]:buffer.offsets[i + 1]]
+        if buffer.ops[i] == QCIRBuffer.AND :
+          eliminated.add(lit)
+          to_assert += inputs
+          continue
+        elif buffer.ops[i] == QCIRBuffer.OR :
+          eliminated.add(lit)
+          clauses.append(self._getClause(inputs))
+          continue
+      clauses.append(self._getClause([lit]))
+    return eliminated
+
+  def _getTseitinClauses(self, buffer, eliminated) :
+    clauses = []
+    ops, outs, offsets, literals = buffer.ops, buffer.outs, buffer.offsets, buffer.literals
+    for i, op in enumerate(ops) :
+      if op == QCIRBuffer.TEXT :
+        continue
+      out_var = outs[i]
+      if out_var in eliminated :
+        continue
+      inputs = literals[offsets[i]:offsets[i + 1]]
+      if op == QCIRBuffer.AND :
+        clauses += [f"{-out_var} {x} 0" for x in inputs]
+        clauses.append(self._getClause([out_var] + [-x for x in inputs]))
+      elif op == QCIRBuffer.OR :
+        clauses += [f"{out_var} {-x} 0" for x in inputs]
+        clauses.append(self._getClause([-out_var] + list(inputs)))
+      else :
+        in1, in2 = inputs
+        clauses += [f"{-out_var} {in1} {in2} 0", f"{-out_var} {-in1} {-in2} 0", f"{out_var} {-in1} {in2} 0", f"{out_var} {in1} {-in2} 0"]
+    return clauses
+
+  def _getClause(self, literals) :
+    return " ".join(map(str, literals)) + " 0"
@@ -17,17 +17,27 @@ class EncoderExactSynthesis(EncoderCircuits) :
     for alias in self.subcircuit_outputs :
       self.descendants_renaming[alias] = self._getNewVariable()
     self.max_var_specification_representation = self.last_used_variable
+    self.fixed_encoding = None
     self.allow_xors = False
-    self.writeComments = True
+    self.writeComments = config.write_encoding_comments
     self.debug = False
+    self.use_window = False
     self.internal_gates = []
     self.selection_variables = []
     self.gate_definition_variables = []
     self.gate_output_variables = []
+    self.certificate_variables = []
+    self.gates_to_copy = set()
+    self.potential_cycles = list(cycle_candidates)
+    self.zero_gate_decided = False
+    self.zero_gate_association = None
+    self.lower_bound_functions = None
     self.useTrivialRuleConstraint = config.useTrivialRuleConstraint
     self.useNoReapplicationConstraint = config.useNoReapplicationConstraint
     self.useAllStepsConstraint = config.useAllStepsConstraint
     self.useOrderedStepsConstraint = config.useOrderedStepsConstraint
+    self.selection_cardinality_encoding = config.selection_cardinality_encoding
+    self.output_cardinality_encoding = config.output_cardinality_encoding
     # If true, we introduce for each gate and for each of its inputs a variable that represents the input.
     # The aim of this approach is to reduce the number of gates that need to be introduced for k-LUTs with larger k.
     self.use_gate_input_variables = False
@@ -42,12 +52,10 @@ class EncoderExactSynthesis(EncoderCircuits) :
     self._writeComment("Establish equivalence between specification and encoding")
     for spec_out in self.subcircuit_outputs :
       out_name = self.descendants_renaming[spec_out]
-      c = self._getNewVariable()
-      self._writeEquivalence(c, spec_out, out_name)
-      self.constraintGates += [c]
+      self._addEquivalence(spec_out, out_name)
 
   def _getUniversallyQuantifiedVariables(self) :
-    return ", ".join(str(x) for x in self.inputs)
+    return self.inputs
 
   def getSubcircuitInputs(self) :
     return self.inputs
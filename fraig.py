@@ -0,0 +1,146 @@
+import logging
+
+try :
+  from pysat.solvers import Solver
+  pysat_available = True
+except ImportError :
+  pysat_available = False
+
+from simulator import Simulator
+
+# SAT sweeping (as in functionally reduced AIGs): Gates that realise the same function in terms of the PIs are merged.
+# Candidates are nodes with the same simulation signature. A candidate is merged into the representative of its class
+# (the PI or the gate of the class that comes first in the topological order) if an incremental SAT solver proves
+# the equivalence. The counterexamples of failed proofs are added to the simulation patterns, which refines the classes.
+# A merge replaces the gate by its representative (Specification.replaceSubcircuit with an empty replacement),
+# i.e. the gate is substituted in its successors and the gates that become unused are removed.
+# Gates whose signature is constantly false are merged into the constant gate.
+#
+# All gates are normal, thus every node is false if all PIs are false. Consequently no node can be the complement of
+# another node and only equivalences (without complementation) need to be considered.
+# If the simulation is exhaustive (few PIs) equal signatures prove the equivalence and no SAT calls are needed.
+class Sweeper :
+
+  def __init__(self, specification, nof_patterns = 1024, conflict_limit = 50000, seed = None) :
+    self.specification = specification
+    self.simulator = Simulator(specification, nof_patterns, seed)
+    self.conflict_limit = conflict_limit
+    self.solver = None
+    self.encoded = set()
+    self.last_variable = specification.getMaxAlias()
+    self.counterexamples = []
+    # Pairs for which the solver reached the conflict limit
+    self.undecided = set()
+    self.nof_merges = 0
+    self.nof_sat_calls = 0
+    self.nof_counterexamples = 0
+    # The gates that were removed or whose inputs were changed by the merges
+    self.changed_gates = set()
+
+  # Returns the number of removed gates
+  def sweep(self) :
+    if not self.simulator.isExhaustive() and not pysat_available :
+      logging.warning("SAT sweeping requires pysat for circuits with many inputs -- sweeping is skipped")
+      return 0
+    nof_gates = self.specification.getNofGates()
+    if self.simulator.isExhaustive() :
+      self._sweepClasses()
+    else :
+      with Solver(name = "g3") as solver :
+        self.solver = solver
+        while self._sweepClasses() :
+          self.simulator.addPatterns(self.counterexamples)
+          self.nof_counterexamples += len(self.counterexamples)
+          self.counterexamples = []
+        self.solver = None
+    return nof_gates - self.specification.getNofGates()
+
+  # Returns True if counterexamples were found, i.e. if the classes can be refined
+  def _sweepClasses(self) :
+    spec = self.specification
+    pis = set(spec.getInputs())
+    for signature, members in self._getClasses() :
+      # None represents the constant false
+      representative = None
+      for alias in members :
+        # The node may have been removed by a previous merge
+        if not alias in pis and not spec.isGate(alias) :
+          continue
+        if signature != 0 and representative is None :
+          representative = alias
+          continue
+        if alias == spec.constant_gate_alias or (representative, alias) in self.undecided :
+          continue
+        proven = self._prove(representative, alias)
+        if proven is None :
+          self.undecided.add((representative, alias))
+        elif proven :
+          self._merge(representative, alias)
+    return len(self.counterexamples) > 0
+
+  # The classes of nodes with equal signatures, the nodes are sorted by the topological order (PIs first)
+  def _getClasses(self) :
+    spec = self.specification
+    classes = {}
+    for x in spec.getInputs() :
+      classes.setdefault(self.simulator.getSignature(x), []).append(x)
+    for gate in spec.orderedGateTraversal() :
+      classes.setdefault(self.simulator.getSignature(gate.getAlias()), []).append(gate.getAlias())
+    return [(signature, members) for signature, members in classes.items() if len(members) > 1 or signature == 0]
+
+  def _merge(self, representative, alias) :
+    successors = self.specification.getDirectSuccessors([alias])
+    unused = self.specification.replaceSubcircuit([alias], [], {alias : representative})
+    # Merging into the constant false may introduce the constant gate
+    if self.specification.constant_gate_alias is not None :
+      successors.add(self.specification.constant_gate_alias)
+    self.simulator.update(successors, unused.union([alias]))
+    self.changed_gates.update(successors, unused, [alias])
+    self.nof_merges += 1
+
+  # Returns True if the nodes are equivalent, False if there is a counterexample and None if the conflict limit is reached
+  def _prove(self, representative, alias) :
+    if self.simulator.isExhaustive() :
+      return True
+    self._encodeCone(alias)
+    if representative is None :
+      assumptions = [alias]
+    else :
+      self._encodeCone(representative)
+      # The constant gate may have been introduced with a new alias
+      self.last_variable = max(self.last_variable, self.specification.getMaxAlias()) + 1
+      miter = self.last_variable
+      self.solver.add_clause([-miter, alias, representative])
+      self.solver.add_clause([-miter, -alias, -representative])
+      assumptions = [miter]
+    self.nof_sat_calls += 1
+    self.solver.conf_budget(self.conflict_limit)
+    result = self.solver.solve_limited(assumptions = assumptions)
+    if result is None :
+      return None
+    if result :
+      model = set(x for x in self.solver.get_model() if x > 0)
+      self.counterexamples.append({x : 1 if x in model else 0 for x in self.specification.getInputs()})
+      return False
+    # The proven equivalence helps the solver in later calls
+    if representative is None :
+      self.solver.add_clause([-alias])
+    else :
+      self.solver.add_clause([-alias, representative])
+      self.solver.add_clause([alias, -representative])
+    return True
+
+  # The gates are encoded by their aliases. Merges preserve the functions of all nodes, thus the encoded gates stay valid.
+  def _encodeCone(self, alias) :
+    spec = self.specification
+    to_process = [alias]
+    while len(to_process) > 0 :
+      x = to_process.pop()
+      if x in self.encoded or not spec.isGate(x) :
+        continue
+      self.encoded.add(x)
+      gate = spec.getGate(x)
+      # A clause per row: the assignment of the row implies the value of the gate
+      for literals, value in gate.traverseTable() :
+        self.solver.add_clause([-y for y in literals] + [x if value else -x])
+      to_process.extend(gate.inputs)
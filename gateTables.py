@@ -0,0 +1,81 @@
+import bitarray
+import bitarray.util
+
+# The truth tables of the gates are interned: There is a single GateTable per function, which is shared by all gates
+# with this function (in an AIG there are only a handful of different functions).
+# A GateTable keeps the table as an integer (bit r is the value of row r; the rows are ordered as in Gate.table)
+# and as a frozenbitarray. The row lists needed for writing a gate (QCIR, BLIF) are computed once per function.
+
+_tables = {}
+_tables_by_value = {}
+
+
+class GateTable :
+
+  def __init__(self, nof_inputs, value, table) :
+    self.nof_inputs = nof_inputs
+    self.value = value
+    self.table = table
+    self.qcir_rows = None
+    self.rows = None
+    self.blif_rows = None
+
+  # The table of the gate in which the inputs with the given indices are replaced by the constant false
+  def removeInputs(self, indices) :
+    value = self.value
+    nof_rows = 1 << self.nof_inputs
+    # Removing the inputs in descending order of their row bits does not change the row bits of the remaining inputs
+    for idx in sorted(indices) :
+      block = 1 << (self.nof_inputs - 1 - idx)
+      mask = (1 << block) - 1
+      reduced = 0
+      for start in range(0, nof_rows, 2 * block) :
+        reduced |= (value >> start & mask) << (start >> 1)
+      value = reduced
+      nof_rows >>= 1
+    return getGateTableFromValue(self.nof_inputs - len(indices), value)
+
+  # If the gate is false for the majority of the rows it is represented by a disjunction of conjunctions (anded = True),
+  # otherwise by a conjunction of disjunctions. A row is given by the polarities of the input literals.
+  def getQCIRRows(self) :
+    if self.qcir_rows is None :
+      anded = bin(self.value).count("1") <= (1 << self.nof_inputs) // 2
+      val = 1 if anded else 0
+      rows = tuple(self._getPolarities(row, val) for row in range(1 << self.nof_inputs) if (self.value >> row & 1) == val)
+      self.qcir_rows = (anded, rows)
+    return self.qcir_rows
+
+  # Pairs of the polarities of the input literals and the value of each row
+  def getRows(self) :
+    if self.rows is None :
+      self.rows = tuple((self._getPolarities(row, 1), self.value >> row & 1) for row in range(1 << self.nof_inputs))
+    return self.rows
+
+  # The rows for which the gate is true as strings of input values (as used by BLIF)
+  def getBlifRows(self) :
+    if self.blif_rows is None :
+      self.blif_rows = tuple(format(row, "b").zfill(self.nof_inputs) if self.nof_inputs > 0 else "" for row in range(1 << self.nof_inputs) if self.value >> row & 1)
+    return self.blif_rows
+
+  # The first input corresponds to the most significant bit of the row
+  def _getPolarities(self, row, val) :
+    return tuple((row >> (self.nof_inputs - 1 - i) & 1) == val for i in range(self.nof_inputs))
+
+
+# table: a bitarray with 2^n entries
+def getGateTable(table) :
+  key = table if isinstance(table, bitarray.frozenbitarray) else bitarray.frozenbitarray(table)
+  gate_table = _tables.get(key)
+  if gate_table is None :
+    nof_inputs = len(key).bit_length() - 1
+    value = bitarray.util.ba2int(bitarray.bitarray(key, endian = "little"))
+    gate_table = GateTable(nof_inputs, value, bitarray.frozenbitarray(key, endian = "big"))
+    _tables[key] = gate_table
+    _tables_by_value[(nof_inputs, value)] = gate_table
+  return gate_table
+
+def getGateTableFromValue(nof_inputs, value) :
+  gate_table = _tables_by_value.get((nof_inputs, value))
+  if gate_table is None :
+    gate_table = getGateTable(bitarray.util.int2ba(value, length = 1 << nof_inputs, endian = "little"))
+  return gate_table
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+import logging
+
+import bitarray
+
+import npnCache
+import rewriteDatabase
+import subcircuitSynthesiser
+from specification import Specification
+from utils import Configuration
+
+############################################################################
+# Generates the database of minimum circuits used by the database rewriting (see rewriteDatabase.py).
+# For each NPN class of the 4-input functions a specification consisting of a single gate realising
+# the canonical representative is built and minimised by the exact synthesis (bottomUpReduction).
+############################################################################
+
+# Returns the canonical representatives of the NPN classes of the normal functions
+def getClassRepresentatives(nof_vars) :
+  mask = (1 << (1 << nof_vars)) - 1
+  flips = [(i & -i).bit_length() - 1 for i in range(1, 2 ** nof_vars)]
+  swaps = npnCache.getAdjacentTranspositions(nof_vars)
+  seen = set()
+  representatives = []
+  for table in range(0, mask + 1, 2) :
+    if table in seen :
+      continue
+    canonical_tables, _ = npnCache.getCanonicalForm([table], nof_vars)
+    representatives.append(canonical_tables[0])
+    # Mark the class
+    current = table
+    for swap in swaps + [None] :
+      for flip in flips + [None] :
+        seen.add(current if current & 1 == 0 else current ^ mask)
+        if flip is not None :
+          current = npnCache.flipVariable(current, flip, nof_vars)
+      if swap is not None :
+        current = npnCache.swapAdjacentVariables(current, swap, nof_vars)
+  return representatives
+
+def getSingleGateSpecification(table, nof_vars) :
+  pis = list(range(1, nof_vars + 1))
+  alias = nof_vars + 1
+  spec = Specification(pis, [alias])
+  rows = []
+  for row in range(2 ** nof_vars) :
+    m = sum((row >> (nof_vars - 1 - p) & 1) << p for p in range(nof_vars))
+    rows.append(table >> m & 1)
+  spec.addGate(alias, pis, bitarray.bitarray(rows))
+  spec.init()
+  return spec
+
+# Translates the synthesised specification into the representation used by the database
+def getCircuit(spec, nof_vars) :
+  nodes = {x : i for i, x in enumerate(spec.getInputs())}
+  gates = []
+  for alias in sorted(spec.getGateAliases(), key = lambda x : spec.getGateLevel(x)) :
+    gate = spec.getGate(alias)
+    if len(gate.inputs) == 0 :
+      continue
+    nodes[alias] = nof_vars + len(gates)
+    gates.append(([nodes[x] for x in gate.inputs], sum(b << row for row, b in enumerate(gate.table))))
+  output = spec.getOutputs()[0]
+  return gates, [nodes.get(output)]
+
+
+if __name__ == "__main__" :
+  parser = argparse.ArgumentParser(description="Generate the database of minimum circuits for the 4-input functions")
+  parser.add_argument('database', metavar='DB', help='The file to which the database is written')
+  parser.add_argument('--aig', action='store_true', help='Use AIG gates')
+  args = parser.parse_args()
+  logging.getLogger().setLevel(logging.WARNING)
+
+  nof_vars = rewriteDatabase.DATABASE_NOF_INPUTS
+  config = Configuration()
+  config.gate_size = 2
+  config.synthesiseAig = args.aig
+
+  begin = time.time()
+  representatives = getClassRepresentatives(nof_vars)
+  print(f"Nof classes: {len(representatives)}")
+  entries = {}
+  for i, table in enumerate(representatives) :
+    if table == 0 :
+      # The specification would consist of a gate without true rows
+      entries[table] = ([], [None])
+      continue
+    spec = getSingleGateSpecification(table, nof_vars)
+    synth = subcircuitSynthesiser.SubcircuitSynthesiser(spec, config)
+    size = synth.bottomUpReduction(spec.getGateAliases(), config)
+    circuit = getCircuit(spec, nof_vars)
+    assert npnCache.simulateCircuit(circuit, nof_vars) == [table], f"Invalid circuit for {table:x}"
+    entries[table] = circuit
+    print(f"{i + 1}/{len(representatives)}: {table:04x}: {size} gates")
+
+  rewriteDatabase.writeDatabase(args.database, entries, config.gate_size, config.synthesiseAig)
+  print(f"Total time: {time.time() - begin}")
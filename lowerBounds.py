@@ -0,0 +1,60 @@
+import truthTables
+
+# Lower bounds on the number of gates that are needed for realising the functions of the outputs of a subcircuit.
+# The functions are truth tables over the subcircuit inputs (see truthTables); only the patterns in the care set can occur.
+# The bounds are only sound if a realisation needs to preserve the functions of the outputs on the care set,
+# i.e. if observability don't cares are not exploited.
+#
+# Distinct functions: outputs whose functions differ on the care set cannot be represented by the same gate.
+# Outputs that equal an input or the constant false do not need a gate (if this is allowed).
+# Support: Let the outputs that need a gate depend on s inputs and let d be the number of distinct functions among them.
+# Each of these inputs and each gate that does not represent an output is an input of some gate.
+# Thus, g gates with k inputs satisfy g * k >= s + g - d, i.e. g >= (s - d) / (k - 1).
+# For a single output this is the bound ceil((s - 1) / (k - 1)).
+
+
+# Returns the functions of the outputs in terms of the inputs and the care set.
+# Returns None if there are more than limit inputs or if the inputs depend on more than limit PIs.
+def getSubcircuitFunctions(specification, inputs, outputs, limit) :
+  if len(inputs) > limit :
+    return None
+  support = specification.getSupport(inputs, limit)
+  if support is None :
+    return None
+  support = sorted(support)
+  input_functions = specification.getConeFunctions(inputs, support)
+  patterns = truthTables.getOccurringPatterns([input_functions[x] for x in inputs], len(support))
+  care_set = sum(1 << x for x in patterns)
+  functions = specification.getConeFunctions(outputs, inputs)
+  return [functions[x] for x in outputs], care_set
+
+# Input j is essential if there are two patterns in the care set that only differ in j and yield different values
+def getEssentialInputs(table, care_set, nof_inputs) :
+  essential = []
+  for j in range(nof_inputs) :
+    shift = 1 << j
+    # The patterns m without j whose counterpart m + 2^j is a care pattern as well
+    pairs = care_set & (care_set >> shift) & ~truthTables.getVariableTable(j, nof_inputs)
+    if (table ^ (table >> shift)) & pairs != 0 :
+      essential.append(j)
+  return essential
+
+def getLowerBound(output_tables, care_set, nof_inputs, nof_gate_inputs, allow_inputs, allow_constants) :
+  input_tables = set(x & care_set for x in truthTables.getVariableTables(nof_inputs)) if allow_inputs else set()
+  functions = set()
+  for table in output_tables :
+    table &= care_set
+    if (allow_constants and table == 0) or table in input_tables :
+      continue
+    functions.add(table)
+  if len(functions) == 0 :
+    return 0
+  bound = len(functions)
+  if nof_gate_inputs > 1 :
+    support = set()
+    for table in functions :
+      essential = getEssentialInputs(table, care_set, nof_inputs)
+      support.update(essential)
+      bound = max(bound, -(-(len(essential) - 1) // (nof_gate_inputs - 1)))
+    bound = max(bound, -(-(len(support) - len(functions)) // (nof_gate_inputs - 1)))
+  return bound
@@ -0,0 +1,96 @@
+# Remembers windows (subcircuits) for which the synthesis proved that they cannot be reduced.
+# In contrast to the taboo list, entries do not expire. An entry is only removed if a gate
+# in the cone of the window (the window, the transitive fan-in of its inputs and the transitive fan-out
+# of its outputs up to the given depths) is changed.
+# If the depths are None (encoding without windows) the cone consists of the transitive fan-out of the window and the
+# transitive fan-in of the window and its fan-out, i.e. of all gates that influence the POs the window influences.
+#
+# A window is identified by its cut (the subcircuit inputs), its outputs and the functions of the outputs
+# in terms of the cut. For windows with many inputs the structure of the gates is used instead of the functions.
+# Windows with the same signature that have at most the proven minimal number of gates are not reducible either.
+class MinimalWindowCache :
+
+  # Windows with more inputs are identified by their structure
+  max_function_inputs = 12
+
+  def __init__(self, specification, tfi_depth, tfo_depth) :
+    self.specification = specification
+    self.tfi_depth = tfi_depth
+    self.tfo_depth = tfo_depth
+    # Map the signature of a window to (minimal size, cone)
+    self.entries = {}
+    # Map a gate to the signatures of the windows whose cone contains the gate
+    self.cone_index = {}
+    self.hits = 0
+    self.invalidated = 0
+
+  def getSignature(self, to_replace) :
+    spec = self.specification
+    inputs = sorted(spec.getSubcircuitInputs(to_replace))
+    outputs = sorted(spec.getSubcircuitOutputs(to_replace))
+    if len(inputs) <= MinimalWindowCache.max_function_inputs :
+      functions = spec.getConeFunctions(outputs, inputs)
+      body = tuple(functions[x] for x in outputs)
+    else :
+      body = tuple((x, tuple(spec.getGateInputs(x)), spec.getGate(x).table.to01()) for x in sorted(to_replace))
+    return (tuple(inputs), tuple(outputs), body)
+
+  def isMinimal(self, signature, nof_gates) :
+    entry = self.entries.get(signature)
+    if entry is None or nof_gates > entry[0] :
+      return False
+    self.hits += 1
+    return True
+
+  def store(self, signature, to_replace) :
+    nof_gates = len(to_replace)
+    if signature in self.entries :
+      if nof_gates <= self.entries[signature][0] :
+        return
+      self._remove(signature)
+    cone = self._getCone(to_replace, signature[0], signature[1])
+    self.entries[signature] = (nof_gates, cone)
+    for x in cone :
+      self.cone_index.setdefault(x, set()).add(signature)
+
+  # Removes all entries whose cone contains one of the given gates
+  def invalidate(self, changed_gates) :
+    for x in changed_gates :
+      for signature in list(self.cone_index.get(x, ())) :
+        self._remove(signature)
+        self.invalidated += 1
+
+  def _remove(self, signature) :
+    _, cone = self.entries.pop(signature)
+    for x in cone :
+      signatures = self.cone_index[x]
+      signatures.discard(signature)
+      if len(signatures) == 0 :
+        del self.cone_index[x]
+
+  def _getCone(self, to_replace, inputs, outputs) :
+    spec = self.specification
+    cone = set(to_replace)
+    if self.tfo_depth is None :
+      current = set(outputs)
+      while len(current) > 0 :
+        current = set(y for x in current for y in spec.getGateOutputs(x) if not y in cone)
+        cone.update(current)
+      current = set(y for x in cone for y in spec.getGateInputs(x) if spec.isGate(y) and not y in cone)
+      while len(current) > 0 :
+        cone.update(current)
+        current = set(y for x in current for y in spec.getGateInputs(x) if spec.isGate(y) and not y in cone)
+      return cone
+    current = [x for x in inputs if spec.isGate(x)]
+    for _ in range(self.tfi_depth) :
+      current = [x for x in current if not x in cone]
+      cone.update(current)
+      current = [y for x in current for y in spec.getGateInputs(x) if spec.isGate(y)]
+    current = list(outputs)
+    for _ in range(self.tfo_depth) :
+      current = [y for x in current for y in spec.getGateOutputs(x) if not y in cone]
+      cone.update(current)
+    return cone
+
+  def printStatistics(self) :
+    print(f"Minimal window cache: entries: {len(self.entries)}; skipped windows: {self.hits}; invalidated: {self.invalidated}")
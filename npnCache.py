@@ -0,0 +1,200 @@
+from collections import OrderedDict
+import json
+import os
+import logging
+
+import truthTables
+
+# Cache of minimal realisations of small multi-output functions.
+# The functions are given by truth tables (see truthTables.py) over the inputs of a subcircuit.
+# Entries are stored for the NPN canonical form of the functions:
+# the inputs may be permuted and negated (the same transformation for all outputs),
+# the outputs may be negated and permuted.
+#
+# Circuits are represented by node indices: nodes 0..n-1 are the inputs, node n+i is the ith gate.
+# A circuit is a pair (gates, outputs), where gates is a list of pairs (input nodes, table)
+# and outputs contains for each output a node or None (the constant false).
+# The tables are integers whose bit row is the value of the gate for the row (ordered as in Gate.table).
+# All gates are normal (table & 1 == 0).
+
+# The sequence of positions p such that swapping p and p+1 successively yields all permutations (Steinhaus-Johnson-Trotter)
+def getAdjacentTranspositions(n) :
+  perm = list(range(n))
+  directions = [-1] * n
+  transpositions = []
+  while True :
+    mobile = None
+    for i, x in enumerate(perm) :
+      j = i + directions[x]
+      if 0 <= j < n and perm[j] < x and (mobile is None or x > perm[mobile]) :
+        mobile = i
+    if mobile is None :
+      return transpositions
+    x = perm[mobile]
+    j = mobile + directions[x]
+    perm[mobile], perm[j] = perm[j], perm[mobile]
+    transpositions.append(min(mobile, j))
+    for y in range(x + 1, n) :
+      directions[y] = -directions[y]
+
+def flipVariable(table, idx, nof_vars) :
+  shift = 1 << idx
+  var_table = truthTables.getVariableTable(idx, nof_vars)
+  return ((table & var_table) >> shift) | ((table & ~var_table) << shift) & truthTables.getMask(nof_vars)
+
+def swapAdjacentVariables(table, idx, nof_vars) :
+  shift = 1 << idx
+  x = truthTables.getVariableTable(idx, nof_vars)
+  y = truthTables.getVariableTable(idx + 1, nof_vars)
+  up = ~x & y & truthTables.getMask(nof_vars)
+  down = x & ~y & truthTables.getMask(nof_vars)
+  return (table & ~(up | down)) | ((table & down) << shift) | ((table & up) >> shift)
+
+# Returns the canonical form of the given functions and the transformation yielding it.
+# The transformation is given by (perm, neg, out_neg, out_order):
+# F[s](y) = f[out_order[s]](x) xor out_neg[out_order[s]], where x[perm[p]] = y[p] xor neg[p].
+def getCanonicalForm(tables, nof_vars) :
+  mask = truthTables.getMask(nof_vars)
+  flips = [(i & -i).bit_length() - 1 for i in range(1, 2 ** nof_vars)]
+  perm = list(range(nof_vars))
+  neg = [0] * nof_vars
+  current = list(tables)
+  best = None
+  for swap in getAdjacentTranspositions(nof_vars) + [None] :
+    for flip in flips + [None] :
+      normalised = [t ^ mask if t & 1 else t for t in current]
+      # Only the tables are compared, thus the form does not depend on the order of the outputs
+      key = tuple(sorted(normalised))
+      if best is None or key < best[0] :
+        out_order = sorted(range(len(normalised)), key = lambda o : normalised[o])
+        best = (key, list(perm), list(neg), [t & 1 for t in current], out_order)
+      if flip is not None :
+        current = [flipVariable(t, flip, nof_vars) for t in current]
+        neg[flip] ^= 1
+    if swap is not None :
+      current = [swapAdjacentVariables(t, swap, nof_vars) for t in current]
+      perm[swap], perm[swap + 1] = perm[swap + 1], perm[swap]
+      neg[swap], neg[swap + 1] = neg[swap + 1], neg[swap]
+  key, perm, neg, out_neg, out_order = best
+  return key, (perm, neg, out_neg, out_order)
+
+# Moves the given input negations (input_map[i] = (new node, negated)) and output negations into the tables of the gates.
+# Gates that are not normal after absorbing the negations are negated and the negation is absorbed by their successors.
+# Returns None if the resulting circuit cannot be represented by normal gates.
+def transformCircuit(circuit, input_map, output_negations) :
+  gates, outputs = circuit
+  nof_inputs = len(input_map)
+  negated = {i : x[1] for i, x in enumerate(input_map)}
+  required = {}
+  for node, out_neg in zip(outputs, output_negations) :
+    if node is None :
+      if out_neg :
+        return None
+    elif node < nof_inputs :
+      if negated[node] != out_neg :
+        return None
+    elif required.setdefault(node, out_neg) != out_neg :
+      return None
+  new_gates = []
+  for idx, (inputs, table) in enumerate(gates) :
+    node = nof_inputs + idx
+    k = len(inputs)
+    row_mask = sum(negated[x] << (k - 1 - p) for p, x in enumerate(inputs))
+    new_table = 0
+    for row in range(2 ** k) :
+      new_table |= (table >> (row ^ row_mask) & 1) << row
+    negate = required.get(node, new_table & 1)
+    if negate :
+      new_table ^= (1 << 2 ** k) - 1
+    if new_table & 1 :
+      return None
+    negated[node] = negate
+    new_gates.append(([input_map[x][0] if x < nof_inputs else x for x in inputs], new_table))
+  new_outputs = [x if x is None or x >= nof_inputs else input_map[x][0] for x in outputs]
+  return new_gates, new_outputs
+
+def simulateCircuit(circuit, nof_inputs) :
+  gates, outputs = circuit
+  mask = truthTables.getMask(nof_inputs)
+  tables = truthTables.getVariableTables(nof_inputs)
+  for inputs, table in gates :
+    rows = [table >> row & 1 for row in range(2 ** len(inputs))]
+    tables.append(truthTables.evaluateGateTable(rows, [tables[x] for x in inputs], mask))
+  return [0 if x is None else tables[x] for x in outputs]
+
+
+class NPNCache :
+
+  def __init__(self, capacity, fname = None) :
+    self.capacity = capacity
+    self.fname = fname
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    if fname is not None and os.path.exists(fname) :
+      self.load(fname)
+
+  # The realisations depend on the configuration, thus, the relevant options are part of the key
+  def getKey(self, canonical_tables, nof_inputs, config) :
+    options = f"{config.gate_size}:{int(config.synthesiseAig)}:{int(config.allowInputsAsOutputs)}:{int(config.allowConstantsAsOutputs)}"
+    return f"{options}:{nof_inputs}:" + ",".join(format(x, "x") for x in canonical_tables)
+
+  # Returns a circuit over the given inputs realising the tables or None
+  def lookup(self, tables, nof_inputs, config) :
+    canonical_tables, transformation = getCanonicalForm(tables, nof_inputs)
+    key = self.getKey(canonical_tables, nof_inputs, config)
+    self.last_lookup = (key, transformation)
+    if not key in self.entries :
+      self.misses += 1
+      return None
+    self.entries.move_to_end(key)
+    perm, neg, out_neg, out_order = transformation
+    gates, canonical_outputs = self.entries[key]
+    outputs = [None] * len(tables)
+    for s, o in enumerate(out_order) :
+      outputs[o] = canonical_outputs[s]
+    circuit = transformCircuit((gates, outputs), [(perm[p], neg[p]) for p in range(nof_inputs)], out_neg)
+    if circuit is None or simulateCircuit(circuit, nof_inputs) != list(tables) :
+      self.misses += 1
+      return None
+    self.hits += 1
+    return circuit
+
+  # The circuit must realise the tables that were used in the last lookup
+  def store(self, circuit, nof_inputs) :
+    key, transformation = self.last_lookup
+    perm, neg, out_neg, out_order = transformation
+    input_map = [None] * nof_inputs
+    for p in range(nof_inputs) :
+      input_map[perm[p]] = (p, neg[p])
+    canonical = transformCircuit(circuit, input_map, out_neg)
+    if canonical is None :
+      return
+    gates, outputs = canonical
+    self.entries[key] = (gates, [outputs[o] for o in out_order])
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.capacity :
+      self.entries.popitem(last = False)
+
+  def load(self, fname) :
+    try :
+      with open(fname) as f :
+        data = json.load(f)
+    except (OSError, ValueError) :
+      logging.warning(f"Could not read the NPN cache {fname}")
+      return
+    for key, (gates, outputs) in data :
+      self.entries[key] = ([(tuple(inputs), table) for inputs, table in gates], outputs)
+    while len(self.entries) > self.capacity :
+      self.entries.popitem(last = False)
+
+  def save(self, fname = None) :
+    fname = self.fname if fname is None else fname
+    if fname is None :
+      return
+    data = [[key, ([[list(inputs), table] for inputs, table in gates], outputs)] for key, (gates, outputs) in self.entries.items()]
+    with open(fname, "w") as f :
+      json.dump(data, f)
+
+  def printStatistics(self) :
+    print(f"NPN cache: entries: {len(self.entries)}; hits: {self.hits}; misses: {self.misses}")
@@ -0,0 +1,77 @@
+from array import array
+
+# Collects the gates of a QCIR encoding in flat integer arrays.
+# The gate i has the operator ops[i], the output variable outs[i] and
+# the inputs literals[offsets[i]:offsets[i+1]].
+# Comments and pre-rendered parts of an encoding are stored as text entries (outs[i] is the index in texts).
+# The encoding is only turned into a string once it is complete.
+class QCIRBuffer :
+
+  AND = 0
+  OR = 1
+  XOR = 2
+  TEXT = 3
+
+  operator_names = ("and", "or", "xor")
+
+  def __init__(self) :
+    self.prefix = []
+    self.output = None
+    self.ops = array('b')
+    self.outs = array('i')
+    self.offsets = array('i', [0])
+    self.literals = array('i')
+    self.texts = []
+
+  def addQuantifierBlock(self, quantifier, variables) :
+    self.prefix.append((quantifier, variables))
+
+  def setOutput(self, var) :
+    self.output = var
+
+  def addGate(self, op, out_var, inputs) :
+    self.ops.append(op)
+    self.outs.append(out_var)
+    self.literals.extend(inputs)
+    self.offsets.append(len(self.literals))
+
+  # text must not end with a newline
+  def addText(self, text) :
+    if len(text) == 0 :
+      return
+    self.ops.append(QCIRBuffer.TEXT)
+    self.outs.append(len(self.texts))
+    self.offsets.append(len(self.literals))
+    self.texts.append(text)
+
+  def getNofGates(self) :
+    return len(self.ops) - len(self.texts)
+
+  # Only the gates (and text entries) without the header, the prefix and the output
+  def getGateText(self) :
+    names = (" = and(", " = or(", " = xor(")
+    outs, offsets, texts = self.outs, self.offsets, self.texts
+    # The literals are converted in a single pass
+    literals = list(map(str, self.literals))
+    lines = []
+    start = 0
+    for i, op in enumerate(self.ops) :
+      end = offsets[i + 1]
+      if op == QCIRBuffer.TEXT :
+        lines.append(texts[outs[i]])
+      else :
+        lines.append(str(outs[i]) + names[op] + ", ".join(literals[start:end]) + ")")
+      start = end
+    return "\n".join(lines)
+
+  def getText(self) :
+    lines = ["#QCIR-G14"]
+    lines += [f"{quantifier}({', '.join(map(str, variables))})" for quantifier, variables in self.prefix]
+    lines.append(f"output({self.output})")
+    gate_text = self.getGateText()
+    if len(gate_text) > 0 :
+      lines.append(gate_text)
+    return "\n".join(lines) + "\n"
+
+  def write(self, out) :
+    out.write(self.getText())
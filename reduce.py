@@ -19,21 +19,35 @@ if __name__ == "__main__" :
   parser.add_argument('--gs', nargs=1, type=int, help='The number of inputs of the gates')
   parser.add_argument("--aig", action='store_true', help='Synthesise an AIG. Optional argument for generating an aiger output file.')
   parser.add_argument('--aig-out', nargs=1, help='AIG output file')
+  parser.add_argument('--compact', action='store_true', help='Store the circuit in compact arrays (reduces the memory for very large circuits)')
   parser.add_argument('--abc', action='store_true', help='Use ABC for inprocessing')
   parser.add_argument("--restarts", nargs=1, type=int, help="The number of restarts")
   parser.add_argument('--seed', nargs=1, type=int, help='Set the seed for random number generation')
-  parser.add_argument('--syn-mode', choices=['qbf', 'qbf-clausal', 'equivalent', 'rel-qbf', 'rel-sat'], help='The synthesis approach to use')
+  parser.add_argument('--syn-mode', choices=['qbf', 'qbf-clausal', 'equivalent', 'cegis', 'rel-qbf', 'rel-sat'], help='The synthesis approach to use')
   # misc
   parser.add_argument('--qbf-solver', choices=['qfun', 'caqe', 'miniqu', 'quabs', 'qute'], help='The solver to use')
+  parser.add_argument('--portfolio', nargs='+', choices=['qfun', 'caqe', 'miniqu', 'quabs', 'qute'], help='Race the given solvers on each encoding and use the first answer')
   parser.add_argument('--abc-cmds', nargs=2, metavar='ABCCMDS',help='The abc commands to use')
   parser.add_argument("--it", nargs=1, type=int, help='Stop after the given number of iterations')
   parser.add_argument("--sorted", action='store_true', help='The given specification can be considered as sorted')
   # Options for subcircuit selection
   parser.add_argument('--size', nargs=1, type=int, help='Set the initial subcircuit size')
   parser.add_argument("--single-output", action='store_true', help='Only consider subcircuits with a single output')
+  parser.add_argument("--file-transport", action='store_true', help='Pass the encodings to the solvers by temporary files instead of in-memory files')
+  parser.add_argument('--no-cert-streaming', dest='cert_streaming', action='store_false', help='Parse the entire solver output instead of only the certificate variables that are needed')
+  parser.add_argument('--npn-cache', nargs='?', const='', metavar='FILE', help='Reuse minimal realisations of NPN equivalent subcircuits. If a file is given the cache is loaded from and saved to the file')
+  parser.add_argument('--no-min-cache', dest='min_cache', action='store_false', help='Do not skip windows that were proven to be irreducible')
+  parser.add_argument('--fraig', action='store_true', help='Merge functionally equivalent gates by SAT sweeping before the traversal')
+  parser.add_argument('--fraig-interval', nargs=1, type=int, help='Repeat the SAT sweeping after the given number of iterations (implies --fraig)')
+  parser.add_argument('--no-db-rewrite', dest='db_rewrite', action='store_false', help='Do not replace small cones by circuits from the database of minimum circuits')
+  parser.add_argument('--jobs', nargs=1, type=int, help='Synthesise the given number of disjoint windows in parallel (implies the windowed encoding)')
+  parser.add_argument('--pipeline', nargs=1, type=int, help='Prepare the encodings of the given number of windows while the solver runs (implies the windowed encoding)')
+  parser.add_argument('--window', nargs=2, type=int, metavar=('TFI', 'TFO'), help='Only encode a window around the subcircuits with the given fan-in and fan-out depths')
   # Options for setting timeouts
   parser.add_argument('--dynTO', action='store_false', help='Disable dynamic timeouts')
   parser.add_argument("--qbfTO", nargs=1, type=int, help = "Base timeout for the qbf checks")
+  parser.add_argument('--timeout-model', action='store_true', help='Predict the timeouts of the qbf checks from features of the encodings')
+  parser.add_argument('--profile', nargs=1, metavar='FILE', help='Start with the subcircuit size and timeouts calibrated by previous runs and save the calibration to the file')
   # Disable Symmetry Breaking Constraints
   parser.add_argument('-N', action='store_false',help='Disable Non trivial')
   parser.add_argument('-A', action='store_false',help='Disable All steps')
@@ -41,10 +55,18 @@ if __name__ == "__main__" :
   parser.add_argument('-O', action='store_false',help='Disable Ordered steps')
   # Additional options for subcircuit synthesis
   parser.add_argument('--require-reduction', action='store_true', help='Only replace subcircuits by smaller subcircuits')
+  parser.add_argument('--no-witness', dest='witness', action='store_false', help='Check the original size of subcircuits by the solver (subcircuits may be replaced by different circuits of the same size)')
+  parser.add_argument('--size-search', choices=[x.name for x in Configuration.SizeSearchStrategy], help='How the smallest number of gates realising a subcircuit is searched')
+  parser.add_argument('--probes', nargs=1, type=int, help='Check the given number of sizes of a subcircuit concurrently')
   parser.add_argument('--cO', action='store_false',help='Disable constants as outputs')
   parser.add_argument('--iO', action='store_false',help='Disable inputs as outputs')
+  parser.add_argument('--no-sim-zero', dest='sim_zero', action='store_false', help='Use the solver to check whether subcircuits can be realised without gates')
+  parser.add_argument('--no-lower-bounds', dest='lower_bounds', action='store_false', help='Do not skip sizes below lower bounds derived from the functions of the subcircuits')
+  parser.add_argument('--sel-enc', choices=[x.name for x in Configuration.CardinalityEncoding], help='The encoding of the constraints on the selection variables')
+  parser.add_argument('--out-enc', choices=[x.name for x in Configuration.CardinalityEncoding], help='The encoding of the constraints on the gate output variables')
   # Options to log additional information
   parser.add_argument('--log-enc', nargs=1, help='Save the generated encodings in the given directory')
+  parser.add_argument('--enc-comments', action='store_true', help='Write comments describing the constraints to the encodings')
   parser.add_argument('--log-spec', nargs=1, help='Log intermediate results')
   parser.add_argument('--log-iteration-steps', metavar='int-TIME',nargs=1, type=int, help="Time before logging of an intermediate result shall take place")
   parser.add_argument('--log-time-steps', metavar='int-ITERATIONS', nargs=1, type=int, help="Nof iterations before logging of an intermediate result shall take place")
@@ -73,6 +95,7 @@ if __name__ == "__main__" :
     if args.aig_out :
       parser.error('--aig is required when --aig-out is set.')
     config.synthesiseAig = False
+  config.compact_specification = args.compact
 
   if args.seed :
     config.seed = args.seed[0]
@@ -86,6 +109,8 @@ if __name__ == "__main__" :
       config.synthesis_approach = Configuration.SynthesisationMode.qbf_clausal
     elif args.syn_mode == "equivalent" :
       config.synthesis_approach = Configuration.SynthesisationMode.exact
+    elif args.syn_mode == "cegis" :
+      config.synthesis_approach = Configuration.SynthesisationMode.cegis
     else :
       assert False
   else :
@@ -93,31 +118,43 @@ if __name__ == "__main__" :
 
   if args.qbf_solver :
     if args.qbf_solver == 'qfun' :
-      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal, Configuration.SynthesisationMode.relation_qbf} :
+      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal} :
         parser.error('QBF clausal encodings cannot be used with the qfun')
       config.qbf_solver = Configuration.QBFSolver.QFun
     elif args.qbf_solver == 'caqe' :
-      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact} :
+      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact, Configuration.SynthesisationMode.cegis} :
         parser.error('QBF circuit encodings cannot be used with the solvers caqe')
       config.qbf_solver = Configuration.QBFSolver.caqe
     elif args.qbf_solver == 'miniqu' :
+      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal} :
+        parser.error('QBF clausal encodings cannot be used with miniqu')
       config.qbf_solver = Configuration.QBFSolver.miniQU
     elif args.qbf_solver == 'quabs' :
-      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal, Configuration.SynthesisationMode.relation_qbf} :
+      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal} :
         parser.error('QBF clausal encodings cannot be used with the quabs')
       config.qbf_solver = Configuration.QBFSolver.quabs
     elif args.qbf_solver == 'qute' :
-      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact} :
+      if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact, Configuration.SynthesisationMode.cegis} :
         parser.error('QBF circuit encodings cannot be used with the solvers qute')
       config.qbf_solver = Configuration.QBFSolver.qute
     else :
       assert False
   else :
-    if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact} :
+    if config.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.exact, Configuration.SynthesisationMode.cegis} :
       config.qbf_solver = Configuration.QBFSolver.QFun
-    elif config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal, Configuration.SynthesisationMode.relation_qbf} :
+    elif config.synthesis_approach in {Configuration.SynthesisationMode.qbf_clausal} :
       config.qbf_solver = Configuration.QBFSolver.caqe
 
+  if args.portfolio :
+    solvers = {'qfun' : Configuration.QBFSolver.QFun, 'caqe' : Configuration.QBFSolver.caqe, 'miniqu' : Configuration.QBFSolver.miniQU, 'quabs' : Configuration.QBFSolver.quabs, 'qute' : Configuration.QBFSolver.qute}
+    config.qbf_portfolio = [solvers[x] for x in dict.fromkeys(args.portfolio)]
+    if config.synthesis_approach == Configuration.SynthesisationMode.qbf_clausal :
+      if any(not x in {'caqe', 'qute'} for x in args.portfolio) :
+        parser.error('QBF clausal encodings can only be used with caqe and qute')
+    elif any(x in {'caqe', 'qute'} for x in args.portfolio) :
+      parser.error('QBF circuit encodings cannot be used with the solvers caqe and qute')
+    config.qbf_solver = config.qbf_portfolio[0]
+
   if args.it :
     iteration_limit = args.it[0]
   else :
@@ -126,7 +163,33 @@ if __name__ == "__main__" :
   ordered_specification = args.sorted
   if args.single_output :
     config.search_strategy = Configuration.SearchStrategy.SingleOutputSubcircuit
+  if args.window :
+    config.use_windowed_encoding = True
+    config.window_tfi_depth = args.window[0]
+    config.window_tfo_depth = args.window[1]
+  if args.jobs :
+    config.parallel_windows = args.jobs[0]
+    if config.parallel_windows > 1 :
+      config.use_windowed_encoding = True
+  if args.pipeline :
+    config.pipeline_depth = args.pipeline[0]
+    if config.pipeline_depth > 0 :
+      config.use_windowed_encoding = True
+  if args.npn_cache is not None :
+    config.use_npn_cache = True
+    config.npn_cache_file = args.npn_cache if args.npn_cache != '' else None
+  config.use_minimal_window_cache = args.min_cache
+  config.use_rewrite_database = args.db_rewrite
+  config.use_fraig = args.fraig or args.fraig_interval is not None
+  if args.fraig_interval :
+    config.fraig_interval = args.fraig_interval[0]
+  if args.file_transport :
+    config.encoding_transport = Configuration.EncodingTransport.file
+  config.stream_certificates = args.cert_streaming
   config.use_dynamic_timeouts = args.dynTO
+  config.use_timeout_model = args.timeout_model
+  if args.profile :
+    config.calibration_profile_file = args.profile[0]
 
   if args.qbfTO :
     config.base_timeout = args.qbfTO[0]
@@ -139,12 +202,24 @@ if __name__ == "__main__" :
   config.useOrderedStepsConstraint = args.O
 
   config.require_reduction = args.require_reduction
+  config.use_original_witness = args.witness
+  if args.size_search :
+    config.size_search_strategy = Configuration.SizeSearchStrategy[args.size_search]
+  if args.probes :
+    config.size_search_probes = args.probes[0]
   config.allowConstantsAsOutputs = args.cO
   config.allowInputsAsOutputs = args.iO
+  config.simulate_zero_gate_check = args.sim_zero
+  config.use_lower_bounds = args.lower_bounds
+  if args.sel_enc :
+    config.selection_cardinality_encoding = Configuration.CardinalityEncoding[args.sel_enc]
+  if args.out_enc :
+    config.output_cardinality_encoding = Configuration.CardinalityEncoding[args.out_enc]
   
   if not args.log_enc and not args.log_spec and (args.log_iteration_steps or args.log_time_steps) :
     parser.error('Log steps given but neither specifications nor encodings shall be logged')
 
+  config.write_encoding_comments = args.enc_comments
   if args.log_enc :
     config.encoding_log_dir = args.log_enc[0]
   else :
@@ -0,0 +1,216 @@
+import os
+import logging
+
+import bitarray
+
+import npnCache
+
+# Database of minimum circuits for all functions with at most four inputs.
+# For each NPN class of the 4-input functions (222 classes) the database contains a circuit with the minimal number of
+# normal gates realising the canonical representative of the class (see npnCache.getCanonicalForm).
+# The circuits are represented as in npnCache. The database is generated by generateRewriteDatabase.py.
+#
+# File format: Lines starting with "#" are comments, the line "gate_size <k> aig <0/1>" gives the options that were used
+# for generating the circuits. Every other line represents a class:
+# <canonical table (hex)> <output node or "-" for the constant false> <gate>*
+# where a gate is given by its input nodes and its table (hex) separated by commas.
+
+DATABASE_NOF_INPUTS = 4
+default_database_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rewriteDatabase4.txt")
+
+def writeDatabase(fname, entries, gate_size, aig) :
+  with open(fname, "w") as f :
+    f.write(f"# Minimum circuits for the NPN classes of the {DATABASE_NOF_INPUTS}-input functions\n")
+    f.write(f"gate_size {gate_size} aig {int(aig)}\n")
+    for canonical_table, (gates, outputs) in sorted(entries.items()) :
+      output = "-" if outputs[0] is None else str(outputs[0])
+      gate_strings = [",".join(str(x) for x in inputs) + "," + format(table, "x") for inputs, table in gates]
+      f.write(" ".join([format(canonical_table, "x"), output] + gate_strings) + "\n")
+
+
+class RewriteDatabase :
+
+  def __init__(self, fname = None) :
+    self.fname = default_database_file if fname is None else fname
+    self.gate_size = None
+    self.aig = None
+    # Map canonical tables to circuits
+    self.entries = {}
+    # Map tables to their canonical form and the transformation yielding the canonical form
+    self.canonical_forms = {}
+    self._load(self.fname)
+
+  def _load(self, fname) :
+    with open(fname) as f :
+      for line in f :
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#") :
+          continue
+        fields = line.split()
+        if fields[0] == "gate_size" :
+          self.gate_size = int(fields[1])
+          self.aig = fields[3] == "1"
+          continue
+        gates = []
+        for gate_string in fields[2:] :
+          values = gate_string.split(",")
+          gates.append((tuple(int(x) for x in values[:-1]), int(values[-1], 16)))
+        output = None if fields[1] == "-" else int(fields[1])
+        self.entries[int(fields[0], 16)] = (gates, [output])
+
+  # The database can only be used if the circuits consist of the same kind of gates as the synthesised ones
+  def isApplicable(self, config) :
+    return self.gate_size == config.gate_size and self.aig == config.synthesiseAig
+
+  def _getCanonicalForm(self, table) :
+    if not table in self.canonical_forms :
+      canonical_tables, transformation = npnCache.getCanonicalForm([table], DATABASE_NOF_INPUTS)
+      self.canonical_forms[table] = (canonical_tables[0], transformation)
+    return self.canonical_forms[table]
+
+  # Returns the number of gates of the minimum circuit of the function given by the truth table over nof_inputs variables
+  # (None if the function is not contained in the database)
+  def getSize(self, table, nof_inputs) :
+    canonical_table, _ = self._getCanonicalForm(self._extendTable(table, nof_inputs))
+    if not canonical_table in self.entries :
+      return None
+    return len(self.entries[canonical_table][0])
+
+  # Returns a minimum circuit realising the function (nodes 0..nof_inputs-1 are the inputs) or None
+  def getCircuit(self, table, nof_inputs) :
+    extended_table = self._extendTable(table, nof_inputs)
+    canonical_table, transformation = self._getCanonicalForm(extended_table)
+    perm, neg, out_neg, _ = transformation
+    circuit = npnCache.transformCircuit(self.entries[canonical_table], [(perm[p], neg[p]) for p in range(DATABASE_NOF_INPUTS)], out_neg)
+    if circuit is None :
+      return None
+    gates, outputs = circuit
+    # The circuit shall only use the given inputs
+    if any(x >= nof_inputs and x < DATABASE_NOF_INPUTS for inputs, _ in gates for x in inputs) :
+      return None
+    if outputs[0] is not None and nof_inputs <= outputs[0] < DATABASE_NOF_INPUTS :
+      return None
+    # Renumber the gate nodes
+    offset = DATABASE_NOF_INPUTS - nof_inputs
+    renumber = lambda x : x if x < nof_inputs else x - offset
+    gates = [([renumber(x) for x in inputs], table) for inputs, table in gates]
+    outputs = [None if x is None else renumber(x) for x in outputs]
+    if npnCache.simulateCircuit((gates, outputs), nof_inputs) != [table] :
+      return None
+    return gates, outputs
+
+  # The function over nof_inputs variables as a function over DATABASE_NOF_INPUTS variables
+  def _extendTable(self, table, nof_inputs) :
+    size = 1 << nof_inputs
+    for _ in range(DATABASE_NOF_INPUTS - nof_inputs) :
+      table |= table << size
+      size *= 2
+    return table
+
+
+# Rewriting based on the database:
+# The gates are traversed in topological order. For each gate the cuts with at most four leaves are enumerated.
+# The maximum fanout free cone of the gate with respect to a cut is replaced by the minimum circuit for the function
+# of the gate in terms of the cut if this reduces the number of gates.
+class DatabaseRewriter :
+
+  def __init__(self, specification, database, max_cuts) :
+    self.specification = specification
+    self.database = database
+    self.max_cuts = max_cuts
+    self.cuts = {}
+    self.nof_rewrites = 0
+    # The gates that were removed, added or whose inputs were changed by the rewrites
+    self.changed_gates = set()
+
+  # Returns the number of removed gates
+  def rewrite(self) :
+    spec = self.specification
+    nof_gates = spec.getNofGates()
+    order = sorted(spec.getGateAliases(), key = lambda x : spec.getGateLevel(x))
+    for root in order :
+      if not spec.isGate(root) or len(spec.getGateInputs(root)) == 0 :
+        continue
+      best = None
+      for cut in self._getCuts(root) :
+        if root in cut :
+          continue
+        leaves = sorted(cut)
+        table = spec.getConeFunctions([root], leaves)[root]
+        size = self.database.getSize(table, len(leaves))
+        if size is None :
+          continue
+        mffc = self._getMFFC(root, cut)
+        gain = len(mffc) - size
+        if gain > 0 and (best is None or gain > best[0]) :
+          circuit = self.database.getCircuit(table, len(leaves))
+          if circuit is not None :
+            best = (gain, leaves, circuit, mffc)
+      if best is not None :
+        self._applyRewrite(root, *best[1:])
+    return nof_gates - spec.getNofGates()
+
+  def _getCuts(self, alias) :
+    if alias in self.cuts :
+      return self.cuts[alias]
+    spec = self.specification
+    trivial_cut = frozenset([alias])
+    if not spec.isGate(alias) or len(spec.getGateInputs(alias)) == 0 :
+      self.cuts[alias] = [trivial_cut]
+      return self.cuts[alias]
+    cuts = {frozenset()}
+    for x in spec.getGateInputs(alias) :
+      cuts = {c.union(d) for c in cuts for d in self._getCuts(x) if len(c.union(d)) <= DATABASE_NOF_INPUTS}
+    cuts = sorted(cuts, key = lambda c : (len(c), sorted(c)))[:self.max_cuts]
+    self.cuts[alias] = cuts + [trivial_cut]
+    return self.cuts[alias]
+
+  # The gates of the cone of root (bounded by the cut) that are only used within the cone
+  def _getMFFC(self, root, cut) :
+    spec = self.specification
+    mffc = [root]
+    nof_references = {}
+    to_process = [root]
+    while len(to_process) > 0 :
+      alias = to_process.pop()
+      # A gate may use the same input several times, but it is a single output of the input
+      for x in set(spec.getGateInputs(alias)) :
+        if x in cut or not spec.isGate(x) :
+          continue
+        nof_references[x] = nof_references.get(x, 0) + 1
+        if nof_references[x] == len(spec.getGateOutputs(x)) and not spec.isPO(x) :
+          mffc.append(x)
+          to_process.append(x)
+    return mffc
+
+  def _applyRewrite(self, root, leaves, circuit, mffc) :
+    spec = self.specification
+    gates, outputs = circuit
+    nof_leaves = len(leaves)
+    output = outputs[0]
+    # The gate representing the output keeps the alias of the root
+    available = [x for x in mffc if x != root]
+    names = {}
+    next_alias = spec.getMaxAlias() + 1
+    for i in range(len(gates)) :
+      node = nof_leaves + i
+      if node == output :
+        names[node] = root
+      elif len(available) > 0 :
+        names[node] = available.pop()
+      else :
+        names[node] = next_alias
+        next_alias += 1
+    names.update((i, x) for i, x in enumerate(leaves))
+    new_gates = []
+    for i, (inputs, gate_table) in enumerate(gates) :
+      gate_bits = bitarray.bitarray([gate_table >> row & 1 for row in range(2 ** len(inputs))])
+      new_gates.append((names[nof_leaves + i], [names[x] for x in inputs], gate_bits))
+    output_association = {root : None if output is None else names[output]}
+    logging.debug(f"Database rewrite: root: {root}; removed: {mffc}; new gates: {[x[0] for x in new_gates]}")
+    successors = spec.getDirectSuccessors(mffc)
+    unused = spec.replaceSubcircuit(mffc, new_gates, output_association)
+    self.nof_rewrites += 1
+    self.changed_gates.update(mffc, unused, successors, (x[0] for x in new_gates))
+    for x in list(mffc) + list(unused) :
+      self.cuts.pop(x, None)
@@ -0,0 +1,122 @@
+import heapq
+import random
+
+import truthTables
+from gateTables import getGateTable
+
+# Exhaustive simulation is used by default if there are at most this many inputs
+max_exhaustive_inputs = 16
+
+
+# Evaluates the gate on all patterns at once.
+# Bit p of a signature is the value of the respective node under pattern p.
+# The gate is evaluated as a disjunction of its true rows or as a conjunction of clauses excluding its false rows (see GateTable.getQCIRRows).
+def evaluateGate(function, input_signatures, mask) :
+  anded, rows = function.getQCIRRows()
+  if anded :
+    result = 0
+    for row in rows :
+      term = mask
+      for x, positive in zip(input_signatures, row) :
+        term &= x if positive else ~x
+      result |= term
+  else :
+    result = mask
+    for row in rows :
+      clause = 0
+      for x, positive in zip(input_signatures, row) :
+        clause |= x if positive else ~x
+      result &= clause
+  return result & mask
+
+# gates: (alias, inputs, table) in topological order
+def simulateGates(signatures, gates, mask) :
+  for alias, inputs, table in gates :
+    signatures[alias] = evaluateGate(getGateTable(table), [signatures[x] for x in inputs], mask)
+  return signatures
+
+# The subcircuits are given as in utils.checkSubcircuitsForEquivalence, i.e. as (inputs, outputs, gates).
+# The subcircuits are simulated on all assignments of the inputs.
+def areSubcircuitsEquivalent(subcir1, subcir2) :
+  inputs1, outputs1, gates1 = subcir1
+  inputs2, outputs2, gates2 = subcir2
+  assert inputs1 == inputs2
+  assert len(outputs1) == len(outputs2)
+  mask = truthTables.getMask(len(inputs1))
+  input_signatures = dict(zip(inputs1, truthTables.getVariableTables(len(inputs1))))
+  signatures1 = simulateGates(dict(input_signatures), gates1, mask)
+  signatures2 = simulateGates(dict(input_signatures), gates2, mask)
+  # None represents a constant (false) output
+  return all(signatures1[x] == (0 if y is None else signatures2[y]) for x, y in zip(outputs1, outputs2))
+
+
+# Bit-parallel simulation of a specification.
+# The signature of a node is a Python integer whose bit p is the value of the node under pattern p. As Python integers
+# have arbitrary precision, a bitwise operation processes all patterns (i.e. any number of 64-bit words) at once.
+# The patterns are either all assignments of the PIs (exhaustive) or random assignments.
+# After a replacement only the affected cone needs to be simulated again (see update).
+class Simulator :
+
+  def __init__(self, specification, nof_patterns = 1024, seed = None, exhaustive = None) :
+    self.specification = specification
+    inputs = specification.getInputs()
+    self.exhaustive = len(inputs) <= max_exhaustive_inputs if exhaustive is None else exhaustive
+    if self.exhaustive :
+      self.nof_patterns = 1 << len(inputs)
+      input_signatures = truthTables.getVariableTables(len(inputs))
+    else :
+      self.nof_patterns = nof_patterns
+      rng = random.Random(seed)
+      input_signatures = [rng.getrandbits(nof_patterns) for _ in inputs]
+    self.mask = (1 << self.nof_patterns) - 1
+    self.signatures = dict(zip(inputs, input_signatures))
+    self.simulate()
+
+  def simulate(self) :
+    for gate in self.specification.orderedGateTraversal() :
+      self.signatures[gate.getAlias()] = evaluateGate(gate.function, [self.signatures[x] for x in gate.inputs], self.mask)
+
+  # Adds patterns (e.g. counterexamples) given as dictionaries mapping the PIs to their values and simulates again
+  def addPatterns(self, patterns) :
+    for pattern in patterns :
+      for x in self.specification.getInputs() :
+        self.signatures[x] |= pattern[x] << self.nof_patterns
+      self.nof_patterns += 1
+    self.mask = (1 << self.nof_patterns) - 1
+    self.simulate()
+
+  # Simulates the given gates again (e.g. the new gates of a replacement and the direct successors of the replaced gates)
+  # as well as their transitive fan-out as long as the signatures change. The signatures of the removed gates are dropped.
+  def update(self, changed, removed = ()) :
+    spec = self.specification
+    for x in removed :
+      if not spec.isGate(x) :
+        self.signatures.pop(x, None)
+    queue = [(spec.alias2order[x], x) for x in set(changed) if spec.isGate(x)]
+    heapq.heapify(queue)
+    queued = set(x for _, x in queue)
+    while len(queue) > 0 :
+      _, alias = heapq.heappop(queue)
+      gate = spec.getGate(alias)
+      signature = evaluateGate(gate.function, [self.signatures[x] for x in gate.inputs], self.mask)
+      if self.signatures.get(alias) == signature :
+        continue
+      self.signatures[alias] = signature
+      for x in spec.getGateOutputs(alias) :
+        if not x in queued :
+          queued.add(x)
+          heapq.heappush(queue, (spec.alias2order[x], x))
+
+  def getSignature(self, alias) :
+    return self.signatures[alias]
+
+  # The signatures of the POs (negated outputs are taken into account)
+  def getOutputSignatures(self) :
+    spec = self.specification
+    return [self.signatures[x] ^ self.mask if spec.isOutputNegated(idx) else self.signatures[x] for idx, x in enumerate(spec.getOutputs())]
+
+  def getNofPatterns(self) :
+    return self.nof_patterns
+
+  def isExhaustive(self) :
+    return self.exhaustive
@@ -0,0 +1,80 @@
+from utils import Configuration
+
+
+# Searches the smallest number of gates in the interval (lower, upper) for which a subcircuit can be realised.
+# The number of gates upper is assumed to be realisable (it need not be checked) and lower to be unrealisable.
+# We assume that the realisability is monotonic in the number of gates, i.e. if a subcircuit can be realised
+# with n gates, it can also be realised with n + 1 gates.
+# A check that timed out is treated as unrealisable, but the result is no longer known to be minimal.
+#
+# linear: check upper - 1, upper - 2, ... until a check fails
+# binary: bisect the interval
+# galloping: check upper - 1, upper - 2, upper - 4, ... until a check fails, then bisect the remaining interval
+class SizeSearch :
+
+  def __init__(self, strategy, lower, upper) :
+    self.strategy = strategy
+    self.lower = lower
+    self.upper = upper
+    self.galloping = strategy == Configuration.SizeSearchStrategy.galloping
+    self.step = 1
+    # The smallest realisable number of gates that was checked and the corresponding result
+    self.smallest = None
+    self.smallest_data = None
+    self.timeout = False
+
+  def isFinished(self) :
+    return self.upper - self.lower <= 1
+
+  # A check of the given size can still change the result
+  def isRelevant(self, size) :
+    return self.lower < size < self.upper
+
+  def isMinimal(self) :
+    return not self.timeout
+
+  # Returns up to n sizes that shall be checked next (sizes in pending are already being checked)
+  def getCandidates(self, n, pending = ()) :
+    if self.strategy == Configuration.SizeSearchStrategy.linear :
+      candidates = range(self.upper - 1, self.lower, -1)
+    elif self.galloping :
+      candidates = []
+      step = self.step
+      while self.upper - step > self.lower :
+        candidates.append(self.upper - step)
+        step *= 2
+      # The next step would pass lower, thus the smallest relevant size is checked instead
+      if self.isRelevant(self.lower + 1) and (len(candidates) == 0 or candidates[-1] != self.lower + 1) :
+        candidates.append(self.lower + 1)
+    else :
+      # Split the interval evenly into len(pending) + n + 1 parts
+      nof_parts = len(pending) + n + 1
+      candidates = sorted(set(self.lower + (self.upper - self.lower) * i // nof_parts for i in range(1, nof_parts)), reverse = True)
+      candidates = [x for x in candidates if self.isRelevant(x)]
+      if len(candidates) == 0 and not self.isFinished() :
+        candidates = [(self.lower + self.upper) // 2]
+    result = []
+    for x in candidates :
+      if len(result) == n :
+        break
+      if not x in pending :
+        result.append(x)
+    # If the search is not finished there must be a size to check (unless all of them are already being checked)
+    assert len(result) > 0 or len(pending) > 0 or n == 0 or self.isFinished()
+    return result
+
+  def logRealisable(self, size, data) :
+    if size < self.upper :
+      self.upper = size
+      self.smallest = size
+      self.smallest_data = data
+      self.step *= 2
+
+  def logUnrealisable(self, size) :
+    if size > self.lower :
+      self.lower = size
+    self.galloping = False
+
+  def logTimeout(self, size) :
+    self.timeout = True
+    self.logUnrealisable(size)
@@ -0,0 +1,125 @@
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+import utils
+import certificateParser
+
+# Interval (sec) in which a cancellable solver call checks whether it was cancelled
+cancel_poll_interval = 0.05
+
+# commands: map each solver to its command line
+# Runs the solvers concurrently and returns the solver that answered first and its subprocess.CompletedProcess.
+# The other solvers are killed. If no solver gives a definitive answer, the result of the last solver is returned.
+# Raises subprocess.TimeoutExpired if no solver answers within the timeout (0: no timeout) and
+# utils.CancelledException if the event cancel is set before a solver answered.
+# parsers: optionally maps solvers to a certificateParser.CertificateParser. The output of these solvers is parsed
+# while it is read; the stdout of the returned process then only contains the output that is not part of the certificate.
+def runSolvers(commands, timeout = 0, pass_fds = (), cancel = None, parsers = None) :
+  if len(commands) == 1 and cancel is None and parsers is None :
+    solver, cmd = next(iter(commands.items()))
+    return solver, subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout = timeout if timeout != 0 else None, pass_fds = pass_fds)
+
+  results = queue.Queue()
+  processes = {}
+  for solver, cmd in commands.items() :
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds = pass_fds)
+    processes[solver] = process
+    # The outputs need to be read while the solvers run, otherwise a solver may block on a full pipe
+    parser = None if parsers is None else parsers.get(solver)
+    threading.Thread(target = _collectResult, args = (solver, process, results, parser), daemon = True).start()
+
+  deadline = None if timeout == 0 else time.time() + timeout
+  nof_results = 0
+  try :
+    while True :
+      remaining = None if deadline is None else max(0, deadline - time.time())
+      if cancel is not None :
+        remaining = cancel_poll_interval if remaining is None else min(remaining, cancel_poll_interval)
+      try :
+        solver, result = results.get(timeout = remaining)
+      except queue.Empty :
+        if cancel is not None and cancel.is_set() :
+          raise utils.CancelledException()
+        if deadline is not None and time.time() >= deadline :
+          raise subprocess.TimeoutExpired(list(commands.values())[0], timeout)
+        continue
+      nof_results += 1
+      if result.returncode in (10, 20) or nof_results == len(processes) :
+        return solver, result
+      logging.debug(f"Portfolio: {solver.name} returned {result.returncode}")
+  finally :
+    for process in processes.values() :
+      if process.poll() is None :
+        process.kill()
+
+def _collectResult(solver, process, results, parser = None) :
+  if parser is None :
+    stdout, stderr = process.communicate()
+  else :
+    # stderr is read by a separate thread such that the solver does not block on a full pipe
+    stderr_output = []
+    stderr_thread = threading.Thread(target = lambda : stderr_output.append(process.stderr.read()), daemon = True)
+    stderr_thread.start()
+    certificateParser.parseStream(process.stdout, parser)
+    process.wait()
+    stderr_thread.join()
+    stdout, stderr = parser.getOtherOutput(), stderr_output[0]
+  results.put((solver, subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)))
+
+
+# Races several QBF solvers on the same encoding. The first definitive answer (SAT: 10, UNSAT: 20) is used
+# and the other solvers are killed.
+# For each solver the number of won races is recorded. After prune_after decided races, solvers that won
+# fewer than min_win_ratio of the races are no longer started (the best solver is always kept).
+class SolverPortfolio :
+
+  def __init__(self, solvers, prune_after, min_win_ratio) :
+    assert len(solvers) > 0, "The portfolio must contain at least one solver"
+    self.solvers = list(solvers)
+    self.active_solvers = list(solvers)
+    self.prune_after = prune_after
+    self.min_win_ratio = min_win_ratio
+    self.wins = {x : 0 for x in self.solvers}
+    self.nof_races = 0
+    self.nof_timeouts = 0
+    # Races may be started by several threads (parallel traversal)
+    self.lock = threading.Lock()
+
+  def getActiveSolvers(self) :
+    with self.lock :
+      return list(self.active_solvers)
+
+  # Returns the solver that answered first and its subprocess.CompletedProcess (see runSolvers)
+  def race(self, commands, timeout = 0, pass_fds = (), cancel = None, parsers = None) :
+    try :
+      solver, result = runSolvers(commands, timeout, pass_fds, cancel, parsers)
+    except subprocess.TimeoutExpired :
+      self._logResult(None, True)
+      raise
+    self._logResult(solver if result.returncode in (10, 20) else None)
+    return solver, result
+
+  def _logResult(self, winner, timeout = False) :
+    with self.lock :
+      if timeout :
+        self.nof_timeouts += 1
+      if winner is None :
+        return
+      self.wins[winner] += 1
+      self.nof_races += 1
+      if self.nof_races >= self.prune_after and len(self.active_solvers) > 1 :
+        self._prune()
+
+  def _prune(self) :
+    best = max(self.active_solvers, key = lambda x : self.wins[x])
+    pruned = [x for x in self.active_solvers if x != best and self.wins[x] < self.min_win_ratio * self.nof_races]
+    for x in pruned :
+      logging.info(f"Portfolio: {x.name} is no longer used (won {self.wins[x]} of {self.nof_races} races)")
+      self.active_solvers.remove(x)
+
+  def printStatistics(self) :
+    wins = "; ".join(f"{x.name}: {self.wins[x]}" for x in self.solvers)
+    print(f"Solver portfolio: decided races: {self.nof_races}; timeouts: {self.nof_timeouts}; wins: {wins}; active: {[x.name for x in self.active_solvers]}")
@@ -1,20 +1,28 @@
 import time
 import sys
 import logging
+import heapq
 
 import bitarray
 import bitarray.util
 
 from utils import isNormalised
-from utils import getBitSeq
 from utils import getAllIndices
+import truthTables
+from gateTables import getGateTable
 
 class Gate :
   
   def __init__(self, gate_alias, inputs, table) :
     self.gate_alias = gate_alias
     self.inputs = inputs
-    self.table = table
+    # The interned table (see gateTables)
+    self.function = getGateTable(table)
+
+  # A frozenbitarray shared by all gates with the same function
+  @property
+  def table(self) :
+    return self.function.table
 
   # renaming[x] = None indicates that x is a constant (false) gate
   def substitute(self, renaming) :
@@ -28,12 +36,10 @@ class Gate :
     return renamed_inputs
 
   def _reduceTable(self, to_remove) :
-    for idx in to_remove :
-      reversed_idx = len(self.inputs) - 1 - idx
-      self.table = bitarray.bitarray(x for idx, x in enumerate(self.table) if idx % (2 ** (reversed_idx + 1)) < (2 ** (reversed_idx)))
-    if not self.table.any() : # the table representing the constant false
+    self.function = self.function.removeInputs(to_remove)
+    if self.function.value == 0 : # the table representing the constant false
       self.inputs = []
-      self.table = bitarray.util.zeros(1)
+      self.function = getGateTable(bitarray.util.zeros(1))
 
   def isConstant(self) :
     return len(self.inputs) == 0
@@ -58,21 +64,16 @@ class Gate :
     # If the gate is false for the majority of the input combinations we
     # represent the gate by a disjunction of conjunctions, otherwise by
     # a conjunction of disjunctions.
-    anded = len([x for x in self.table if x > 0]) <= (2 ** (len(self.inputs) - 1))
-    val = 1 if anded else 0
-    lines = []
-    for idx, tt_val in enumerate(self.table) :
-      if tt_val == val :
-        line = [input_names[i] if v == val else -input_names[i] for i,v in enumerate(getBitSeq(idx, len(self.inputs)))]
-        lines.append(line)
+    anded, rows = self.function.getQCIRRows()
+    lines = [[x if positive else -x for x, positive in zip(input_names, row)] for row in rows]
     return (anded, lines)
 
   # names: use the given inputs instead of self.inputs
   def traverseTable(self, names = None) :
     assert names is None or len(names) == len(self.inputs)
     input_names = self.inputs if names is None else names
-    for idx, tt_val in enumerate(self.table) : 
-      inputs = [input_names[i] if v == 1 else -input_names[i] for i,v in enumerate(getBitSeq(idx, len(self.inputs)))]
+    for row, tt_val in self.function.getRows() :
+      inputs = [x if positive else -x for x, positive in zip(input_names, row)]
       yield (inputs, tt_val)
 
 class Specification :
@@ -94,13 +95,17 @@ class Specification :
     self.alias2level = {x : 0 for x in self.pis}
 
     self.topological_order = None
+    # Map the gates to their index in topological_order. Removed gates leave empty slots (None) in the order.
+    self.alias2order = {}
+    self.nof_order_holes = 0
 
   def orderedGateTraversal(self) :
     # The constant gate is in alias2gate
     # if not self.constant_gate_alias is None :
     #   yield self.alias2gate[self.constant_gate_alias]
     for x in self.topological_order :
-      yield self.alias2gate[x]
+      if x is not None :
+        yield self.getGate(x)
 
   def gateTraversal(self) :
     # The constant gate is in alias2gate
@@ -145,8 +150,55 @@ class Specification :
   def isPO(self, alias) :
     return alias in self.pos_set
 
+  def isGate(self, alias) :
+    return alias in self.alias2gate
+
+  # The gates, their outputs and levels are only changed by the following methods.
+  # An alternative storage (see CompactSpecification) only needs to override them and the queries above.
+  def _isNode(self, alias) :
+    return alias in self.alias2outputs
+
+  def _reserveNodes(self, aliases) :
+    self.alias2outputs.update({x : set() for x in aliases})
+
+  def _storeGate(self, alias, inputs, table) :
+    self.alias2gate[alias] = Gate(alias, inputs, table)
+    self.alias2outputs[alias] = set()
+    self.alias2level[alias] = None
+
+  def _deleteNode(self, alias) :
+    del self.alias2gate[alias]
+    del self.alias2level[alias]
+    del self.alias2outputs[alias]
+
+  def _addGateOutput(self, alias, output) :
+    self.alias2outputs[alias].add(output)
+
+  def _removeGateOutput(self, alias, output) :
+    if alias in self.alias2outputs : # if the input was already removed, it is not part of the dict
+      self.alias2outputs[alias].discard(output)
+
+  def _setGateLevel(self, alias, level) :
+    self.alias2level[alias] = level
+
+  # Returns the renamed inputs (see Gate.substitute) and whether the gate became constant
+  def _substituteGateInputs(self, alias, renaming) :
+    gate = self.alias2gate[alias]
+    renamed_inputs = gate.substitute(renaming)
+    return renamed_inputs, gate.isConstant()
+
+  def _indexTopologicalOrder(self) :
+    self.alias2order = {x : i for i, x in enumerate(self.topological_order)}
+    self.nof_order_holes = 0
+
+  def _releaseOrderSlot(self, alias) :
+    slot = self.alias2order.pop(alias, None)
+    if slot is not None :
+      self.topological_order[slot] = None
+      self.nof_order_holes += 1
+
   def getDepth(self) :
-    return max(self.alias2level[x] for x in self.pos)
+    return max(self.getGateLevel(x) for x in self.pos)
 
   def getSubcircuitInputs(self, aliases) :
     input_set = set(x for y in aliases for x in self.getGateInputs(y))
@@ -164,10 +216,10 @@ class Specification :
     return output_set
 
   def _getConnected(self, alias, gates, internal_gates) :
-    level = min(self.alias2level[x] for x in gates)
+    level = min(self.getGateLevel(x) for x in gates)
     connected_pairs = []
     # The level of each element of gates is larger then the level of gates_var, thus there cannot be a connected pair
-    if level >= self.alias2level[alias] :
+    if level >= self.getGateLevel(alias) :
       return connected_pairs
     to_check = [alias]
     seen = set(internal_gates) # internal gates shall be ignored. We are only interested in paths outside of the subcircuit.
@@ -179,7 +231,7 @@ class Specification :
           connected_pairs.append((inp, alias))
         elif not inp in seen :
           seen.add(inp)
-          inp_level = self.alias2level[inp]
+          inp_level = self.getGateLevel(inp)
           if inp_level > level :
             to_check.append(inp)
     return connected_pairs
@@ -197,23 +249,63 @@ class Specification :
       cycle_candidates += self._getConnected(inp, outputs, internal_gates)
     return cycle_candidates
 
+  # Returns the PIs on which the given aliases depend.
+  # If there are more than max_size such PIs None is returned.
+  def getSupport(self, aliases, max_size = None) :
+    support = set()
+    seen = set(aliases)
+    to_process = list(seen)
+    while len(to_process) > 0 :
+      alias = to_process.pop()
+      if self.isGate(alias) :
+        for x in self.getGateInputs(alias) :
+          if not x in seen :
+            seen.add(x)
+            to_process.append(x)
+      else :
+        support.add(alias)
+        if max_size is not None and len(support) > max_size :
+          return None
+    return support
+
+  # Computes the truth tables (see truthTables.py) of the given aliases in terms of the given leaves.
+  # The leaves need to separate the aliases from the PIs that are not leaves.
+  def getConeFunctions(self, aliases, leaves) :
+    nof_vars = len(leaves)
+    mask = truthTables.getMask(nof_vars)
+    functions = {x : truthTables.getVariableTable(i, nof_vars) for i, x in enumerate(leaves)}
+    cone = []
+    seen = set(functions)
+    to_process = [x for x in aliases if not x in seen]
+    seen.update(to_process)
+    while len(to_process) > 0 :
+      alias = to_process.pop()
+      assert self.isGate(alias), "The leaves do not form a cut"
+      cone.append(alias)
+      for x in self.getGateInputs(alias) :
+        if not x in seen :
+          seen.add(x)
+          to_process.append(x)
+    for alias in sorted(cone, key = lambda x : self.getGateLevel(x)) :
+      gate = self.getGate(alias)
+      functions[alias] = truthTables.evaluateGateTable(gate.table, [functions[x] for x in gate.inputs], mask)
+    return functions
+
   def removeGate(self, alias) :
     self.removeGateAux(alias, self.getGateInputs(alias))
 
   # If we rename inputs, it is possible that inputs are removed.
   # But we want to process all old inputs
   def removeGateAux(self, alias, inputs) :
-    assert alias in self.alias2gate
+    assert self.isGate(alias)
     for x in inputs :
-      if x in self.alias2outputs : # if the input was already removed, it is not part of the dict
-        self.alias2outputs[x].discard(alias)
-    del self.alias2gate[alias]
-    del self.alias2level[alias]
-    del self.alias2outputs[alias]
+      self._removeGateOutput(x, alias)
+    self._deleteNode(alias)
+    self._releaseOrderSlot(alias)
 
   def insertGates(self, new_gates) :
     # To avoid errors if new_gates are not topologically ordered
-    self.alias2outputs.update({x[0] : set() for x in new_gates})
+    self._reserveNodes([x[0] for x in new_gates])
     for g in new_gates :
       alias, inputs, table = g
       self.addGate(alias, inputs, table)
@@ -228,11 +320,15 @@ class Specification :
   # We only use a single representation
   def getConstantAlias(self, candidate) :
     if self.constant_gate_alias is None :
+      # The alias of a replaced output may already be used by one of the new gates
+      if self._isNode(candidate) :
+        self.max_var += 1
+        candidate = self.max_var
       self.constant_gate_alias = candidate
-      self.alias2level[candidate] = 0
-      self.alias2outputs[candidate] = set()
-      gate = Gate(candidate, [], bitarray.util.zeros(1))
-      self.alias2gate[candidate] = gate
+      self._storeGate(candidate, [], bitarray.util.zeros(1))
+      self._setGateLevel(candidate, 0)
+      if self.topological_order is not None :
+        self._insertIntoOrder([candidate], [])
     return self.constant_gate_alias
 
   def removeUnusedGates(self, aliases_to_check) :
@@ -264,36 +360,121 @@ class Specification :
 
   def incorportateOutputs(self, output_log) :
     for alias, outputs in output_log.items() :
-      self.alias2outputs[alias].update(outputs)
+      for x in outputs :
+        self._addGateOutput(alias, x)
 
   def replaceSubcircuit(self, to_remove, new_gates, output_assoc) :
     old_gate_aliases = set(x for x in to_remove)
     successors_to_update = self.getDirectSuccessors(old_gate_aliases)
     unused_gate_candidates = self.getSubcircuitInputs(old_gate_aliases)
     subcircuit_output_dict = self.getOutputsDict(to_remove, output_assoc)
+    free_slots = sorted(self.alias2order[x] for x in to_remove)
     redundant = set()
     for x in to_remove :
       self.removeGate(x)
     self.insertGates(new_gates)
+    self._insertIntoOrder([x[0] for x in new_gates], free_slots)
     self.incorportateOutputs(subcircuit_output_dict)
+    # The gates whose inputs are changed
+    changed_successors = set()
     while len(successors_to_update) > 0 :
       alias_to_process = successors_to_update.pop()
-      gate = self.getGate(alias_to_process)
-      old_inputs = gate.substitute(output_assoc)
-      if gate.isConstant() :
+      changed_successors.add(alias_to_process)
+      old_inputs, is_constant = self._substituteGateInputs(alias_to_process, output_assoc)
+      if is_constant :
         output_assoc[alias_to_process] = None
         successors_to_update.update(self.getGateOutputs(alias_to_process))
         redundant.add(alias_to_process)
         self.removeGateAux(alias_to_process, old_inputs)
         unused_gate_candidates.update(old_inputs)
 
+    # The POs need to be updated first, otherwise inputs of the subcircuit that become POs would be considered as unused
+    self.updatePos(output_assoc)
     unused_gate_candidates.difference_update(self.pis)
+    # The constant successors are already removed
+    unused_gate_candidates.difference_update(redundant)
     unused = self.removeUnusedGates(unused_gate_candidates)
     unused.update(redundant)
-    self.updatePos(output_assoc)
-    self.setGateLevels()
+    changed = [x[0] for x in new_gates if self.isGate(x[0])] + [x for x in changed_successors if self.isGate(x)]
+    for x in changed :
+      for y in self.getGateInputs(x) :
+        if self.isGate(y) and self.alias2order[y] > self.alias2order[x] :
+          self._repairOrder(y, x)
+    self._propagateLevels(changed)
+    self._compactOrder()
     return unused
 
+  # The topological order and the levels are maintained incrementally by replaceSubcircuit.
+  # The new gates take the slots of the removed gates (in the given order, additional gates are appended).
+  # An edge that violates the order is repaired as in the dynamic topological sort by Pearce and Kelly:
+  # Only the gates whose slots are between the slots of the edge's endpoints are reordered.
+  def _insertIntoOrder(self, aliases, slots) :
+    for i, alias in enumerate(aliases) :
+      if i < len(slots) :
+        self.topological_order[slots[i]] = alias
+        self.alias2order[alias] = slots[i]
+        self.nof_order_holes -= 1
+      else :
+        self.alias2order[alias] = len(self.topological_order)
+        self.topological_order.append(alias)
+
+  # The edge source -> target violates the order
+  def _repairOrder(self, source, target) :
+    lower = self.alias2order[target]
+    upper = self.alias2order[source]
+    # The gates reachable from target that precede source
+    forward = []
+    seen = {target}
+    to_process = [target]
+    while len(to_process) > 0 :
+      alias = to_process.pop()
+      forward.append(alias)
+      for x in self.getGateOutputs(alias) :
+        assert x != source, "Cycle detected"
+        if not x in seen and self.alias2order[x] < upper :
+          seen.add(x)
+          to_process.append(x)
+    # The gates source depends on that succeed target
+    backward = []
+    seen = {source}
+    to_process = [source]
+    while len(to_process) > 0 :
+      alias = to_process.pop()
+      backward.append(alias)
+      for x in self.getGateInputs(alias) :
+        if self.isGate(x) and not x in seen and self.alias2order[x] > lower :
+          seen.add(x)
+          to_process.append(x)
+    backward.sort(key = lambda x : self.alias2order[x])
+    forward.sort(key = lambda x : self.alias2order[x])
+    affected = backward + forward
+    slots = sorted(self.alias2order[x] for x in affected)
+    for alias, slot in zip(affected, slots) :
+      self.topological_order[slot] = alias
+      self.alias2order[alias] = slot
+
+  # Recomputes the levels of the given gates and propagates changes through their transitive fan-out in topological order
+  def _propagateLevels(self, aliases) :
+    queue = [(self.alias2order[x], x) for x in set(aliases)]
+    heapq.heapify(queue)
+    queued = set(x for _, x in queue)
+    while len(queue) > 0 :
+      _, alias = heapq.heappop(queue)
+      inputs = self.getGateInputs(alias)
+      level = 1 + max(self.getGateLevel(x) for x in inputs) if len(inputs) > 0 else 0
+      if level == self.getGateLevel(alias) :
+        continue
+      self._setGateLevel(alias, level)
+      for x in self.getGateOutputs(alias) :
+        if not x in queued :
+          queued.add(x)
+          heapq.heappush(queue, (self.alias2order[x], x))
+
+  def _compactOrder(self) :
+    if self.nof_order_holes > len(self.topological_order) // 2 :
+      self.topological_order = [x for x in self.topological_order if x is not None]
+      self._indexTopologicalOrder()
+
 
   def init(self, ordered_gate = True) :
     if not ordered_gate :
@@ -302,13 +483,16 @@ class Specification :
     self.setGateLevels()
 
   def setGateLevels(self) :
-    self.alias2level = {x : 0 for x in self.pis}
+    for x in self.pis :
+      self._setGateLevel(x, 0)
     if self.constant_gate_alias is not None :
-      self.alias2level[self.constant_gate_alias] = 0
+      self._setGateLevel(self.constant_gate_alias, 0)
     self.getTopologicalOrder()
+    self._indexTopologicalOrder()
     for x in self.topological_order :
-      if len(self.getGateInputs(x)) > 0 :
-        self.alias2level[x] = 1 + max(self.alias2level[y] for y in self.getGateInputs(x))
+      inputs = self.getGateInputs(x)
+      if len(inputs) > 0 :
+        self._setGateLevel(x, 1 + max(self.getGateLevel(y) for y in inputs))
       # else the gate is a constant gate which has level 0
 
   def removeConstantGates(self) :
@@ -317,9 +501,8 @@ class Specification :
     while constant_gates :
       alias = constant_gates.pop()
       for x in self.getGateOutputs(alias) :
-        gate = self.getGate(x)
-        gate.substitute(substitution)
-        if gate.isConstant() :
+        _, is_constant = self._substituteGateInputs(x, substitution)
+        if is_constant :
           constant_gates.add(x)
           substitution[x] = None
       self.removeGate(alias)
@@ -339,21 +522,21 @@ class Specification :
   # sys.setrecursionlimit(x)
   def getTopologicalOrderRecursive(self) :
     seen = set()
-    self.topological_order = [None] * len(self.alias2gate)
+    self.topological_order = [None] * self.getNofGates()
     order = [len(self.topological_order), self.topological_order]
     for x in self.pis :
-      for y in self.alias2outputs[x] :
+      for y in self.getGateOutputs(x) :
         if y not in seen :
           self.dfsVisit(y, seen, order)
     
-    if len(seen) != len(self.alias2gate) :
-      assert len(seen) == len(self.alias2gate) - 1
+    if len(seen) != self.getNofGates() :
+      assert len(seen) == self.getNofGates() - 1
       assert self.constant_gate_alias is not None
       self.topological_order[0] = self.constant_gate_alias
     
 
   def dfsVisit(self, gate_alias, seen, order) :
-    successors = self.alias2outputs[gate_alias]
+    successors = self.getGateOutputs(gate_alias)
     for x in successors :
       if not x in seen :
         self.dfsVisit(x, seen, order)
@@ -366,7 +549,7 @@ class Specification :
   def getTopologicalOrder(self) :
     expanded = set()
     visited = set() # Only used for a debug check
-    self.topological_order = [None] * len(self.alias2gate)
+    self.topological_order = [None] * self.getNofGates()
     order_index = len(self.topological_order) - 1
     # The pis shall be treated differently as the gates
     # Thus, we do not put them into the stack and handle them all at once
@@ -375,7 +558,7 @@ class Specification :
       # alias, False -> add the children to the stack
       # alias, True  -> all children processed -> insert into ordering
       to_process_stack = []
-      for x in self.alias2outputs[pi] :
+      for x in self.getGateOutputs(pi) :
         if x not in expanded :
           to_process_stack.append((x, False))
       while len(to_process_stack) > 0 :
@@ -394,12 +577,12 @@ class Specification :
           # Will get processed as soon as all outputs are processed
           to_process_stack.append((alias, True))
           visited.add(alias)
-          for x in self.alias2outputs[alias] :
+          for x in self.getGateOutputs(alias) :
             if x not in expanded :
               to_process_stack.append((x, False))
     # The constant gate is not connected to the pis. Thus it needs to be handled separately.
-    if len(expanded) != len(self.alias2gate) :
-      assert len(expanded) == len(self.alias2gate) - 1
+    if len(expanded) != self.getNofGates() :
+      assert len(expanded) == self.getNofGates() - 1
       assert self.constant_gate_alias is not None
       self.topological_order[0] = self.constant_gate_alias
 
@@ -411,19 +594,15 @@ class Specification :
     assert len(table) == 2 ** len(inputs)
     assert isNormalised(table)
     for x in inputs :
-      self.alias2outputs[x].add(gate_alias)
-    self.alias2gate[gate_alias] = Gate(gate_alias, inputs, table)
-    self.alias2outputs[gate_alias] = set()
-    self.alias2level[gate_alias] = None
+      self._addGateOutput(x, gate_alias)
+    self._storeGate(gate_alias, inputs, table)
 
   def addGateUnsorted(self, gate_alias, inputs, table) :
     assert isinstance(table, bitarray.bitarray)
     self.max_var = max(self.max_var, gate_alias)
     assert len(table) == 2 ** len(inputs)
     assert isNormalised(table)
-    self.alias2gate[gate_alias] = Gate(gate_alias, inputs, table)
-    self.alias2outputs[gate_alias] = set()
-    self.alias2level[gate_alias] = None
+    self._storeGate(gate_alias, inputs, table)
 
   def setGateOutputs(self) :
     pis_set = set(self.pis)
@@ -432,8 +611,8 @@ class Specification :
     seen = set(to_process)
     while len(to_process) > 0 :
       alias = to_process.pop()
-      for x in self.getGate(alias).inputs :
-        self.alias2outputs[x].add(alias)
+      for x in self.getGateInputs(alias) :
+        self._addGateOutput(x, alias)
         if not x in seen and not x in pis_set:
           seen.add(x)
           to_process.append(x)
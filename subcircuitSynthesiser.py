@@ -3,19 +3,33 @@ import sys
 import re
 import subprocess
 import time
-import tempfile
 import logging
+import threading
+import copy
+import concurrent.futures
+import bitarray
 import bitarray.util
 
 from encoderCircuits import EncoderCircuits
+from encoderCircuitsClausal import EncoderCircuitsClausal
 from encoderCircuitsExact import EncoderExactSynthesis
+from cegisSynthesiser import CegisSynthesiser
+from solverPortfolio import SolverPortfolio
+from sizeSearch import SizeSearch
+from certificateParser import CertificateParser
+from timeoutModel import TimeoutModel
+import solverPortfolio
+import lowerBounds
 
 import blifIO
+import npnCache
 import utils
 
 from utils import miniQU_path
 from utils import quabs_path
 from utils import qfun_path
+from utils import caqe_path
+from utils import qute_path
 
 
 class TimeManager :
@@ -32,6 +46,8 @@ class TimeManager :
     self.recorded_timings_sat = {}
     self.recorded_timings_unsat = {}
     self.recorded_timeouts = {}
+    # Map the size of a subcircuit to the times of the solver calls made for subcircuits of this size
+    self.recorded_timings_per_subcircuit_size = {}
 
     # Timeout computation
     self.use_timeout = config.use_timeouts
@@ -42,52 +58,88 @@ class TimeManager :
     self.factor = config.factor
     # Adjust the mean until we recorded self.adjust_until timing 
     self.adjust_until = config.adjust_until
+    # Predicts the timeouts from features of the encodings, it is used once self.required_timings checks were recorded
+    self.timeout_model = None
+    self.timeout_model_deviations = config.timeout_model_deviations
+    if config.use_timeout_model :
+      self.timeout_model = TimeoutModel(EncoderCircuits.nof_encoding_features, config.timeout_model_forgetting_factor)
+    # The timings may be logged by several threads (parallel traversal)
+    self.lock = threading.RLock()
 
 
   def logSatTiming(self, size, time) :
-    self.totalised_time += time
-    self.solving_time += time
-    if size in self.recorded_timings_sat :
-      self.recorded_timings_sat[size].append(time)
-    else :
-      self.recorded_timings_sat[size] = [time]
+    with self.lock :
+      self.totalised_time += time
+      self.solving_time += time
+      if size in self.recorded_timings_sat :
+        self.recorded_timings_sat[size].append(time)
+      else :
+        self.recorded_timings_sat[size] = [time]
 
   def logUnsatTiming(self, size, time) :
-    self.totalised_time += time
-    self.solving_time += time
-    if size in self.recorded_timings_unsat :
-      self.recorded_timings_unsat[size].append(time)
-    else :
-      self.recorded_timings_unsat[size] = [time]
+    with self.lock :
+      self.totalised_time += time
+      self.solving_time += time
+      if size in self.recorded_timings_unsat :
+        self.recorded_timings_unsat[size].append(time)
+      else :
+        self.recorded_timings_unsat[size] = [time]
     
-  def logEncodingTime(self, time) :
-    self.totalised_time += time
-    self.encoding_time += time
+  def logCheckTiming(self, subcircuit_size, time) :
+    with self.lock :
+      if subcircuit_size in self.recorded_timings_per_subcircuit_size :
+        self.recorded_timings_per_subcircuit_size[subcircuit_size].append(time)
+      else :
+        self.recorded_timings_per_subcircuit_size[subcircuit_size] = [time]
 
+  # Timeouts are not used for learning the model, as the actual time of the check is unknown
+  def logFeatureTiming(self, features, time) :
+    with self.lock :
+      self.timeout_model.update(features, time)
 
-  def logTimeout(self, size) :
-    self.totalised_time += self.timeout_per_nof_gates[size]
-    self.solving_time += self.timeout_per_nof_gates[size]
-    if size in self.recorded_timeouts :
-      self.recorded_timeouts[size] += 1
-    else :
-      self.recorded_timeouts[size] = 1
+  def logEncodingTime(self, time) :
+    with self.lock :
+      self.totalised_time += time
+      self.encoding_time += time
+
+
+  # timeout: the timeout of the check (the timeout model may use different timeouts for checks with the same size)
+  def logTimeout(self, size, timeout = None) :
+    with self.lock :
+      if timeout is None :
+        timeout = self.getTimeout(size)
+      self.totalised_time += timeout
+      self.solving_time += timeout
+      if size in self.recorded_timeouts :
+        self.recorded_timeouts[size] += 1
+      else :
+        self.recorded_timeouts[size] = 1
 
   def logIntegrationTime(self, time) :
-    self.totalised_time += time
-    self.circuit_integration_time += time
+    with self.lock :
+      self.totalised_time += time
+      self.circuit_integration_time += time
 
 
   def isTimeoutSet(self, size) :
     return size in self.timeout_per_nof_gates
 
   def initTimeout(self, size) :
-    self.timeout_per_nof_gates[size] = self.base_timeout
+    with self.lock :
+      self.timeout_per_nof_gates[size] = self.base_timeout
 
   def useTimeout(self) :
     return self.use_timeout
 
-  def getTimeout(self, size) :
+  def useTimeoutModel(self) :
+    return self.timeout_model is not None
+
+  # features: the features of the encoding (only used if the timeout model is used)
+  def getTimeout(self, size, features = None) :
+    if features is not None and self.use_dynamic_timeouts and self.timeout_model.nof_samples >= self.required_timings :
+      with self.lock :
+        timeout = self.timeout_model.getTimeout(features, self.timeout_model_deviations)
+      return max(self.minimal_timeout, min(self.base_timeout, timeout))
     if size in self.timeout_per_nof_gates :
       return self.timeout_per_nof_gates[size]
     else :
@@ -101,30 +153,64 @@ class TimeManager :
     return (sum(val) + self.base_timeout) / (len(val) + 1)
 
   def _updateTimeouts(self, used_time, nof_gates) :
-    self.logSatTiming(nof_gates, used_time)
-    if not self.use_dynamic_timeouts :
-      for i in range(nof_gates, -1, -1) :
-        if not i in self.timeout_per_nof_gates :
-          self.timeout_per_nof_gates[i] = self.base_timeout
-      return
-    if len(self.recorded_timings_sat[nof_gates]) > self.adjust_until :
-      adjusted_mean = sum(self.recorded_timings_sat[nof_gates]) / len(self.recorded_timings_sat[nof_gates])
-    else :
-      adjusted_mean = self._getAdjustedMeanTime(self.recorded_timings_sat[nof_gates])
-    if self.factor * adjusted_mean < self.base_timeout :
-       base_time = self.factor * adjusted_mean
-    else :
-      base_time = self.base_timeout
-    base_time = max(self.minimal_timeout, base_time)
-    if nof_gates in self.timeout_per_nof_gates :
-      self.timeout_per_nof_gates[nof_gates] = min(self.timeout_per_nof_gates[nof_gates], base_time)
-    else :
-      self.timeout_per_nof_gates[nof_gates] = base_time
-    for i in range(nof_gates - 1, -1, -1) :
-      if i in self.timeout_per_nof_gates :
-        self.timeout_per_nof_gates[i] = min(self.timeout_per_nof_gates[i], base_time)
+    with self.lock :
+      self.logSatTiming(nof_gates, used_time)
+      if not self.use_dynamic_timeouts :
+        for i in range(nof_gates, -1, -1) :
+          if not i in self.timeout_per_nof_gates :
+            self.timeout_per_nof_gates[i] = self.base_timeout
+        return
+      if len(self.recorded_timings_sat[nof_gates]) > self.adjust_until :
+        adjusted_mean = sum(self.recorded_timings_sat[nof_gates]) / len(self.recorded_timings_sat[nof_gates])
+      else :
+        adjusted_mean = self._getAdjustedMeanTime(self.recorded_timings_sat[nof_gates])
+      if self.factor * adjusted_mean < self.base_timeout :
+         base_time = self.factor * adjusted_mean
+      else :
+        base_time = self.base_timeout
+      base_time = max(self.minimal_timeout, base_time)
+      if nof_gates in self.timeout_per_nof_gates :
+        self.timeout_per_nof_gates[nof_gates] = min(self.timeout_per_nof_gates[nof_gates], base_time)
       else :
-        self.timeout_per_nof_gates[i] = base_time
+        self.timeout_per_nof_gates[nof_gates] = base_time
+      for i in range(nof_gates - 1, -1, -1) :
+        if i in self.timeout_per_nof_gates :
+          self.timeout_per_nof_gates[i] = min(self.timeout_per_nof_gates[i], base_time)
+        else :
+          self.timeout_per_nof_gates[i] = base_time
+
+  # As long as no check with the given number of gates was satisfiable, the timeout is based on the unsatisfiable checks.
+  # Satisfiable checks of the original size are no longer made (see SubcircuitSynthesiser.synthesise).
+  def _updateTimeoutsUnsat(self, nof_gates) :
+    with self.lock :
+      if not self.use_dynamic_timeouts or nof_gates in self.recorded_timings_sat :
+        return
+      adjusted_mean = self._getAdjustedMeanTime(self.recorded_timings_unsat[nof_gates])
+      base_time = max(self.minimal_timeout, min(self.base_timeout, self.factor * adjusted_mean))
+      self.timeout_per_nof_gates[nof_gates] = base_time
+
+  # The state of the timeout adaptation (see CalibrationProfile). Only the last adjust_until timings per size are kept.
+  def getCalibrationData(self) :
+    with self.lock :
+      keep = lambda timings : {size : x[-self.adjust_until:] for size, x in timings.items()}
+      data = {
+        "timeouts" : dict(self.timeout_per_nof_gates),
+        "sat" : keep(self.recorded_timings_sat),
+        "unsat" : keep(self.recorded_timings_unsat),
+        "per_subcircuit_size" : keep(self.recorded_timings_per_subcircuit_size)
+      }
+      if self.timeout_model is not None :
+        data["model"] = self.timeout_model.getState()
+      return data
+
+  def setCalibrationData(self, data) :
+    with self.lock :
+      self.timeout_per_nof_gates = {size : min(x, self.base_timeout) for size, x in data["timeouts"].items()}
+      self.recorded_timings_sat = {size : list(x) for size, x in data["sat"].items()}
+      self.recorded_timings_unsat = {size : list(x) for size, x in data["unsat"].items()}
+      self.recorded_timings_per_subcircuit_size = {size : list(x) for size, x in data["per_subcircuit_size"].items()}
+      if self.timeout_model is not None and "model" in data :
+        self.timeout_model.setState(data["model"])
 
   def printLoggedTimings(self) :
     print(f"Time: {self.total_time}")
@@ -183,10 +269,17 @@ class TimeManager :
 class SubcircuitSynthesiser :
 
 
-  def __init__(self, spec, config : utils.Configuration) :
+  def __init__(self, spec, config : utils.Configuration, npn_cache = None, portfolio = None) :
     self.specification = spec
     self.config = config
     self.timer = TimeManager(config)
+    self.npn_cache = npn_cache
+    self.portfolio = portfolio
+    if self.portfolio is None and len(config.qbf_portfolio) > 1 :
+      self.portfolio = SolverPortfolio(config.qbf_portfolio, config.portfolio_prune_after, config.portfolio_min_win_ratio)
+    self.thread_state = threading.local()
+    self.last_synthesis_minimal = False
+    self.lock = threading.Lock()
 
     self.nof_replacements_per_size = {}
     self.total_nof_checks_per_size = {}
@@ -196,8 +289,22 @@ class SubcircuitSynthesiser :
 
     # Log the number of of checked subcircuits
     self.subcircuit_counter = 0
+    # Lower bounds (see lowerBounds): nof subcircuits with a non-trivial bound, nof sizes excluded by the bounds
+    # and nof realisations whose minimality was proven by the bound
+    self.nof_lower_bounds = 0
+    self.nof_sizes_excluded_by_bounds = 0
+    self.nof_tight_lower_bounds = 0
+
+
 
+  # True if the last synthesis (of the calling thread) proved that the returned circuit is minimal
+  @property
+  def last_synthesis_minimal(self) :
+    return getattr(self.thread_state, "last_synthesis_minimal", False)
 
+  @last_synthesis_minimal.setter
+  def last_synthesis_minimal(self, value) :
+    self.thread_state.last_synthesis_minimal = value
 
   def _logNofReplacements(self, to_replace, circuit, size) :
     if size in self.nof_replacements_per_size :
@@ -209,9 +316,27 @@ class SubcircuitSynthesiser :
 
   def reduce(self, to_replace, nof_gate_inputs, require_reduction) :
     start = time.time()
-    if self.config.synthesis_approach == utils.Configuration.SynthesisationMode.qbf :
+    self.last_synthesis_minimal = False
+    npn_query = self._getNPNCacheQuery(to_replace, nof_gate_inputs)
+    cached_circuit = None if npn_query is None else self._lookupNPNCache(npn_query, to_replace)
+    if cached_circuit is not None :
+      size = len(cached_circuit[0])
+      realisable = size < len(to_replace) or not require_reduction
+      circuit = cached_circuit if realisable else None
+      timeout = False
+      # The cache only contains minimal circuits
+      self.last_synthesis_minimal = True
+    elif self.config.synthesis_approach == utils.Configuration.SynthesisationMode.qbf :
       assert self.config.qbf_solver in {utils.Configuration.QBFSolver.QFun, utils.Configuration.QBFSolver.quabs, utils.Configuration.QBFSolver.miniQU}, "Invalid qbf solver selected."
       realisable, size, circuit, timeout = self.synthesiseQBF(to_replace, nof_gate_inputs, require_reduction, self.timer)
+    elif self.config.synthesis_approach == utils.Configuration.SynthesisationMode.qbf_clausal :
+      assert self.config.qbf_solver in {utils.Configuration.QBFSolver.caqe, utils.Configuration.QBFSolver.qute}, "Invalid qbf solver selected."
+      realisable, size, circuit, timeout = self.synthesiseQBF(to_replace, nof_gate_inputs, require_reduction, self.timer, True)
+    elif self.config.synthesis_approach == utils.Configuration.SynthesisationMode.cegis :
+      if CegisSynthesiser.isApplicable(self.specification, to_replace, self.config) :
+        realisable, size, circuit, timeout = self.synthesiseCegis(to_replace, nof_gate_inputs, require_reduction, self.timer)
+      else :
+        realisable, size, circuit, timeout = self.synthesiseQBF(to_replace, nof_gate_inputs, require_reduction, self.timer)
     elif self.config.synthesis_approach == utils.Configuration.SynthesisationMode.exact :
       assert self.config.qbf_solver in {utils.Configuration.QBFSolver.QFun, utils.Configuration.QBFSolver.quabs, utils.Configuration.QBFSolver.miniQU}, "Invalid qbf solver selected."
       realisable, size, circuit, timeout = self.synthesiseExact(to_replace, nof_gate_inputs, require_reduction, self.timer)
@@ -219,13 +344,91 @@ class SubcircuitSynthesiser :
       assert False
     self.timer.total_time += time.time() - start
     if realisable :
-      self._logNofReplacements(to_replace, circuit, size)
-      gates, output_association, subcircuit_inputs, gate_names = circuit
-      unused = self.specification.replaceSubcircuit(to_replace, gates, output_association)
-      return realisable, (gate_names, output_association, unused), False
+      if npn_query is not None and cached_circuit is None and self.last_synthesis_minimal :
+        self._storeInNPNCache(npn_query, circuit)
+      return self.integrateSubcircuit(to_replace, size, circuit)
     else :
       return realisable, None, timeout
 
+  def integrateSubcircuit(self, to_replace, size, circuit) :
+    self._logNofReplacements(to_replace, circuit, size)
+    gates, output_association, subcircuit_inputs, gate_names = circuit
+    unused = self.specification.replaceSubcircuit(to_replace, gates, output_association)
+    return True, (gate_names, output_association, unused), False
+
+  # Parallel traversal (see Synthesiser._parallelTraversal):
+  # The encoder is set up on the main thread, the solver calls are made by a worker thread (synthesisePrepared)
+  # and the obtained circuit is integrated on the main thread (integrateSubcircuit).
+  # Returns None if the subcircuit cannot be synthesised.
+  def prepareSynthesis(self, to_replace, nof_gate_inputs) :
+    clausal_encoding = self.config.synthesis_approach == utils.Configuration.SynthesisationMode.qbf_clausal
+    try :
+      if clausal_encoding :
+        encoder = EncoderCircuitsClausal(self.specification, to_replace, self.config)
+      else :
+        encoder = EncoderCircuits(self.specification, to_replace, self.config)
+    except utils.NoOutputException :
+      logging.warning("Subcrcuit with no outputs detected")
+      return None
+    encoder.useGateInputVariables(self.config.useGateInputVariables)
+    if len(encoder.subcircuit_inputs) < nof_gate_inputs :
+      return None
+    self._prepareOriginalWitness(encoder, to_replace, nof_gate_inputs)
+    encoder.prepareFixedEncoding()
+    return encoder
+
+  # Does not access the specification if the encoder uses a window.
+  # Returns the result of synthesise and whether the obtained circuit was proven to be minimal.
+  def synthesisePrepared(self, encoder, to_replace, nof_gate_inputs, require_reduction) :
+    start = time.time()
+    clausal_encoding = isinstance(encoder, EncoderCircuitsClausal)
+    result = self.synthesise(encoder, to_replace, nof_gate_inputs, require_reduction, self.timer, clausal_encoding)
+    with self.timer.lock :
+      self.timer.total_time += time.time() - start
+    return result, self.last_synthesis_minimal
+
+
+  # Subcircuits with few inputs and without potential cycles can be looked up in the NPN cache.
+  # Returns the inputs, the outputs and the functions of the outputs in terms of the inputs (or None if the cache is not used).
+  def _getNPNCacheQuery(self, to_replace, nof_gate_inputs) :
+    if self.npn_cache is None :
+      return None
+    inputs = list(self.specification.getSubcircuitInputs(to_replace))
+    outputs = list(self.specification.getSubcircuitOutputs(to_replace))
+    if len(inputs) > self.config.npn_cache_max_inputs or len(inputs) < nof_gate_inputs or len(outputs) == 0 :
+      return None
+    if len(self.specification.getPotentialCycles(inputs, outputs, to_replace)) > 0 :
+      return None
+    functions = self.specification.getConeFunctions(outputs, inputs)
+    return inputs, outputs, [functions[x] for x in outputs]
+
+  def _lookupNPNCache(self, npn_query, to_replace) :
+    inputs, outputs, tables = npn_query
+    circuit = self.npn_cache.lookup(tables, len(inputs), self.config)
+    if circuit is None :
+      return None
+    node_gates, node_outputs = circuit
+    gate_names = self._getGateNames(to_replace, len(node_gates))
+    def getAlias(node) :
+      return inputs[node] if node < len(inputs) else gate_names[node - len(inputs)]
+    gates = []
+    for i, (gate_inputs, table) in enumerate(node_gates) :
+      gate_table = bitarray.bitarray([table >> row & 1 for row in range(2 ** len(gate_inputs))])
+      gates.append((gate_names[i], [getAlias(x) for x in gate_inputs], gate_table))
+    output_association = {x : None if node is None else getAlias(node) for x, node in zip(outputs, node_outputs)}
+    return (gates, output_association, inputs, gate_names)
+
+  # Only circuits that realise exactly the functions of the replaced subcircuit are stored
+  def _storeInNPNCache(self, npn_query, circuit) :
+    inputs, outputs, tables = npn_query
+    gates, output_association, _, _ = circuit
+    nodes = {x : i for i, x in enumerate(inputs)}
+    nodes.update((gate[0], len(inputs) + i) for i, gate in enumerate(gates))
+    node_gates = [([nodes[x] for x in gate_inputs], sum(b << row for row, b in enumerate(table))) for _, gate_inputs, table in gates]
+    node_outputs = [None if output_association[x] is None else nodes[output_association[x]] for x in outputs]
+    if npnCache.simulateCircuit((node_gates, node_outputs), len(inputs)) == tables :
+      self.npn_cache.store((node_gates, node_outputs), len(inputs))
+
 
   # supports only the QBF encoding
   def bottomUpReduction(self, to_replace, config) :
@@ -251,13 +454,17 @@ class SubcircuitSynthesiser :
     return circuit_size
 
 
-  def synthesiseQBF(self, to_replace, nof_gate_inputs, require_reduction, timer) :
+  def synthesiseQBF(self, to_replace, nof_gate_inputs, require_reduction, timer, clausal_encoding = False) :
     try :
-      encoder = EncoderCircuits(self.specification, to_replace, self.config)
+      if clausal_encoding :
+        encoder = EncoderCircuitsClausal(self.specification, to_replace, self.config)
+      else :
+        encoder = EncoderCircuits(self.specification, to_replace, self.config)
       encoder.useGateInputVariables(self.config.useGateInputVariables)
       if len(encoder.subcircuit_inputs) < nof_gate_inputs : # TODO: Find a cleaner solution
         return False, None, None, False
-      return self.synthesise(encoder, to_replace, nof_gate_inputs, require_reduction, timer)
+      self._prepareOriginalWitness(encoder, to_replace, nof_gate_inputs)
+      return self.synthesise(encoder, to_replace, nof_gate_inputs, require_reduction, timer, clausal_encoding)
     except utils.NoOutputException :
       logging.warning("Subcrcuit with no outputs detected")
       print(f"To replace: {to_replace}")
@@ -265,6 +472,18 @@ class SubcircuitSynthesiser :
 
 
 
+  def synthesiseCegis(self, to_replace, nof_gate_inputs, require_reduction, timer) :
+    try :
+      synthesiser = CegisSynthesiser(self.specification, to_replace, self.config)
+      if len(synthesiser.subcircuit_inputs) < nof_gate_inputs :
+        return False, None, None, False
+      return self.synthesise(synthesiser, to_replace, nof_gate_inputs, require_reduction, timer)
+    except utils.NoOutputException :
+      logging.warning("Subcrcuit with no outputs detected")
+      print(f"To replace: {to_replace}")
+      return True, ([], {}, []), False
+
+
   def synthesiseExact(self, to_replace, nof_gate_inputs, require_reduction, timer) :
     try :
       encoder = self._setupEquivEncoder(to_replace)
@@ -279,10 +498,11 @@ class SubcircuitSynthesiser :
 
 
   def _incrementCheckCounter(self, nof_gates) :
-    if nof_gates in self.total_nof_checks_per_size :
-      self.total_nof_checks_per_size[nof_gates] += 1
-    else :
-      self.total_nof_checks_per_size[nof_gates] = 1
+    with self.lock :
+      if nof_gates in self.total_nof_checks_per_size :
+        self.total_nof_checks_per_size[nof_gates] += 1
+      else :
+        self.total_nof_checks_per_size[nof_gates] = 1
 
   def logEquivalentReplacement(self, to_replace, new_subcircuit, size) :
     start = time.time()
@@ -302,7 +522,7 @@ class SubcircuitSynthesiser :
     gates, output_association, _, _ = new_subcircuit
     new_outputs = [output_association[x] for x in subcircuit_outputs]
     new_subcir = (subcircuit_inputs, new_outputs, gates)
-    return utils.checkSubcircuitsForEquivalence(old_subcir, new_subcir)
+    return utils.checkSubcircuitsForEquivalence(old_subcir, new_subcir, self.config.encoding_transport)
 
   def analyseOriginalSize(self, encoder, to_replace, nof_gate_inputs, timer, clausal_encoding = False) :
     nof_gates = len(to_replace)
@@ -319,40 +539,59 @@ class SubcircuitSynthesiser :
         else :
           logging.info("Information: Symmetry breaking constraints prevented realisation")
     except subprocess.TimeoutExpired as e :
-      timer.logTimeout(nof_gates)
+      timer.logTimeout(nof_gates, e.timeout)
       return False, None
     return realisable, subcir_candidate
 
   def synthesise(self, encoder, to_replace, nof_gate_inputs, require_reduction, timer, clausal_encoding = False) :
-    self.subcircuit_counter += 1
+    with self.lock :
+      self.subcircuit_counter += 1
     realisable = False
     max_size = len(to_replace) - 1 if require_reduction else len(to_replace)
+    minimal = True
     if not timer.isTimeoutSet(max_size) :
       timer.initTimeout(max_size)
-    if not require_reduction :
+    # The subcircuit itself realises the subcircuit with len(to_replace) gates.
+    # A solver call is only needed if the symmetry breaking constraints may exclude the subcircuit.
+    original_witness = not require_reduction and isinstance(encoder, EncoderCircuits) and encoder.admits_original_subcircuit
+    if original_witness :
+      realisable = True
+      subcir_candidate = None
+      smallest_representation = len(to_replace)
+    elif not require_reduction :
       realisable, subcir_candidate = self.analyseOriginalSize(encoder, to_replace, nof_gate_inputs, timer, clausal_encoding)
       if not realisable :
         return realisable, None, None, False
       smallest_representation = len(to_replace)
-    bound = len(to_replace) - 1
-    for nof_gates in range(bound, 0, -1) :
-      try :
-        self._incrementCheckCounter(nof_gates)
-        current_realisable, subcir = self._checkEncoding(encoder, to_replace, nof_gates, nof_gate_inputs, timer, clausal_encoding)
-        if current_realisable :
-          realisable = True
-          smallest_representation = nof_gates
-          subcir_candidate = subcir
-        else :
-          break
-      except subprocess.TimeoutExpired as e :
-        timer.logTimeout(nof_gates)
-        if not realisable : # used if require_reduction is True
-          return False, None, None, True
-        else :
-          break
-    
-    if self.config.allowInputsAsOutputs or self.config.allowConstantsAsOutputs :
+    # Sizes below the lower bound are not realisable (in particular, there is no realisation without gates)
+    lower_bound = self._getLowerBound(encoder, to_replace, nof_gate_inputs)
+    search = SizeSearch(self.config.size_search_strategy, max(0, lower_bound - 1), len(to_replace))
+    if self.config.size_search_probes > 1 and isinstance(encoder, EncoderCircuits) :
+      self._searchSizeConcurrently(search, encoder, to_replace, nof_gate_inputs, timer, clausal_encoding)
+    else :
+      self._searchSize(search, encoder, to_replace, nof_gate_inputs, timer, clausal_encoding)
+    if search.smallest is not None :
+      realisable = True
+      smallest_representation = search.smallest
+      subcir_candidate = search.smallest_data
+    elif search.timeout and not realisable : # used if require_reduction is True
+      return False, None, None, True
+    minimal = search.isMinimal()
+    if search.smallest is not None and search.smallest == lower_bound :
+      minimal = True
+      with self.lock :
+        self.nof_tight_lower_bounds += 1
+
+    if lower_bound > 0 :
+      # There is no realisation without gates
+      pass
+    elif isinstance(encoder, EncoderCircuits) and encoder.zero_gate_decided :
+      if encoder.zero_gate_association is not None :
+        realisable = True
+        smallest_representation = 0
+        subcir_candidate = ([], dict(encoder.zero_gate_association), list(encoder.getSubcircuitInputs()), [])
+        minimal = True
+    elif self.config.allowInputsAsOutputs or self.config.allowConstantsAsOutputs :
       try :
         self._incrementCheckCounter(0)
         current_realisable, subcir = self._checkEncoding(encoder, to_replace, 0, nof_gate_inputs, timer, clausal_encoding)
@@ -360,11 +599,17 @@ class SubcircuitSynthesiser :
           realisable = True
           smallest_representation = 0
           subcir_candidate = subcir
+          minimal = True
       except subprocess.TimeoutExpired as e :
         logging.debug("Timeout: check for size 0")
+        minimal = False
       
+    self.last_synthesis_minimal = minimal
     if not realisable :
       return realisable, None, None, False
+    if subcir_candidate is None :
+      # No smaller realisation was found, the subcircuit is kept
+      return False, None, None, False
 
     if self.config.log_replaced_gates :
       gates, output_association, subcircuit_inputs, gate_names = subcir_candidate
@@ -375,9 +620,103 @@ class SubcircuitSynthesiser :
     return realisable, smallest_representation, subcir_candidate, False
 
 
+  # Accesses the specification, thus it is called on the main thread when the encoder is set up.
+  # synthesise only reads the result stored in the encoder.
+  def _prepareOriginalWitness(self, encoder, to_replace, nof_gate_inputs) :
+    if self.config.use_original_witness and isinstance(encoder, EncoderCircuits) :
+      encoder.admits_original_subcircuit = self._admitsOriginalSubcircuit(encoder, to_replace, nof_gate_inputs)
+
+  # True if the subcircuit satisfies the constraints of the encoding (in particular the symmetry breaking constraints).
+  # The ordered steps constraints are not checked as they cannot prevent a realisation.
+  def _admitsOriginalSubcircuit(self, encoder, to_replace, nof_gate_inputs) :
+    gates = set(to_replace)
+    outputs = set(encoder.getSubcircuitOutputs())
+    for alias in to_replace :
+      inputs = self.specification.getGateInputs(alias)
+      table = self.specification.getGate(alias).table
+      if len(inputs) != nof_gate_inputs or len(set(inputs)) != len(inputs) :
+        return False
+      if encoder.useTrivialRuleConstraint and (not table.any() or any(all(table[row] == (row >> (nof_gate_inputs - 1 - j) & 1) for row in range(len(table))) for j in range(nof_gate_inputs))) :
+        return False
+      if self.config.synthesiseAig and table[1] and table[2] and not table[3] :
+        return False
+      successors = [x for x in self.specification.getGateOutputs(alias) if x in gates]
+      if encoder.useAllStepsConstraint and len(successors) == 0 and not alias in outputs :
+        return False
+      if encoder.useNoReapplicationConstraint :
+        for x in successors :
+          if set(self.specification.getGateInputs(x)).difference([alias]).issubset(inputs) :
+            return False
+    return True
+
+  # Does not access the specification (the functions are determined when the encoder is set up)
+  def _getLowerBound(self, encoder, to_replace, nof_gate_inputs) :
+    if encoder.lower_bound_functions is None :
+      return 0
+    output_tables, care_set = encoder.lower_bound_functions
+    bound = lowerBounds.getLowerBound(output_tables, care_set, len(encoder.getSubcircuitInputs()), nof_gate_inputs, self.config.allowInputsAsOutputs, self.config.allowConstantsAsOutputs)
+    if bound > 0 :
+      with self.lock :
+        self.nof_lower_bounds += 1
+        self.nof_sizes_excluded_by_bounds += min(bound, len(to_replace))
+    return bound
+
+  def _searchSize(self, search, encoder, to_replace, nof_gate_inputs, timer, clausal_encoding) :
+    while not search.isFinished() :
+      nof_gates = search.getCandidates(1)[0]
+      try :
+        self._incrementCheckCounter(nof_gates)
+        current_realisable, subcir = self._checkEncoding(encoder, to_replace, nof_gates, nof_gate_inputs, timer, clausal_encoding)
+        if current_realisable :
+          search.logRealisable(nof_gates, subcir)
+        else :
+          search.logUnrealisable(nof_gates)
+      except subprocess.TimeoutExpired as e :
+        timer.logTimeout(nof_gates, e.timeout)
+        search.logTimeout(nof_gates)
+
+  # Checks several sizes at the same time. Each check uses its own copy of the encoder (the fixed part of the encoding is shared).
+  # Checks whose result can no longer change the result of the search are cancelled.
+  def _searchSizeConcurrently(self, search, encoder, to_replace, nof_gate_inputs, timer, clausal_encoding) :
+    encoder.prepareFixedEncoding()
+    pending = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers = self.config.size_search_probes) as executor :
+      while True :
+        pending_sizes = [x for x, _ in pending.values()]
+        for nof_gates in search.getCandidates(self.config.size_search_probes - len(pending), pending_sizes) :
+          self._incrementCheckCounter(nof_gates)
+          cancel = threading.Event()
+          future = executor.submit(self._checkEncoding, copy.copy(encoder), to_replace, nof_gates, nof_gate_inputs, timer, clausal_encoding, cancel)
+          pending[future] = (nof_gates, cancel)
+        if len(pending) == 0 :
+          return
+        done, _ = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+        for future in done :
+          nof_gates, _ = pending.pop(future)
+          try :
+            current_realisable, subcir = future.result()
+          except subprocess.TimeoutExpired as e :
+            timer.logTimeout(nof_gates, e.timeout)
+            if search.isRelevant(nof_gates) :
+              search.logTimeout(nof_gates)
+            continue
+          except utils.CancelledException :
+            continue
+          if current_realisable :
+            search.logRealisable(nof_gates, subcir)
+          else :
+            search.logUnrealisable(nof_gates)
+        for nof_gates, cancel in pending.values() :
+          if not search.isRelevant(nof_gates) :
+            cancel.set()
+
+
   def printLoggedTimings(self) :
     self.timer.printLoggedTimings()
 
+  def printLowerBoundStatistics(self) :
+    print(f"Lower bounds: bounded subcircuits: {self.nof_lower_bounds}; excluded sizes: {self.nof_sizes_excluded_by_bounds}; tight bounds: {self.nof_tight_lower_bounds}")
+
   def printReplacementCounts(self) :
     sizes = sorted(self.nof_replacements_per_size)
     for x in sizes :
@@ -415,6 +754,8 @@ class SubcircuitSynthesiser :
 
     potential_cycles = self.specification.getPotentialCycles(inputs, outputs, gate_variables)
     encoder = EncoderExactSynthesis(inputs, outputs, gates, potential_cycles, self.config)
+    if self.config.use_lower_bounds :
+      encoder.lower_bound_functions = lowerBounds.getSubcircuitFunctions(self.specification, inputs, outputs, self.config.lower_bound_support_limit)
     return encoder
 
   def _writeEncoding(self, file, encoder, nof_gates, nof_gate_inputs) :
@@ -422,22 +763,32 @@ class SubcircuitSynthesiser :
     encoder.getEncoding(nof_gates, nof_gate_inputs, file)
     return time.time() - start
 
-  def _checkEncoding(self, encoder, to_replace, nof_gates, nof_gate_inputs, timer, clausal_encoding = False) :
+  def _checkEncoding(self, encoder, to_replace, nof_gates, nof_gate_inputs, timer, clausal_encoding = False, cancel = None) :
     timeout = 0
-    if timer.useTimeout() :
-      timeout = timer.getTimeout(nof_gates)
+    features = None
     encoding_suffix = ".qdimacs" if clausal_encoding else ".qcir"
-    if self.config.encoding_log_dir is not None :
+    if isinstance(encoder, CegisSynthesiser) :
+      if timer.useTimeout() :
+        timeout = timer.getTimeout(nof_gates)
+      realisable, assignment, used_time = encoder.synthesise(nof_gates, nof_gate_inputs, timeout)
+      encoding_time, valid = 0, True
+    elif self.config.encoding_log_dir is not None :
       fname = self.config.encoding_log_dir + "/iteration_" + str(self.subcircuit_counter) + "_nofGates_" + str(nof_gates) + encoding_suffix
       with open(fname,"w") as out: 
         encoding_time = self._writeEncoding(out, encoder, nof_gates, nof_gate_inputs)
-      realisable, assignment, used_time, valid = self._runSolverAndGetAssignment(fname, timeout)
+      features, timeout = self._getCheckTimeout(encoder, nof_gates, timer)
+      realisable, assignment, used_time, valid = self._runSolverAndGetAssignment(fname, timeout, (), cancel, encoder)
     else :
-      with tempfile.NamedTemporaryFile(mode = "w", suffix = encoding_suffix, delete=True) as tmp:
-        encoding_time = self._writeEncoding(tmp, encoder, nof_gates, nof_gate_inputs)
+      with utils.EncodingFile(encoding_suffix, self.config.encoding_transport) as tmp:
+        encoding_time = self._writeEncoding(tmp.stream, encoder, nof_gates, nof_gate_inputs)
         tmp.flush()
-        realisable, assignment, used_time, valid = self._runSolverAndGetAssignment(tmp.name, timeout)
+        features, timeout = self._getCheckTimeout(encoder, nof_gates, timer)
+        realisable, assignment, used_time, valid = self._runSolverAndGetAssignment(tmp.name, timeout, tmp.pass_fds, cancel, encoder)
     timer.logEncodingTime(encoding_time)
+    if valid :
+      timer.logCheckTiming(len(to_replace), used_time)
+      if features is not None :
+        timer.logFeatureTiming(features, used_time)
     if not valid :
       logging.critical("QBF yielded invalid resuls -- error in encoding")
       self._logError(encoder, to_replace, len(to_replace), nof_gate_inputs)
@@ -447,17 +798,30 @@ class SubcircuitSynthesiser :
         timer._updateTimeouts(used_time, nof_gates)
       else :
         timer.logSatTiming(nof_gates, used_time)
+      encoder.completeAssignment(assignment)
       subcircuit_data = self._extractGatesFromAssignment(to_replace, encoder, nof_gates, nof_gate_inputs, assignment)
       return realisable, subcircuit_data
     else :
       timer.logUnsatTiming(nof_gates, used_time)
+      if timer.useTimeout() :
+        timer._updateTimeoutsUnsat(nof_gates)
       return realisable, None
 
-  def _extractGatesFromAssignment(self, to_replace, encoder, nof_gates, nof_gate_inputs, assignment) :
+  # The timeout is determined after the encoding was written, as the timeout model uses features of the encoding.
+  # Returns the features (None if no timeout model is used) and the timeout (0: no timeout).
+  def _getCheckTimeout(self, encoder, nof_gates, timer) :
+    features = encoder.getEncodingFeatures() if timer.useTimeoutModel() else None
+    timeout = timer.getTimeout(nof_gates, features) if timer.useTimeout() else 0
+    return features, timeout
+
+  def _getGateNames(self, to_replace, nof_gates) :
     if nof_gates <= len(to_replace) :
-      gate_names = to_replace[:nof_gates]
+      return to_replace[:nof_gates]
     else :
-      gate_names = to_replace + [self.specification.max_var + i + 1 for i in range(nof_gates - len(to_replace))]
+      return to_replace + [self.specification.max_var + i + 1 for i in range(nof_gates - len(to_replace))]
+
+  def _extractGatesFromAssignment(self, to_replace, encoder, nof_gates, nof_gate_inputs, assignment) :
+    gate_names = self._getGateNames(to_replace, nof_gates)
 
     gate_definition_variables = encoder.getGateDefinitionVariables()
     selection_variables = encoder.getSelectionVariables()
@@ -505,25 +869,62 @@ class SubcircuitSynthesiser :
     return (gates, output_association, subcircuit_inputs, gate_names)
 
 
-  def _runSolverAndGetAssignment(self, input, timeout=0) :
-    if self.config.qbf_solver == utils.Configuration.QBFSolver.miniQU :
+  # pass_fds: file descriptors the solver needs to inherit in order to read the input
+  def _getSolverCommand(self, solver, input) :
+    if solver == utils.Configuration.QBFSolver.miniQU :
       solver_cmd = [miniQU_path, "-cert", input]
       output_pattern = r"\nV\s*(.*)\s*\n"
-    elif self.config.qbf_solver == utils.Configuration.QBFSolver.quabs :
+    elif solver == utils.Configuration.QBFSolver.quabs :
       solver_cmd = [quabs_path, "--partial-assignment", input]
       output_pattern = r"\nV\s*(.*)\s*r"
-    elif self.config.qbf_solver == utils.Configuration.QBFSolver.QFun :
+    elif solver == utils.Configuration.QBFSolver.QFun :
       solver_cmd = [qfun_path, input]
       output_pattern = r"\nv\s*(.*)\n*"
+    elif solver == utils.Configuration.QBFSolver.caqe :
+      solver_cmd = [caqe_path, "--qdo", input]
+      output_pattern = None # QDIMACS output format
+    elif solver == utils.Configuration.QBFSolver.qute :
+      solver_cmd = [qute_path, "--partial-certificate", input]
+      output_pattern = None # QDIMACS output format
     else :
       assert False
+    return solver_cmd, output_pattern
+
+  # The certificate lines of QFun start with "v", those of the other solvers with "V"
+  def _getCertificateMarker(self, solver) :
+    return b"v" if solver == utils.Configuration.QBFSolver.QFun else b"V"
 
+  # If a portfolio is used, the active solvers of the portfolio are raced on the encoding
+  # cancel: if the event is set, the solver call is aborted by a utils.CancelledException
+  # encoder: if given, only the variables of the encoder's certificate are parsed while the solver output is read
+  def _runSolverAndGetAssignment(self, input, timeout=0, pass_fds=(), cancel=None, encoder=None) :
     start = time.time()
-    result = subprocess.run(solver_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout = timeout if timeout != 0 else None)
+    solvers = [self.config.qbf_solver] if self.portfolio is None else self.portfolio.getActiveSolvers()
+    parsers = None
+    if encoder is not None and self.config.stream_certificates :
+      parsers = {x : CertificateParser(self._getCertificateMarker(x), encoder.getCertificateVariables(), encoder.last_used_variable) for x in solvers}
+    if self.portfolio is None and cancel is None and parsers is None :
+      solver = self.config.qbf_solver
+      solver_cmd, output_pattern = self._getSolverCommand(solver, input)
+      result = subprocess.run(solver_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout = timeout if timeout != 0 else None, pass_fds = pass_fds)
+    elif self.portfolio is None :
+      solver = self.config.qbf_solver
+      solver_cmd, output_pattern = self._getSolverCommand(solver, input)
+      _, result = solverPortfolio.runSolvers({solver : solver_cmd}, timeout, pass_fds, cancel, parsers)
+    else :
+      commands = {x : self._getSolverCommand(x, input)[0] for x in solvers}
+      solver, result = self.portfolio.race(commands, timeout, pass_fds, cancel, parsers)
+      _, output_pattern = self._getSolverCommand(solver, input)
     solving_time = time.time() - start
     if result.returncode == 10:
+      if parsers is not None :
+        assert parsers[solver].found_certificate
+        return True, parsers[solver].getAssignment(), solving_time, True
       solver_output = result.stdout.decode("utf-8")
-      assignment = self._getAssignment(solver_output, output_pattern)
+      if output_pattern is None :
+        assignment = self._getQDOAssignment(solver_output)
+      else :
+        assignment = self._getAssignment(solver_output, output_pattern)
       return True, assignment, solving_time, True
     elif result.returncode == 20:
       return False, [], solving_time, True
@@ -547,6 +948,20 @@ class SubcircuitSynthesiser :
     return assignment
 
 
+  # In the QDIMACS output format the assignment is given by lines "V <literal> 0"
+  def _getQDOAssignment(self, output) :
+    assignment = {}
+    for line in output.splitlines() :
+      if not line.startswith("V") :
+        continue
+      for l in line[1:].split() :
+        lit = int(l)
+        if lit == 0 :
+          continue
+        assignment[abs(lit)] = lit > 0
+    return assignment
+
+
   def _logError(self, encoder, to_replace, nof_gates, nof_gate_inputs) :
     print("************ Error Log ************", file=sys.stderr)
     print(f"Root gate: {to_replace[0]}", file=sys.stderr)
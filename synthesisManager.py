@@ -7,6 +7,10 @@ import tempfile
 
 from synthesiser import Synthesiser
 from utils import Configuration
+from npnCache import NPNCache
+from rewriteDatabase import RewriteDatabase
+from solverPortfolio import SolverPortfolio
+from calibrationProfile import CalibrationProfile
 import reduceWithAbc
 
 import blifIO
@@ -16,16 +20,16 @@ import aigerIO
 class Synthesismanager :
 
   @staticmethod
-  def getSpecification(spec, ordered_inputs = False) :
+  def getSpecification(spec, ordered_inputs = False, compact = False) :
     if spec.endswith(".aig") or spec.endswith(".aag") :
-      return aigerIO.getSpecification(spec)
+      return aigerIO.getSpecification(spec, compact)
     else :
       assert spec.endswith(".blif")
-      return blifIO.getSpecification(spec, ordered_inputs)
+      return blifIO.getSpecification(spec, ordered_inputs, compact)
 
   def __init__(self, spec_file, config : Configuration, ordered_spec = False) :
     logging.getLogger().setLevel(logging.INFO)
-    self.specification = Synthesismanager.getSpecification(spec_file, ordered_spec)
+    self.specification = Synthesismanager.getSpecification(spec_file, ordered_spec, config.compact_specification)
     self.initial_nof_gates = self.specification.getNofGates()
     self.initial_depth = self.specification.getDepth()
     print(f"Initial Depth:     {self.initial_depth}")
@@ -35,6 +39,20 @@ class Synthesismanager :
       self.randomSeed()
     else :
       self.setSeed(config.seed)
+    # The cache is shared by all runs
+    self.npn_cache = NPNCache(config.npn_cache_size, config.npn_cache_file) if config.use_npn_cache else None
+    # The rewrite database is only read once and shared by all runs
+    self.rewrite_database = RewriteDatabase(config.rewrite_database_file) if config.use_rewrite_database else None
+    # The win statistics of the portfolio are shared by all runs
+    self.portfolio = None
+    if len(config.qbf_portfolio) > 1 :
+      self.portfolio = SolverPortfolio(config.qbf_portfolio, config.portfolio_prune_after, config.portfolio_min_win_ratio)
+    # The calibration is passed from run to run and saved after each run
+    self.profile = None
+    if config.calibration_profile_file is not None :
+      self.profile = CalibrationProfile(config.calibration_profile_file)
+      if self.profile.load(config) :
+        logging.info(f"Loaded calibration profile {config.calibration_profile_file}")
 
   def _printIntermediateResults(self, synth, iteration) :
     if self.config.synthesiseAig or iteration < self.config.runs - 1 :
@@ -53,6 +71,8 @@ class Synthesismanager :
     reduced_by_abc = 0
     for i in range(self.config.runs) :
       synth = self._applyReduction(budget)
+      if self.npn_cache is not None :
+        self.npn_cache.save()
       self._printIntermediateResults(synth, i)
       if self.config.use_abc :
         circuit_size = self.specification.getNofGates()
@@ -73,8 +93,15 @@ class Synthesismanager :
       self.printStatistics()
 
   def _applyReduction(self, budget) :
-    synthesiser = Synthesiser(self.specification, self.config)
-    return synthesiser.reduce(budget, self.config.initial_subcircuit_size, self.config.gate_size)
+    synthesiser = Synthesiser(self.specification, self.config, self.npn_cache, self.portfolio, self.rewrite_database)
+    subcircuit_size = self.config.initial_subcircuit_size
+    if self.profile is not None and self.profile.isLoaded() :
+      subcircuit_size = self.profile.apply(synthesiser)
+    synthesiser.reduce(budget, subcircuit_size, self.config.gate_size)
+    if self.profile is not None :
+      self.profile.record(synthesiser, self.config)
+      self.profile.save()
+    return synthesiser
 
   def _applyABC(self, iteration) :
     abc_start_time = time.time()
@@ -89,7 +116,7 @@ class Synthesismanager :
       in_file.flush()
       gate_count = reduceWithAbc.applyABC(in_file.name, out_file.name, self.config.abc_preprocess_cmds, self.config.abc_cmds, self.config.synthesiseAig)
       out_file.flush()
-      spec = self.getSpecification(out_file.name)
+      spec = self.getSpecification(out_file.name, compact = self.config.compact_specification)
       print(f"ABC #gates before: {nof_gates}; after: {spec.getNofGates()}")
       print(f"ABC gate count: {gate_count}; internal count: {spec.getNofGates()}")
       spec_reduced = spec.getNofGates() < nof_gates
@@ -2,9 +2,14 @@
 import random
 import time
 import logging
+import concurrent.futures
 
 
 from subcircuitSynthesiser import SubcircuitSynthesiser
+from minimalWindowCache import MinimalWindowCache
+from rewriteDatabase import RewriteDatabase
+from rewriteDatabase import DatabaseRewriter
+from fraig import Sweeper
 from utils import Configuration
 from utils import mean
 
@@ -13,43 +18,80 @@ import aigerIO
 import blifIO
 
 
+# A window that is synthesised by a worker thread of the parallel traversal.
+# write: the gates of the window (the gates the encoding is built from)
+# read: the window inputs and, if the satisfiability don't cares of the window inputs are used, their transitive fan-in
+class WindowJob :
+
+  def __init__(self, root_gate, to_replace, encoder, write, read, fingerprint, window_signature, counter) :
+    self.root_gate = root_gate
+    self.to_replace = to_replace
+    self.encoder = encoder
+    self.write = write
+    self.read = read
+    self.fingerprint = fingerprint
+    self.window_signature = window_signature
+    self.counter = counter
+
+  def conflicts(self, other) :
+    return not self.write.isdisjoint(other.write) or not self.write.isdisjoint(other.read) or not self.read.isdisjoint(other.write)
+
+
 class Synthesiser :
       
 
   @staticmethod
-  def getSpecification(spec, ordered_inputs = False) :
+  def getSpecification(spec, ordered_inputs = False, compact = False) :
     if spec.endswith(".aig") or spec.endswith(".aag") :
-      return aigerIO.getSpecification(spec)
+      return aigerIO.getSpecification(spec, compact)
     else :
       assert spec.endswith(".blif")
-      return blifIO.getSpecification(spec, ordered_inputs)
+      return blifIO.getSpecification(spec, ordered_inputs, compact)
 
   @staticmethod
   def getSynthesiser(spec, config, ordered_inputs = False) :
-    specification = Synthesiser.getSpecification(spec, ordered_inputs)
+    specification = Synthesiser.getSpecification(spec, ordered_inputs, config.compact_specification)
     return Synthesiser(specification, config)
     
 
-  def __init__(self, spec, config : Configuration) :
+  # rewrite_database: the database used by the database rewriting (read from config.rewrite_database_file if None)
+  def __init__(self, spec, config : Configuration, npn_cache = None, portfolio = None, rewrite_database = None) :
     self.specification = spec
     config.validateConfig()
     self.config = config
-    self.synthesiser = SubcircuitSynthesiser(self.specification, config)
+    self.synthesiser = SubcircuitSynthesiser(self.specification, config, npn_cache, portfolio)
     
     # If the QBF calls yielding SAT are very fast increase the size of the considered subcircuits
     self.subcircuit_size_validated = False
     self.check_for_larger_subcircuits = True
     self.last_validated = None
     self.time_subcircuit_selection = 0
+    self.time_database_rewriting = 0
+    self.database_rewriter = None
+    self.rewrite_database = rewrite_database
+    self.nof_sweeps = 0
+    self.nof_gates_removed_by_sweeping = 0
+    self.time_sweeping = 0
 
     # Map a gate to the iteration counter, where it was analysed
     # A dictionary preserves the insertion order
     self.taboo_dict = {} 
+    self.minimal_windows = None
+    if config.use_minimal_window_cache :
+      # Without windows the encoding considers the whole transitive fan-out of a subcircuit
+      if config.use_windowed_encoding :
+        self.minimal_windows = MinimalWindowCache(spec, config.window_tfi_depth, config.window_tfo_depth)
+      else :
+        self.minimal_windows = MinimalWindowCache(spec, None, None)
 
     self.replacements_single_output_subcircuits = 0
     self.reduction_single_output_subcircuits = 0
     self.replacements_multi_output_subcircuits = 0
     self.reduction_multi_output_subcircuits = 0
+    # Results of the parallel traversal that were discarded because their window changed in the meantime
+    self.nof_discarded_results = 0
+    # Windows prepared by the pipeline that were discarded because a replacement changed them before they were dispatched
+    self.nof_discarded_prepared_windows = 0
 
   def _getEllapsedTime(self) :
     return time.time() - self.start
@@ -65,6 +107,7 @@ class Synthesiser :
     available_time, available_iterations = budget
     self.total_available_time = available_time
     self.start = time.time()
+    self.subcircuit_size = subcircuit_size
     self._traverseGates(available_iterations, subcircuit_size, nof_inputs)
     return self
 
@@ -72,20 +115,75 @@ class Synthesiser :
     print("*************************************************")
     print(f"Combined synthesis time:                {self._getEllapsedTime()}")
     print(f"Time subcircuit selection: {self.time_subcircuit_selection}")
+    if self.database_rewriter is not None :
+      print(f"Database rewriting: rewrites: {self.database_rewriter.nof_rewrites}; removed gates: {self.nof_gates_removed_by_database}; time: {self.time_database_rewriting}")
+    if self.config.use_fraig :
+      print(f"SAT sweeping: sweeps: {self.nof_sweeps}; removed gates: {self.nof_gates_removed_by_sweeping}; time: {self.time_sweeping}")
     self.synthesiser.printLoggedTimings()
     self.synthesiser.printReplacementCounts()
+    if self.config.use_lower_bounds :
+      self.synthesiser.printLowerBoundStatistics()
+    if self.synthesiser.npn_cache is not None :
+      self.synthesiser.npn_cache.printStatistics()
+    if self.synthesiser.portfolio is not None :
+      self.synthesiser.portfolio.printStatistics()
+    if self.minimal_windows is not None :
+      self.minimal_windows.printStatistics()
     print(f"Single output subcircuits: replacements: {self.replacements_single_output_subcircuits}; reductions: {self.reduction_single_output_subcircuits}")
     print(f"Multiple output subcircuits: replacements: {self.replacements_multi_output_subcircuits}; reductions: {self.reduction_multi_output_subcircuits}")
+    if self.config.parallel_windows > 1 or self.config.pipeline_depth > 0 :
+      print(f"Parallel traversal: discarded results: {self.nof_discarded_results}; discarded prepared windows: {self.nof_discarded_prepared_windows}")
     print("*************************************************")
     
   def _traverseGates(self, budget, subcircuit_size, nof_inputs) :
+    if self.config.use_fraig :
+      self._applySweeping()
+    if self.config.use_rewrite_database :
+      self._applyDatabaseRewriting()
     if self.specification.getNofGates() < nof_inputs :
       return
-    self._randomTraversal(budget, subcircuit_size, nof_inputs)
-
-  def _getRandomGate(self) :
+    if self.config.parallel_windows > 1 or self.config.pipeline_depth > 0 :
+      self._parallelTraversal(budget, subcircuit_size, nof_inputs)
+    else :
+      self._randomTraversal(budget, subcircuit_size, nof_inputs)
+
+  # Replaces small cones by precomputed minimum circuits before the solver based reduction
+  def _applyDatabaseRewriting(self) :
+    start = time.time()
+    database = self.rewrite_database
+    if database is None :
+      database = RewriteDatabase(self.config.rewrite_database_file)
+    if not database.isApplicable(self.config) :
+      logging.info("The rewrite database was generated for other gate types -- database rewriting is skipped")
+      return
+    self.database_rewriter = DatabaseRewriter(self.specification, database, self.config.rewrite_max_cuts)
+    self.nof_gates_removed_by_database = self.database_rewriter.rewrite()
+    self._invalidateChangedGates(self.database_rewriter.changed_gates)
+    self.time_database_rewriting = time.time() - start
+    logging.info(f"Database rewriting removed {self.nof_gates_removed_by_database} gates")
+
+  # Merges functionally equivalent gates (see fraig.py)
+  def _applySweeping(self) :
+    start = time.time()
+    sweeper = Sweeper(self.specification, self.config.fraig_nof_patterns, self.config.fraig_conflict_limit, random.getrandbits(32))
+    removed = sweeper.sweep()
+    self._invalidateChangedGates(sweeper.changed_gates)
+    self.nof_sweeps += 1
+    self.nof_gates_removed_by_sweeping += removed
+    self.time_sweeping += time.time() - start
+    logging.info(f"SAT sweeping removed {removed} gates (merges: {sweeper.nof_merges}; sat calls: {sweeper.nof_sat_calls}; counterexamples: {sweeper.nof_counterexamples}; undecided: {len(sweeper.undecided)})")
+
+  # Changes of the circuit outside of the traversal (sweeping, database rewriting) invalidate
+  # the taboo entries and the irreducible windows that depend on the changed gates (see _processReplacement)
+  def _invalidateChangedGates(self, changed_gates) :
+    for g in changed_gates :
+      self.taboo_dict.pop(g, None)
+    if self.minimal_windows is not None :
+      self.minimal_windows.invalidate(changed_gates)
+
+  def _getRandomGate(self, excluded = ()) :
     gates = self.specification.getGateAliasesSet()
-    gate_var_list = sorted(gates.difference(self.taboo_dict)) 
+    gate_var_list = sorted(gates.difference(self.taboo_dict).difference(excluded)) 
     if len(gate_var_list) == 0 :
       return None
     rv = random.randint(0, len(gate_var_list) - 1)
@@ -105,10 +203,8 @@ class Synthesiser :
 
   def _randomTraversal(self, budget, subcircuit_size, nof_inputs) :
     check_budget = budget is not None
-    log_spec_time_steps = self.config.log_time_steps is not None and self.config.specification_log_dir is not None
-    log_spec_iteration_steps = self.config.log_iteration_steps is not None and self.config.specification_log_dir is not None
     counter = 0
-    intermediate_counter = 0
+    self.intermediate_counter = 0
     while True :
       if check_budget and counter >= budget :
         logging.info(f"Available iterations used up. Nof considered subcircuits: {counter}")
@@ -135,88 +231,320 @@ class Synthesiser :
         
       self.time_subcircuit_selection += (time.time() - start)
 
-      replaceable, subcir_data, timeout = self._replaceSubcircuit(to_replace, nof_inputs)
+      window_signature = None if self.minimal_windows is None else self.minimal_windows.getSignature(to_replace)
+      old_definitions = None
+      if window_signature is not None and self.minimal_windows.isMinimal(window_signature, len(to_replace)) :
+        logging.debug(f"Window of root gate {root_gate} is known to be minimal")
+        replaceable, subcir_data, timeout = False, None, False
+      else :
+        if self.minimal_windows is not None :
+          old_definitions = self._getGateDefinitions(set(to_replace).union(self.specification.getDirectSuccessors(to_replace)))
+        replaceable, subcir_data, timeout = self._replaceSubcircuit(to_replace, nof_inputs)
+        if window_signature is not None and not replaceable and not timeout and self.synthesiser.last_synthesis_minimal :
+          self.minimal_windows.store(window_signature, to_replace)
       logging.debug(f"iteration: {counter}; root gate: {root_gate}; old-size: {len(to_replace)}; new-size: {len(subcir_data[0]) if replaceable  else '-'}; to replace: {to_replace}")
 
-      if not self.subcircuit_size_validated :
-        if timeout :
-          if self.last_validated is None :
-            subcircuit_size -= 1
-            if subcircuit_size < 2 :
-              logging.warn("The encoding for a subcircuit with 2 gates could not be solved by the QBF solver within the given timeout.")
-              logging.warn("Restart with a longer timeout -- be aware if the given timeout was already reasonably long then maybe the specification is too hard.")
-              return
-          else :
-            subcircuit_size = self.last_validated
-            self.subcircuit_size_validated = True
-          self.check_for_larger_subcircuits = False
-          logging.info(f"QBF call takes too long -- decrease the subcircuit size to: {subcircuit_size}")
-        elif replaceable and subcircuit_size == len(to_replace) :
-          self.subcircuit_size_validated = True
-          self.last_validated = subcircuit_size
-      
-      if self.check_for_larger_subcircuits and counter % self.config.check_subcircuit_size_interval == 0 :
-        if subcircuit_size in self.synthesiser.timer.recorded_timings_sat and len(self.synthesiser.timer.recorded_timings_sat[subcircuit_size]) > self.config.subcircuit_size_increase_nof_samples :
-          if mean(self.synthesiser.timer.recorded_timings_sat[subcircuit_size]) < self.config.subcircuit_size_increase_limit :
-            subcircuit_size += 1
-            self.subcircuit_size_validated = False
-            logging.info(f"QBF call fast -- increase the subcircuit size to {subcircuit_size}")
+      subcircuit_size = self._adaptSubcircuitSize(subcircuit_size, to_replace, replaceable, timeout, counter)
+      if subcircuit_size is None :
+        return
 
       if replaceable :
-        gate_names, output_assoc, unused = subcir_data
-        reduced = len(gate_names) < len(to_replace)
-
-        if len(output_assoc) == 1 :
-          self.replacements_single_output_subcircuits += 1
-          if reduced :
-            self.reduction_single_output_subcircuits += 1
-        else :
-          self.replacements_multi_output_subcircuits += 1
-          if reduced :
-            self.reduction_multi_output_subcircuits += 1
-
-        if reduced :
-          for g in to_replace :
-            self.taboo_dict.pop(g, None)
-
-        for g in to_replace :
-          self.taboo_dict.pop(g, None)
-        for g in unused :
-          self.taboo_dict.pop(g, None)
-        
-
+        self._processReplacement(root_gate, to_replace, subcir_data, self.synthesiser.last_synthesis_minimal, old_definitions, counter)
         if self.specification.getNofGates() == 0 :
           logging.info("No Gates left.")
           return
+        self._logIntermediateResult(counter)
 
-        if self.config.use_taboo_list :
-          if not root_gate in output_assoc :
-            logging.warning(f"Root gate not in output association. root: {root_gate}, replace: {to_replace}, assoc: {output_assoc}")
-          else :
-            root_representation = output_assoc[root_gate]
-            self.taboo_dict[root_representation] = counter
-
-        if (log_spec_time_steps and int(self._getEllapsedTime() // self.config.log_time_steps) > intermediate_counter) :
-          fname = f"{self.config.specification_log_dir}/spec_it_{counter}.blif"
-          self.writeSpecification(fname)
-          logging.info(f"Intermediate Results: {int(self._getEllapsedTime() // self.config.log_time_steps)} {self._getEllapsedTime()}")
-          intermediate_counter += 1
-        # Log intermediate results
-        elif log_spec_iteration_steps and counter % self.config.log_iteration_steps == 0 :
-          fname = f"{self.config.specification_log_dir}/spec_it_{counter}.blif"
-          self.writeSpecification(fname)
-
-      if self.config.use_taboo_list :
-        self.taboo_dict[root_gate] = counter
-
-        last_gate, last_counter = next(iter(self.taboo_dict.items()))
-        while len(self.taboo_dict) > 0 and len(self.taboo_dict) >= self.config.taboo_ratio * self.specification.getNofGates() :
-          self.taboo_dict.pop(last_gate, None)
-          if len(self.taboo_dict) > 0 :
-            last_gate, last_counter = next(iter(self.taboo_dict.items()))
-          
+      self._updateTabooList(root_gate, counter)
       logging.debug(f"Iteration: {counter}; Nof Gates: {self.specification.getNofGates()}")
+      if self.config.fraig_interval is not None and counter % self.config.fraig_interval == 0 :
+        self._applySweeping()
+
+
+  # Up to config.parallel_windows windows are synthesised at the same time.
+  # The QBF solvers run in separate processes, thus worker threads suffice for making the solver calls in parallel.
+  # The windows are selected such that no window contains a gate the encoding of another window depends on.
+  # The circuits obtained for a window are integrated on the main thread, if the window did not change in the meantime.
+  # Pipeline: While the solvers run, the main thread prepares the encodings of up to config.pipeline_depth further windows.
+  # These windows may overlap with the windows that are synthesised. They are only dispatched if no window they
+  # overlap with is still synthesised and if they were not changed by a replacement; otherwise they are discarded.
+  def _parallelTraversal(self, budget, subcircuit_size, nof_inputs) :
+    check_budget = budget is not None
+    counter = 0
+    self.intermediate_counter = 0
+    jobs = {}
+    prepared = []
+    stop = False
+    nof_workers = self.config.parallel_windows
+    with concurrent.futures.ThreadPoolExecutor(max_workers = nof_workers) as executor :
+      while True :
+        # Dispatch prepared windows and prepare new ones until all workers are busy and the pipeline is filled
+        excluded = set()
+        counter = self._dispatchPreparedJobs(prepared, jobs, executor, nof_inputs, counter)
+        while not stop and len(jobs) + len(prepared) < nof_workers + self.config.pipeline_depth :
+          if check_budget and counter + len(prepared) >= budget :
+            # The prepared windows still count towards the budget
+            if len(prepared) > 0 :
+              break
+            logging.info(f"Available iterations used up. Nof considered subcircuits: {counter}")
+            stop = True
+          elif not self._checkTime() :
+            logging.info(f"Available time used up. Nof considered subcircuits: {counter}")
+            stop = True
+          else :
+            start = time.time()
+            for job in jobs.values() :
+              excluded.update(job.write)
+            for job in prepared :
+              excluded.add(job.root_gate)
+            root_gate = self._getRandomGate(excluded)
+            if root_gate is None :
+              if len(jobs) == 0 and len(prepared) == 0 :
+                logging.info("Too many subcircuits of size 1 -- it is unlikely to reduce the circuit")
+                stop = True
+              break
+            excluded.add(root_gate)
+            to_replace = self._getSubcircuitGates(root_gate, subcircuit_size)
+            if len(to_replace) == 1 :
+              self.taboo_dict[root_gate] = counter
+              continue
+            job = self._prepareWindowJob(root_gate, to_replace, nof_inputs, None)
+            self.time_subcircuit_selection += (time.time() - start)
+            if job is not None and job.encoder is not None :
+              if self.config.pipeline_depth == 0 and any(job.conflicts(x) for x in jobs.values()) :
+                continue
+              prepared.append(job)
+              counter = self._dispatchPreparedJobs(prepared, jobs, executor, nof_inputs, counter)
+              continue
+            counter += 1
+            # The window is known to be minimal or it cannot be synthesised
+            new_subcircuit_size = self._adaptSubcircuitSize(subcircuit_size, to_replace, False, False, counter)
+            if new_subcircuit_size is None :
+              stop = True
+            else :
+              subcircuit_size = new_subcircuit_size
+            self._updateTabooList(root_gate, counter)
+
+        if stop and len(prepared) > 0 :
+          self.nof_discarded_prepared_windows += len(prepared)
+          prepared = []
+        if len(jobs) == 0 :
+          if len(prepared) > 0 :
+            continue
+          return
+        done, _ = concurrent.futures.wait(jobs, return_when = concurrent.futures.FIRST_COMPLETED)
+        for future in done :
+          job = jobs.pop(future)
+          (realisable, size, circuit, timeout), minimal = future.result()
+          if self.specification.getNofGates() == 0 :
+            continue
+          valid = self._isWindowUnchanged(job)
+          replaceable, subcir_data = False, None
+          if realisable :
+            if not valid :
+              logging.debug(f"Result for root gate {job.root_gate} discarded -- the window changed")
+              self.nof_discarded_results += 1
+              continue
+            old_definitions = None
+            if self.minimal_windows is not None :
+              old_definitions = self._getGateDefinitions(set(job.to_replace).union(self.specification.getDirectSuccessors(job.to_replace)))
+            replaceable, subcir_data, _ = self.synthesiser.integrateSubcircuit(job.to_replace, size, circuit)
+          elif valid and job.window_signature is not None and not timeout and minimal :
+            self.minimal_windows.store(job.window_signature, job.to_replace)
+          logging.debug(f"iteration: {job.counter}; root gate: {job.root_gate}; old-size: {len(job.to_replace)}; new-size: {len(subcir_data[0]) if replaceable  else '-'}; to replace: {job.to_replace}")
+
+          new_subcircuit_size = self._adaptSubcircuitSize(subcircuit_size, job.to_replace, replaceable, timeout, job.counter)
+          if new_subcircuit_size is None :
+            stop = True
+            continue
+          subcircuit_size = new_subcircuit_size
+          if replaceable :
+            self._processReplacement(job.root_gate, job.to_replace, subcir_data, minimal, old_definitions, job.counter)
+            if self.specification.getNofGates() == 0 :
+              logging.info("No Gates left.")
+              stop = True
+              continue
+            self._logIntermediateResult(job.counter)
+          self._updateTabooList(job.root_gate, job.counter)
+          logging.debug(f"Iteration: {job.counter}; Nof Gates: {self.specification.getNofGates()}")
+
+  # Submits the prepared windows (in the order they were prepared) that do not overlap with a window that is synthesised.
+  # Prepared windows that were changed by a replacement are discarded. Returns the updated iteration counter.
+  def _dispatchPreparedJobs(self, prepared, jobs, executor, nof_inputs, counter) :
+    remaining = []
+    for job in prepared :
+      if len(jobs) >= self.config.parallel_windows or any(job.conflicts(x) for x in jobs.values()) :
+        remaining.append(job)
+        continue
+      if not self._isWindowUnchanged(job) :
+        logging.debug(f"Prepared window of root gate {job.root_gate} discarded -- the window changed")
+        self.nof_discarded_prepared_windows += 1
+        continue
+      counter += 1
+      job.counter = counter
+      require_reduction = self.config.require_reduction and self.subcircuit_size_validated
+      future = executor.submit(self.synthesiser.synthesisePrepared, job.encoder, job.to_replace, nof_inputs, require_reduction)
+      jobs[future] = job
+    prepared[:] = remaining
+    return counter
+
+  def _isWindowUnchanged(self, job) :
+    return self._getWindowFingerprint(job.write, job.read) == job.fingerprint and self._isCycleFree(job.encoder, job.to_replace)
+
+  # Returns None if the window is known to be minimal. The encoder of the returned job is None if the window cannot be synthesised.
+  def _prepareWindowJob(self, root_gate, to_replace, nof_inputs, counter) :
+    window_signature = None if self.minimal_windows is None else self.minimal_windows.getSignature(to_replace)
+    if window_signature is not None and self.minimal_windows.isMinimal(window_signature, len(to_replace)) :
+      logging.debug(f"Window of root gate {root_gate} is known to be minimal")
+      return None
+    encoder = self.synthesiser.prepareSynthesis(to_replace, nof_inputs)
+    if encoder is None :
+      return WindowJob(root_gate, to_replace, None, set(), set(), None, None, counter)
+    write = set(encoder.window_gates)
+    read = set(encoder.window_leaves)
+    if encoder.window_care_patterns is not None :
+      to_process = [x for x in read if self.specification.isGate(x)]
+      while len(to_process) > 0 :
+        for x in self.specification.getGateInputs(to_process.pop()) :
+          if not x in read :
+            read.add(x)
+            if self.specification.isGate(x) :
+              to_process.append(x)
+    fingerprint = self._getWindowFingerprint(write, read)
+    return WindowJob(root_gate, to_replace, encoder, write, read, fingerprint, window_signature, counter)
+
+  # The encoding of a window depends on the definitions and the outputs of the window gates and
+  # on the definitions of the gates it reads
+  def _getWindowFingerprint(self, write, read) :
+    spec = self.specification
+    fingerprint = {}
+    for x in write :
+      fingerprint[x] = (tuple(spec.getGateInputs(x)), spec.getGate(x).table.to01(), frozenset(spec.getGateOutputs(x)), spec.isPO(x)) if spec.isGate(x) else None
+    for x in read :
+      fingerprint[x] = (tuple(spec.getGateInputs(x)), spec.getGate(x).table.to01()) if spec.isGate(x) else None
+    return fingerprint
+
+  # Replacements of other windows may have introduced paths outside the window that the cycle constraints of the encoding do not consider
+  def _isCycleFree(self, encoder, to_replace) :
+    forbidden = self.specification.getPotentialCycles(encoder.subcircuit_inputs, encoder.subcircuit_outputs, to_replace)
+    return set(forbidden).issubset(encoder.potential_cycles)
+
+  # Returns the subcircuit size to use for the next iterations (None if the synthesis shall be stopped)
+  def _adaptSubcircuitSize(self, subcircuit_size, to_replace, replaceable, timeout, counter) :
+    if not self.subcircuit_size_validated :
+      if timeout :
+        if self.last_validated is None :
+          subcircuit_size -= 1
+          if subcircuit_size < 2 :
+            logging.warn("The encoding for a subcircuit with 2 gates could not be solved by the QBF solver within the given timeout.")
+            logging.warn("Restart with a longer timeout -- be aware if the given timeout was already reasonably long then maybe the specification is too hard.")
+            return None
+        else :
+          subcircuit_size = self.last_validated
+          self.subcircuit_size_validated = True
+        self.check_for_larger_subcircuits = False
+        logging.info(f"QBF call takes too long -- decrease the subcircuit size to: {subcircuit_size}")
+      elif replaceable and subcircuit_size == len(to_replace) :
+        self.subcircuit_size_validated = True
+        self.last_validated = subcircuit_size
+    
+    if self.check_for_larger_subcircuits and counter % self.config.check_subcircuit_size_interval == 0 :
+      timings = self.synthesiser.timer.recorded_timings_per_subcircuit_size
+      if subcircuit_size in timings and len(timings[subcircuit_size]) > self.config.subcircuit_size_increase_nof_samples :
+        if mean(timings[subcircuit_size]) < self.config.subcircuit_size_increase_limit :
+          subcircuit_size += 1
+          self.subcircuit_size_validated = False
+          logging.info(f"QBF call fast -- increase the subcircuit size to {subcircuit_size}")
+    self.subcircuit_size = subcircuit_size
+    return subcircuit_size
+
+  # The state of the subcircuit size adaptation and of the timeouts (see CalibrationProfile)
+  def getCalibrationData(self) :
+    return {
+      "subcircuit_size" : self.subcircuit_size,
+      "validated" : self.subcircuit_size_validated,
+      "last_validated" : self.last_validated,
+      "check_for_larger_subcircuits" : self.check_for_larger_subcircuits,
+      "timer" : self.synthesiser.timer.getCalibrationData()
+    }
+
+  # Returns the subcircuit size with which the traversal shall start
+  def setCalibrationData(self, data) :
+    self.synthesiser.timer.setCalibrationData(data["timer"])
+    self.subcircuit_size_validated = data["validated"]
+    self.last_validated = data["last_validated"]
+    self.check_for_larger_subcircuits = data["check_for_larger_subcircuits"]
+    return data["subcircuit_size"]
+
+  # minimal: the replacement was proven to be minimal
+  # old_definitions: the definitions of the replaced gates and their successors before the replacement (see _getChangedGates)
+  def _processReplacement(self, root_gate, to_replace, subcir_data, minimal, old_definitions, counter) :
+    gate_names, output_assoc, unused = subcir_data
+    reduced = len(gate_names) < len(to_replace)
+
+    if len(output_assoc) == 1 :
+      self.replacements_single_output_subcircuits += 1
+      if reduced :
+        self.reduction_single_output_subcircuits += 1
+    else :
+      self.replacements_multi_output_subcircuits += 1
+      if reduced :
+        self.reduction_multi_output_subcircuits += 1
+
+    for g in to_replace :
+      self.taboo_dict.pop(g, None)
+    for g in unused :
+      self.taboo_dict.pop(g, None)
+
+    if self.minimal_windows is not None and old_definitions is not None :
+      self.minimal_windows.invalidate(self._getChangedGates(old_definitions, gate_names, unused))
+      # A replacement of the same size that was proven to be minimal yields an irreducible window
+      if not reduced and minimal and len(gate_names) > 1 and all(self.specification.isGate(x) for x in gate_names) :
+        self.minimal_windows.store(self.minimal_windows.getSignature(gate_names), gate_names)
+
+    if self.config.use_taboo_list and self.specification.getNofGates() > 0 :
+      if not root_gate in output_assoc :
+        logging.warning(f"Root gate not in output association. root: {root_gate}, replace: {to_replace}, assoc: {output_assoc}")
+      else :
+        root_representation = output_assoc[root_gate]
+        self.taboo_dict[root_representation] = counter
 
+  def _logIntermediateResult(self, counter) :
+    log_spec_time_steps = self.config.log_time_steps is not None and self.config.specification_log_dir is not None
+    log_spec_iteration_steps = self.config.log_iteration_steps is not None and self.config.specification_log_dir is not None
+    if (log_spec_time_steps and int(self._getEllapsedTime() // self.config.log_time_steps) > self.intermediate_counter) :
+      fname = f"{self.config.specification_log_dir}/spec_it_{counter}.blif"
+      self.writeSpecification(fname)
+      logging.info(f"Intermediate Results: {int(self._getEllapsedTime() // self.config.log_time_steps)} {self._getEllapsedTime()}")
+      self.intermediate_counter += 1
+    # Log intermediate results
+    elif log_spec_iteration_steps and counter % self.config.log_iteration_steps == 0 :
+      fname = f"{self.config.specification_log_dir}/spec_it_{counter}.blif"
+      self.writeSpecification(fname)
+
+  def _updateTabooList(self, root_gate, counter) :
+    if self.config.use_taboo_list :
+      self.taboo_dict[root_gate] = counter
+
+      last_gate, last_counter = next(iter(self.taboo_dict.items()))
+      while len(self.taboo_dict) > 0 and len(self.taboo_dict) >= self.config.taboo_ratio * self.specification.getNofGates() :
+        self.taboo_dict.pop(last_gate, None)
+        if len(self.taboo_dict) > 0 :
+          last_gate, last_counter = next(iter(self.taboo_dict.items()))
+
+
+  def _getGateDefinitions(self, aliases) :
+    return {x : (tuple(self.specification.getGateInputs(x)), self.specification.getGate(x).table.to01()) for x in aliases}
+
+  # The gates that were removed, added or whose definition was changed by a replacement.
+  # old_definitions shall contain the replaced gates and their successors.
+  def _getChangedGates(self, old_definitions, gate_names, unused) :
+    changed = set(unused)
+    for x, definition in old_definitions.items() :
+      if not self.specification.isGate(x) or self._getGateDefinitions([x])[x] != definition :
+        changed.add(x)
+    changed.update(x for x in gate_names if not x in old_definitions)
+    return changed
 
   # root_gate_var shall be the first element of the returned list
   def _getSubcircuitGates(self, root_gate_var, size) :
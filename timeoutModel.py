@@ -0,0 +1,55 @@
+import math
+
+
+# Predicts the run time of a solver call from features of the encoding (see EncoderCircuits.getEncodingFeatures).
+# The logarithm of the run time is modelled as a linear function of the logarithms of the features.
+# The model is learned online by recursive least squares with a forgetting factor, thus recent timings weigh more.
+# The variance of the prediction errors is tracked as well; the timeout is the predicted time plus the given
+# number of standard deviations (in log space).
+class TimeoutModel :
+
+  def __init__(self, nof_features, forgetting_factor = 0.98, initial_covariance = 100) :
+    self.dimension = nof_features + 1 # bias
+    self.forgetting_factor = forgetting_factor
+    self.weights = [0.0] * self.dimension
+    self.covariance = [[initial_covariance if i == j else 0.0 for j in range(self.dimension)] for i in range(self.dimension)]
+    self.error_variance = 0.0
+    self.nof_samples = 0
+
+  def _getVector(self, features) :
+    assert len(features) + 1 == self.dimension, "Invalid number of features"
+    return [1.0] + [math.log1p(x) for x in features]
+
+  def _predictLog(self, x) :
+    return sum(w * v for w, v in zip(self.weights, x))
+
+  def update(self, features, time) :
+    x = self._getVector(features)
+    y = math.log(max(time, 1e-3))
+    error = y - self._predictLog(x)
+    px = [sum(p * v for p, v in zip(row, x)) for row in self.covariance]
+    gain_denominator = self.forgetting_factor + sum(v * p for v, p in zip(x, px))
+    gain = [p / gain_denominator for p in px]
+    self.weights = [w + k * error for w, k in zip(self.weights, gain)]
+    self.covariance = [[(self.covariance[i][j] - gain[i] * px[j]) / self.forgetting_factor for j in range(self.dimension)] for i in range(self.dimension)]
+    self.nof_samples += 1
+    # The errors are a priori errors, thus they also reflect the uncertainty of the weights
+    self.error_variance += (error * error - self.error_variance) / min(self.nof_samples, 50)
+
+  # Returns the predicted time of a solver call
+  def predict(self, features) :
+    return math.exp(self._predictLog(self._getVector(features)))
+
+  def getTimeout(self, features, deviations) :
+    return math.exp(self._predictLog(self._getVector(features)) + deviations * math.sqrt(self.error_variance))
+
+  def getState(self) :
+    return {"weights" : self.weights, "covariance" : self.covariance, "error_variance" : self.error_variance, "nof_samples" : self.nof_samples}
+
+  def setState(self, state) :
+    if len(state["weights"]) != self.dimension :
+      return
+    self.weights = list(state["weights"])
+    self.covariance = [list(x) for x in state["covariance"]]
+    self.error_variance = state["error_variance"]
+    self.nof_samples = state["nof_samples"]
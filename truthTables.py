@@ -0,0 +1,52 @@
+# Truth tables of functions over a fixed list of variables represented by Python integers.
+# Bit m of a table is the value of the function under the assignment m,
+# where variable j is true in the assignment m iff bit j of m is set.
+# Python integers have arbitrary precision, thus the tables can be used for bit-parallel evaluations.
+#
+# Remark: The truth tables of the gates (Gate.table) use a different ordering.
+# There the first input of a gate corresponds to the most significant bit of the row index.
+
+def getMask(nof_vars) :
+  return (1 << (1 << nof_vars)) - 1
+
+def getVariableTable(idx, nof_vars) :
+  table = 0
+  block = 1 << idx
+  pattern = ((1 << block) - 1) << block
+  for start in range(0, 1 << nof_vars, 2 * block) :
+    table |= pattern << start
+  return table
+
+def getVariableTables(nof_vars) :
+  return [getVariableTable(i, nof_vars) for i in range(nof_vars)]
+
+# table: the truth table of a gate (rows ordered as in Gate.table)
+# input_tables: the truth tables of the inputs of the gate
+def evaluateGateTable(table, input_tables, mask) :
+  nof_inputs = len(input_tables)
+  result = 0
+  for row, val in enumerate(table) :
+    if not val :
+      continue
+    term = mask
+    for i, x in enumerate(input_tables) :
+      if row >> (nof_inputs - 1 - i) & 1 :
+        term &= x
+      else :
+        term &= ~x
+    result |= term
+  return result & mask
+
+def getValue(table, assignment) :
+  return table >> assignment & 1
+
+# The assignments to the given tables that occur for some assignment to the variables.
+# The ith table determines the ith bit of the returned assignments.
+def getOccurringPatterns(tables, nof_vars) :
+  patterns = set()
+  for m in range(1 << nof_vars) :
+    pattern = 0
+    for i, x in enumerate(tables) :
+      pattern |= (x >> m & 1) << i
+    patterns.add(pattern)
+  return patterns
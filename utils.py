@@ -3,12 +3,17 @@ import subprocess
 import os
 from enum import Enum
 
+import gateTables
+import simulator
+
 ScriptDir = os.path.dirname(os.path.realpath(__file__))
 ####################################################################
 # Program Paths
 miniQU_path = f"{ScriptDir}/QBF-Solver/miniQU"
 quabs_path  = f"{ScriptDir}/QBF-Solver/quabs"
 qfun_path   = f"{ScriptDir}/QBF-Solver/qfun"
+caqe_path   = f"{ScriptDir}/QBF-Solver/caqe"
+qute_path   = f"{ScriptDir}/QBF-Solver/qute"
 abc_path    = ""
 ####################################################################
 
@@ -21,6 +26,10 @@ class NoOutputException(Exception) :
 class NotEnoughPIsException(Exception) :
   pass
 
+# A solver call was cancelled because its result is no longer needed
+class CancelledException(Exception) :
+  pass
+
 
 class Configuration :
 
@@ -32,11 +41,29 @@ class Configuration :
     miniQU = 1
     quabs = 2
     QFun = 3
+    caqe = 4 # clausal (QDIMACS)
+    qute = 5 # clausal (QDIMACS)
     
   class SynthesisationMode(Enum) :
     qbf = 1
     qbf_clausal = 2
     exact = 3
+    cegis = 4 # counterexample guided synthesis with a SAT solver (requires pysat), QBF is used for subcircuits with many inputs or potential cycles
+
+  class CardinalityEncoding(Enum) :
+    sequential_counter = 1
+    totalizer = 2
+    commander = 3 # only used for exactly one constraints (otherwise the totalizer is used)
+    binary = 4 # the selected indices are given in binary, no cardinality constraint is needed
+
+  class SizeSearchStrategy(Enum) :
+    linear = 1 # decrease the number of gates one by one
+    binary = 2
+    galloping = 3 # decrease the number of gates by exponentially growing steps, then bisect
+
+  class EncodingTransport(Enum) :
+    memory = 1 # anonymous in-memory files (if not supported by the system temporary files are used)
+    file = 2 # temporary files
 
 
   def __init__(self) :
@@ -44,6 +71,7 @@ class Configuration :
     self.runs = 1 # if a value > is chosen start synthesis again when the budget is used up
     self.seed = None # if None randomise the seed
     self.synthesiseAig = False
+    self.compact_specification = False # store the circuit in arrays (see CompactSpecification), intended for very large circuits
     # ABC options
     self.use_abc = False
     self.abc_preprocess_cmds = "fraig -C 50000"
@@ -61,6 +89,18 @@ class Configuration :
     self.subcircuit_size_increase_nof_samples = 50
     # Circuit Traversal Options
     self.use_taboo_list = True
+    # Windows that were proven to be irreducible are not analysed again until a gate in their cone changes
+    # (with the windowed encoding the cone is bounded by window_tfi_depth and window_tfo_depth)
+    self.use_minimal_window_cache = True
+    # Before the synthesis based reduction, cones with at most four inputs are replaced by minimum circuits from a database
+    self.use_rewrite_database = True
+    self.rewrite_database_file = None # None: use the database shipped with the tool (rewriteDatabase4.txt)
+    self.rewrite_max_cuts = 12 # max nof cuts that are considered per gate
+    # Merge functionally equivalent gates by SAT sweeping (see fraig.py) before the traversal; requires pysat unless the circuit has few inputs
+    self.use_fraig = False
+    self.fraig_interval = None # if set, sweep again after this many iterations of the traversal
+    self.fraig_nof_patterns = 1024 # the number of random patterns used for finding candidate equivalences
+    self.fraig_conflict_limit = 50000 # conflict limit of the SAT calls
     # Subcircuit selection Options
     self.initial_subcircuit_size = 6
     # self.only_single_output_subcircuits = False
@@ -69,7 +109,25 @@ class Configuration :
     self.synthesis_approach = Configuration.SynthesisationMode.qbf
     # Subcircuit Synthesis Options
     self.require_reduction = False
+    # If no reduction is required, the subcircuit itself shows that it can be realised with its number of gates.
+    # The solver call for the original size is only made if the symmetry breaking constraints may exclude the subcircuit.
+    # Thus, subcircuits without a smaller realisation are kept instead of being replaced by a different circuit of the same size.
+    self.use_original_witness = True
     self.qbf_solver = Configuration.QBFSolver.QFun 
+    # Portfolio: if several solvers are given, they are raced on each encoding (the first answer is used).
+    # The solvers must support the encoding format of the synthesis approach.
+    self.qbf_portfolio = []
+    self.portfolio_prune_after = 50 # nof decided races after which rarely winning solvers are no longer used
+    self.portfolio_min_win_ratio = 0.05
+    self.cegis_max_inputs = 8 # CEGIS is only applied to subcircuits with at most this many inputs
+    # Search for the smallest number of gates realising a subcircuit (see sizeSearch.py)
+    self.size_search_strategy = Configuration.SizeSearchStrategy.linear
+    self.size_search_probes = 1 # nof sizes that are checked concurrently (only used for the qbf encodings)
+    # NPN cache: Minimal realisations of the functions of subcircuits are reused for subcircuits with NPN equivalent functions
+    self.use_npn_cache = False
+    self.npn_cache_size = 10000 # max nof entries, the least recently used entries are removed
+    self.npn_cache_file = None # if set, the cache is loaded from and saved to this file
+    self.npn_cache_max_inputs = 5 # only subcircuits with at most this many inputs are looked up
     # Encoding Options
     self.gate_size = 2 # nof of inputs the synthesised gates shall have
     self.useTrivialRuleConstraint = True
@@ -78,7 +136,26 @@ class Configuration :
     self.useOrderedStepsConstraint = True
     self.allowInputsAsOutputs = True
     self.allowConstantsAsOutputs = True
+    # Decide whether a subcircuit can be realised without gates by comparing the functions of its outputs and inputs instead of a solver call
+    self.simulate_zero_gate_check = True
+    self.zero_gate_simulation_limit = 16 # max nof variables of the compared functions (otherwise the solver is used)
+    # Skip sizes that are below a lower bound derived from the functions of the subcircuit outputs (only if the encoding preserves these functions)
+    self.use_lower_bounds = True
+    self.lower_bound_support_limit = 12 # max nof subcircuit inputs and max nof PIs they depend on
     self.useGateInputVariables = True # Related to the DITT encoding. Use for each input of each Gate a separate variable (only used in qbf encoding)
+    # Encodings of the constraints on the selection variables and on the gate output variables.
+    # If gate input variables are used, the selection variables are restricted by a sequential counter unless the binary encoding is selected.
+    self.selection_cardinality_encoding = Configuration.CardinalityEncoding.sequential_counter
+    self.output_cardinality_encoding = Configuration.CardinalityEncoding.sequential_counter
+    # Windowed encoding: Only encode a window around the subcircuit instead of the entire specification
+    self.use_windowed_encoding = False
+    self.window_tfi_depth = 2 # nof levels of the transitive fan-in of the subcircuit inputs that are part of the window
+    self.window_tfo_depth = 3 # nof levels of the transitive fan-out of the subcircuit outputs that are part of the window
+    self.window_sdc_support_limit = 12 # satisfiability don't cares of the window inputs are only computed if they depend on at most this many PIs
+    # Parallel traversal: nof windows with disjoint cones that are synthesised at the same time (requires the windowed encoding)
+    self.parallel_windows = 1
+    # Pipeline: nof windows whose encodings are prepared while the solver calls of the current windows run (requires the windowed encoding)
+    self.pipeline_depth = 0
     # Timeout Options
     self.use_timeouts = True  # Use timeouts for the individual checks
     self.use_dynamic_timeouts = True # Update the timeouts for the individual checks according to timings of the previous checks
@@ -88,11 +165,20 @@ class Configuration :
     self.required_timings = 10
     self.factor = 1.4 
     self.adjust_until = 50
+    # If set, the calibrated subcircuit size and timeouts are loaded from this file at startup and saved to it after each run
+    self.calibration_profile_file = None
+    # Predict the timeouts from features of the encodings (see TimeoutModel) instead of using the same timeout for all checks with the same number of gates
+    self.use_timeout_model = False
+    self.timeout_model_deviations = 1.5 # the timeout is the predicted time plus this many standard deviations of the prediction error (log scale)
+    self.timeout_model_forgetting_factor = 0.98
     # Logging Options
     self.gate_count_trace = False # Print the number of gates in each iteration
-    self.log_nof_equivalent_subcircuits = False # can only be used if qfun is available
+    self.log_nof_equivalent_subcircuits = False # qfun is only needed for subcircuits with more inputs than simulator.max_exhaustive_inputs
     self.log_replaced_gates = False
-    self.encoding_log_dir = None
+    self.encoding_log_dir = None # if set, the encodings are written to this directory instead of being passed via encoding_transport
+    self.encoding_transport = Configuration.EncodingTransport.memory
+    self.stream_certificates = True # parse only the relevant variables of a certificate while the solver output is read
+    self.write_encoding_comments = False # comments are only useful for inspecting logged encodings
     self.specification_log_dir = None
     self.log_time_steps = None
     self.log_iteration_steps = None
@@ -107,15 +193,68 @@ class Configuration :
     assert self.subcircuit_size_increase_limit > 0, "Invalid subcircuit_size_increase_limit"
     assert self.total_available_time > 0, "Timeouts must be positive numbers"
     assert self.base_timeout > 0, "Timeouts must be positive numbers"
+    assert self.window_tfi_depth >= 0 and self.window_tfo_depth >= 0, "Window depths must not be negative"
+    assert self.parallel_windows >= 1, "Invalid parallel_windows"
+    assert self.pipeline_depth >= 0, "Invalid pipeline_depth"
+    assert self.fraig_interval is None or (self.use_fraig and self.fraig_interval > 0), "Invalid fraig_interval"
+    assert self.fraig_nof_patterns > 0 and self.fraig_conflict_limit > 0, "Invalid SAT sweeping options"
+    assert 0 < self.timeout_model_forgetting_factor <= 1, "Invalid timeout_model_forgetting_factor"
+    assert self.size_search_probes >= 1, "Invalid size_search_probes"
+    if len(self.qbf_portfolio) > 1 :
+      circuit_solvers = {Configuration.QBFSolver.QFun, Configuration.QBFSolver.quabs, Configuration.QBFSolver.miniQU}
+      clausal_solvers = {Configuration.QBFSolver.caqe, Configuration.QBFSolver.qute}
+      if self.synthesis_approach == Configuration.SynthesisationMode.qbf_clausal :
+        assert set(self.qbf_portfolio).issubset(clausal_solvers), "The portfolio contains solvers that do not support QDIMACS"
+      else :
+        assert set(self.qbf_portfolio).issubset(circuit_solvers), "The portfolio contains solvers that do not support QCIR"
+    if self.parallel_windows > 1 or self.pipeline_depth > 0 :
+      assert self.fraig_interval is None, "The parallel traversal does not support repeated SAT sweeping"
+      assert self.use_windowed_encoding, "The parallel traversal requires the windowed encoding"
+      assert self.synthesis_approach in {Configuration.SynthesisationMode.qbf, Configuration.SynthesisationMode.qbf_clausal}, "The parallel traversal only supports the qbf synthesis modes"
+
+
+
+
+# Provides a stream to which an encoding can be written and a path from which a solver can read the encoding.
+# With the memory transport the encoding is written to an anonymous in-memory file (memfd).
+# The solver process inherits the file descriptor (pass it via pass_fds) and reads the encoding from /dev/fd/<fd>.
+# Thus, no file needs to be created, flushed and unlinked on disk.
+class EncodingFile :
+
+  def __init__(self, suffix, transport = Configuration.EncodingTransport.memory) :
+    self.suffix = suffix
+    self.transport = transport
+
+  def __enter__(self) :
+    if self.transport == Configuration.EncodingTransport.memory and hasattr(os, "memfd_create") :
+      fd = os.memfd_create("encoding" + self.suffix)
+      self.stream = os.fdopen(fd, "w")
+      self.name = f"/dev/fd/{fd}"
+      self.pass_fds = (fd,)
+    else :
+      self.stream = tempfile.NamedTemporaryFile(mode = "w", suffix = self.suffix, delete = True)
+      self.name = self.stream.name
+      self.pass_fds = ()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) :
+    self.stream.close()
 
+  def write(self, val) :
+    self.stream.write(val)
 
+  def flush(self) :
+    self.stream.flush()
 
 
 # Only the second subcircuit may contain constant (False) outputs.
 # A constant output is represented by the entry None in the second component of subcir2
-def checkSubcircuitsForEquivalence(subcir1, subcir2) :
+def checkSubcircuitsForEquivalence(subcir1, subcir2, transport = Configuration.EncodingTransport.memory) :
+  # Subcircuits with few inputs are simulated on all input assignments instead of calling the solver
+  if len(subcir1[0]) <= simulator.max_exhaustive_inputs :
+    return simulator.areSubcircuitsEquivalent(subcir1, subcir2)
 
-  with tempfile.NamedTemporaryFile(mode="w") as tmp:
+  with EncodingFile(".qcir", transport) as tmp:
     
     tmp.write("#QCIR-G14\n")
 
@@ -171,7 +310,7 @@ def checkSubcircuitsForEquivalence(subcir1, subcir2) :
     tmp.flush()
     # We use a QBF solver instead of a SAT solver as the instances are usually very easy and we do not want to add an additional dependency.
     solver_cmd = [qfun_path, tmp.name]
-    result = subprocess.run(solver_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    result = subprocess.run(solver_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=tmp.pass_fds)
 
     if result.returncode == 10: # There is an assignment for the inputs such that the circuits differ -> circuits are not equivalent
       return False
@@ -201,30 +340,25 @@ def writeXor(out, gate_var, in1, in2, max_var) :
 
 
 def writeGateFromTable(out, gate_var, inputs, table, max_var) :
-  anded = len([x for x in table if x > 0]) <= (2 ** (len(inputs) - 1))
-  val = 1 if anded else 0
-  lines = [getBits(x, len(inputs)) for x, y in enumerate(table) if y == val]
+  # The rows are the ones of Gate.getQCIRGates: conjunctions of the true rows (anded) or disjunctions excluding the false rows
+  anded, rows = gateTables.getGateTable(table).getQCIRRows()
+  lines = [[x if positive else -x for x, positive in zip(inputs, row)] for row in rows]
   aux_gates = []
   if len(lines) == 1 :
-    line = lines[0]
-    args = [inputs[idx] if x > 0 else -inputs[idx] for idx, x in enumerate(line)]
+    args_str = ", ".join([str(x) for x in lines[0]])
     if anded :
-      args_str = ", ".join([str(x) for x in args])
       out.write(f"{gate_var} = and({args_str})\n")
     else :
-      args_str = ", ".join([str(-x) for x in args])
       out.write(f"{gate_var} = or({args_str})\n")
   else :
     for line in lines :
-      args = [inputs[idx] if x > 0 else -inputs[idx] for idx, x in enumerate(line)]
       max_var += 1
       aux_gate = max_var
       aux_gates.append(aux_gate)
+      args_str = ", ".join([str(x) for x in line])
       if anded :
-        args_str = ", ".join([str(x) for x in args])
         out.write(f"{aux_gate} = and({args_str})\n")
       else :
-        args_str = ", ".join([str(-x) for x in args])
         out.write(f"{aux_gate} = or({args_str})\n")
     aux_gates_str = ", ".join([str(x) for x in aux_gates])
     if anded :